@@ -12,19 +12,21 @@ from __future__ import annotations
 
 import logging
 from enum import Enum
-from typing import Union, Dict, List
+from typing import Union, Dict, List, Tuple
 from typing import Optional
 
 from ordered_set import OrderedSet
-from panda3d.core import Filename
+from panda3d.core import Filename, StringStream
 from panda3d.egg import *
 import os
 from pathlib import Path
 
 from eggtools.components.EggExceptions import EggAccessViolation, EggImproperArgType
 from eggtools.AttributeDefs import DefinedAttributes, ObjectTypeDefs
+from eggtools.EggManConfig import CollapseKeepConfig, NodeNameConfig
 from eggtools.attributes.EggAttribute import EggAttribute
 from eggtools.attributes.EggUVNameAttribute import EggUVNameAttribute
+from eggtools.components.points import VertexCache
 from eggtools.components.points.PointData import PointData
 from eggtools.config.EggVariableConfig import GAMEASSETS_MAPS_PATH
 from eggtools.utils.EggNameResolver import EggNameResolver
@@ -40,6 +42,13 @@ class EggGroupRenameType(str, Enum):
     ReplaceAll = "replace_all"
 
 
+class TRefSortType(str, Enum):
+    TRef = "tref"
+    Filename = "filename"
+    # Textures that render the same way end up next to each other
+    RenderState = "render_state"
+
+
 class EggMan(object):
     # This is used to quickly grab EggData via a texture name
     _egg_name_2_egg_data = dict()
@@ -133,6 +142,19 @@ class EggMan(object):
                 # Setting this to debug instead of warning, it should be a warning but we always seem to catch this
                 logging.debug("EggData entry registered with no filename (use setEggFilename!)")
 
+    def rebuild_egg_context(self, egg: EggData) -> None:
+        """
+        Records the groups, vertex pools and point data of a registered egg again,
+        after nodes have been added, moved or removed.
+        """
+        ctx = self.egg_datas[egg]
+        ctx.egg_groups = OrderedSet()
+        ctx.egg_vertex_pools = OrderedSet()
+        ctx.egg_group_depths = dict()
+        ctx.point_data = dict()
+        self._traverse_egg(egg, ctx)
+        self.mark_dirty(ctx)
+
     def _register_egg_texture(self, ctx: EggContext, target_node: EggTexture) -> None:
         """
         Register an egg texture with the given EggContext. This is used when traversing down the egg.
@@ -156,8 +178,13 @@ class EggMan(object):
                 # print(f"ObjectTypes for {child.getName()} - {child.getObjectTypes()}")
                 self._replace_object_types(ctx, child)
                 ctx.egg_groups.add(child)
+                ctx.egg_group_depths[child] = ctx.egg_group_depths.get(egg, 0) + 1
                 self._traverse_egg(child, ctx)
 
+            # <VertexPool> name { ... }
+            if isinstance(child, EggVertexPool):
+                ctx.egg_vertex_pools.add(child)
+
             # <Material> { ... }
             if isinstance(child, EggMaterial):
                 ctx.egg_materials.add(child)
@@ -363,6 +390,201 @@ class EggMan(object):
 
         traverse_egg(egg, self.egg_datas[egg])
 
+    @staticmethod
+    def get_group_render_state(egg_group: EggGroup) -> tuple:
+        """
+        Render state set on the group itself, which every polygon under it inherits.
+        """
+        return (
+            egg_group.getBlendMode(), egg_group.getBlendOperandA(), egg_group.getBlendOperandB(),
+            tuple(egg_group.getBlendColor()) if egg_group.hasBlendColor() else None,
+            egg_group.getAlphaMode(), egg_group.getDepthWriteMode(), egg_group.getDepthTestMode(),
+            egg_group.getVisibilityMode(), egg_group.getBin() if egg_group.hasBin() else None,
+            egg_group.getDrawOrder() if egg_group.hasDrawOrder() else None,
+            egg_group.getDepthOffset() if egg_group.hasDepthOffset() else None,
+            egg_group.getNofogFlag(), egg_group.getIndexedFlag() if egg_group.hasIndexedFlag() else None,
+        )
+
+    @staticmethod
+    def copy_group_render_state(source: EggGroup, egg_group: EggGroup) -> None:
+        """
+        Sets the render state of the source group onto another group, leaving every other attribute alone.
+        """
+        egg_group.setBlendMode(source.getBlendMode())
+        egg_group.setBlendOperandA(source.getBlendOperandA())
+        egg_group.setBlendOperandB(source.getBlendOperandB())
+        if source.hasBlendColor():
+            egg_group.setBlendColor(source.getBlendColor())
+        egg_group.setAlphaMode(source.getAlphaMode())
+        egg_group.setDepthWriteMode(source.getDepthWriteMode())
+        egg_group.setDepthTestMode(source.getDepthTestMode())
+        egg_group.setVisibilityMode(source.getVisibilityMode())
+        if source.hasBin():
+            egg_group.setBin(source.getBin())
+        if source.hasDrawOrder():
+            egg_group.setDrawOrder(source.getDrawOrder())
+        if source.hasDepthOffset():
+            egg_group.setDepthOffset(source.getDepthOffset())
+        egg_group.setNofogFlag(source.getNofogFlag())
+        if source.hasIndexedFlag():
+            egg_group.setIndexedFlag(source.getIndexedFlag())
+
+    @staticmethod
+    def has_node_attributes(egg_group: EggGroup) -> bool:
+        """
+        True if the group has a transform, object type, tag, collision or any other attribute
+        that makes its node mean something at runtime, besides render state.
+        """
+        tags = StringStream()
+        egg_group.writeTags(tags, 0)
+        return egg_group.getGroupType() != EggGroup.GT_group or bool(tags.getData()) or any((
+            egg_group.hasTransform(), egg_group.getNumObjectTypes(), egg_group.getNumGroupRefs(),
+            egg_group.hasUserData(), egg_group.hasLod(), egg_group.hasScrollingUvs(),
+            egg_group.getDcsType() not in (EggGroup.DC_unspecified, EggGroup.DC_none),
+            egg_group.getBillboardType() != EggGroup.BT_none, egg_group.getDartType() != EggGroup.DT_none,
+            egg_group.getCsType() != EggGroup.CST_none, egg_group.getCollideFlags(), egg_group.hasCollisionName(),
+            egg_group.hasCollideMask(), egg_group.hasFromCollideMask(), egg_group.hasIntoCollideMask(),
+            egg_group.getModelFlag(), egg_group.getSwitchFlag(), egg_group.getTexlistFlag(), egg_group.getDecalFlag(),
+            egg_group.getDirectFlag(), egg_group.getPortalFlag(), egg_group.getOccluderFlag(),
+            egg_group.getPolylightFlag(),
+        ))
+
+    @staticmethod
+    def is_bare_group(egg_group: EggGroup) -> bool:
+        """
+        True if the group is only a named container, without any node attributes or render state.
+        """
+        return not EggMan.has_node_attributes(egg_group) and \
+            EggMan.get_group_render_state(egg_group) == EggMan.get_group_render_state(EggGroup())
+
+    @staticmethod
+    def _can_collapse_into(egg_node: EggGroupNode) -> bool:
+        if not isinstance(egg_node, EggGroup):
+            return True
+        # The children of a switch are its frames, and joints only hold other joints
+        if egg_node.getSwitchFlag() or egg_node.getGroupType() != EggGroup.GT_group:
+            return False
+        # The polygons directly under a decal group are the base, and its child groups are the decals on top
+        if egg_node.getDecalFlag():
+            return False
+        # Without descend, a <Collide> only takes in the polygons directly under it
+        return egg_node.getCsType() == EggGroup.CST_none or bool(egg_node.getCollideFlags() & EggGroup.CF_descend)
+
+    def _collapse_bare_groups(self, egg_node: EggGroupNode, keep_config: NodeNameConfig) -> int:
+        removed = 0
+        children = list(egg_node.getChildren())
+        new_children = []
+        first_collapsed = None
+        can_collapse = self._can_collapse_into(egg_node)
+        for index, child in enumerate(children):
+            if isinstance(child, EggGroup):
+                removed += self._collapse_bare_groups(child, keep_config)
+                if can_collapse and self.is_bare_group(child) and not keep_config.check(child.getName()):
+                    grandchildren = list(child.getChildren())
+                    for grandchild in grandchildren:
+                        child.removeChild(grandchild)
+                    new_children.extend(grandchildren)
+                    removed += 1
+                    if first_collapsed is None:
+                        first_collapsed = index
+                    continue
+            new_children.append(child)
+
+        if first_collapsed is not None:
+            # Same as _replace_children, the contents take the place of the group they came from
+            for child in children[first_collapsed:]:
+                egg_node.removeChild(child)
+            for child in new_children[first_collapsed:]:
+                egg_node.addChild(child)
+        return removed
+
+    def collapse_groups(self, egg: EggData = None, keep_config: NodeNameConfig = CollapseKeepConfig) -> Dict[str, int]:
+        """
+        Moves the contents of bare groups (see is_bare_group) up into their parents and removes the groups,
+        so that the loaded model has fewer nodes. Groups matching the keep config are left alone.
+
+        WILL affect model/egg data
+
+        :returns: { egg filename: number of groups removed }
+        """
+        if not egg:
+            report = dict()
+            for egg_data in self.egg_datas.keys():
+                report.update(self.collapse_groups(egg_data, keep_config))
+            return report
+
+        ctx = self.egg_datas[egg]
+        removed = self._collapse_bare_groups(egg, keep_config)
+        if removed:
+            self.rebuild_egg_context(egg)
+        return {ctx.filename.getFullpath(): removed}
+
+    @staticmethod
+    def merge_vertex_pools(vertex_pools: List[EggVertexPool]) -> None:
+        """
+        Moves every vertex into the first pool. Polygons keep pointing at the same vertices.
+        """
+        target_pool = vertex_pools[0]
+        for vertex_pool in vertex_pools[1:]:
+            egg_vertices = [
+                vertex_pool.getVertex(index) for index in range(vertex_pool.getHighestIndex() + 1)
+                if vertex_pool.hasVertex(index)
+            ]
+            for egg_vertex in egg_vertices:
+                vertex_pool.removeVertex(egg_vertex)
+                target_pool.addVertex(egg_vertex)
+            vertex_pool.getParent().removeChild(vertex_pool)
+
+    def merge_sibling_groups(self, egg: EggData = None, keep_config: NodeNameConfig = CollapseKeepConfig,
+                             dry_run: bool = False) -> Dict[str, List[List[str]]]:
+        """
+        Merges sibling groups that have the same render state and no node attributes (see has_node_attributes)
+        into the first of them, moving in the contents of the others and combining the vertex pools directly
+        under them. Much like flattenStrong, but ahead of time. Groups matching the keep config are left alone.
+
+        WILL affect model/egg data, unless dry_run is set.
+        A dry run only lists merges between groups that are siblings already.
+
+        :returns: { egg filename: [ [name of the group that stays, names of the groups merged into it...] ] }
+        """
+        if not egg:
+            report = dict()
+            for egg_data in self.egg_datas.keys():
+                report.update(self.merge_sibling_groups(egg_data, keep_config, dry_run))
+            return report
+
+        ctx = self.egg_datas[egg]
+        merges = []
+        # Parents come before their children, so groups brought together by a merge get merged themselves too
+        for egg_node in [egg] + list(ctx.egg_groups):
+            if not self._can_collapse_into(egg_node):
+                continue
+            state_groups = dict()  # { render state: [EggGroup] }
+            for child in egg_node.getChildren():
+                if isinstance(child, EggGroup) and not self.has_node_attributes(child) and \
+                        not keep_config.check(child.getName()):
+                    state_groups.setdefault(self.get_group_render_state(child), []).append(child)
+
+            for egg_groups in state_groups.values():
+                if len(egg_groups) < 2:
+                    continue
+                merges.append([egg_group.getName() for egg_group in egg_groups])
+                if dry_run:
+                    continue
+                target_group = egg_groups[0]
+                for egg_group in egg_groups[1:]:
+                    for child in list(egg_group.getChildren()):
+                        egg_group.removeChild(child)
+                        target_group.addChild(child)
+                    egg_node.removeChild(egg_group)
+                vertex_pools = [child for child in target_group.getChildren() if isinstance(child, EggVertexPool)]
+                if len(vertex_pools) > 1:
+                    self.merge_vertex_pools(vertex_pools)
+
+        if merges and not dry_run:
+            self.rebuild_egg_context(egg)
+        return {ctx.filename.getFullpath(): merges}
+
     # endregion
 
     """
@@ -637,10 +859,165 @@ class EggMan(object):
             if texture_name in egg_texture.getFilename().getBasename():
                 return egg_texture
 
-    def sort_trefs(self, egg: EggData = None, sortby: str = ""):
-        # TODO, make sortby enums, just have like
-        # { TCSort.TRefs: sortByTref }
-        pass
+    @staticmethod
+    def get_texture_state_key(egg_texture: EggTexture) -> tuple:
+        return (
+            egg_texture.getAlphaMode(), egg_texture.getFormat(), egg_texture.getEnvType(),
+            egg_texture.getWrapU(), egg_texture.getWrapV(), egg_texture.getMinfilter(), egg_texture.getMagfilter(),
+            egg_texture.getFilename().getFullpath(), egg_texture.getName(),
+        )
+
+    @staticmethod
+    def _reorder_children(egg_node: EggGroupNode, child_type: type, key) -> bool:
+        """
+        Stable sorts the children of the given type, leaving every other child where it was.
+        """
+        children = list(egg_node.getChildren())
+        positions = [index for index, child in enumerate(children) if isinstance(child, child_type)]
+        new_children = list(children)
+        for index, child in zip(positions, sorted((children[index] for index in positions), key = key)):
+            new_children[index] = child
+        return EggMan._replace_children(egg_node, children, new_children)
+
+    @staticmethod
+    def _replace_children(egg_node: EggGroupNode, children: list, new_children: list) -> bool:
+        """
+        Puts the children of the node into a new order. Both lists need to hold the same child objects.
+
+        :returns: True if anything moved
+        """
+        positions = range(len(children))
+        first_moved = next((index for index in positions if new_children[index] is not children[index]), None)
+        if first_moved is None:
+            return False
+        # The Egg API can't insert children at a position, so everything after the first moved child is re-added
+        for child in children[first_moved:]:
+            egg_node.removeChild(child)
+        for child in new_children[first_moved:]:
+            egg_node.addChild(child)
+        return True
+
+    def sort_trefs(self, egg: EggData = None, sortby: TRefSortType = TRefSortType.TRef) -> None:
+        """
+        Sorts the <Texture> entries of the egg, which keeps written eggs stable between exports.
+        """
+        if not egg:
+            for egg_data in self.egg_datas.keys():
+                self.sort_trefs(egg_data, sortby)
+            return
+
+        sort_keys = {
+            TRefSortType.TRef: lambda egg_texture: egg_texture.getName(),
+            TRefSortType.Filename: lambda egg_texture: (egg_texture.getFilename().getFullpath(), egg_texture.getName()),
+            TRefSortType.RenderState: self.get_texture_state_key,
+        }
+        sort_key = sort_keys[TRefSortType(sortby)]
+        ctx = self.egg_datas[egg]
+        for egg_node in [egg] + list(ctx.egg_groups):
+            if self._reorder_children(egg_node, EggTexture, sort_key):
+                self.mark_dirty(ctx)
+
+        ctx.egg_textures = OrderedSet(sorted(ctx.egg_textures, key = sort_key))
+        ctx.egg_texture_collection.clear()
+        for egg_texture in ctx.egg_textures:
+            ctx.egg_texture_collection.addTexture(egg_texture)
+
+    @staticmethod
+    def get_polygon_state_key(egg_polygon: EggPolygon) -> tuple:
+        return (
+            tuple((egg_texture.getFilename().getFullpath(), egg_texture.getName())
+                  for egg_texture in egg_polygon.getTextures()),
+            egg_polygon.getMaterial().getName() if egg_polygon.hasMaterial() else "",
+            egg_polygon.getAlphaMode(), egg_polygon.getBin(), egg_polygon.getDrawOrder(),
+            egg_polygon.getDepthWriteMode(), egg_polygon.getDepthTestMode(), egg_polygon.getDepthOffset(),
+            egg_polygon.getVisibilityMode(), egg_polygon.getBfaceFlag(),
+        )
+
+    def sort_polygons(self, egg: EggData = None) -> None:
+        """
+        Orders the polygons in each group by their textures and render state, so that consecutive polygons
+        share state. Polygons that render the same way keep their relative order.
+        """
+        if not egg:
+            for egg_data in self.egg_datas.keys():
+                self.sort_polygons(egg_data)
+            return
+
+        ctx = self.egg_datas[egg]
+        for egg_node in [egg] + list(ctx.egg_groups):
+            if self._reorder_children(egg_node, EggPolygon, self.get_polygon_state_key):
+                self.mark_dirty(ctx)
+
+    def optimize_vertex_cache(self, egg: EggData = None, cache_size: int = 32) -> Dict[str, Tuple[float, float]]:
+        """
+        Reorders the polygons in each group for post-transform vertex cache reuse, then renumbers each vertex pool
+        in the order its vertices are first used.
+        Only polygons sharing a vertex pool and render state trade places, so sort_polygons runs stay intact.
+
+        :param int cache_size: Vertex cache entries to optimize for and to measure ACMR with.
+        :returns: { egg filename: (ACMR before, ACMR after) }
+        """
+        if not egg:
+            acmrs = dict()
+            for egg_data in self.egg_datas.keys():
+                acmrs.update(self.optimize_vertex_cache(egg_data, cache_size))
+            return acmrs
+
+        ctx = self.egg_datas[egg]
+        vertex_ids = dict()  # { EggVertex : face vertex id }
+        faces_before = []
+        faces_after = []
+        for egg_node in [egg] + list(ctx.egg_groups):
+            children = list(egg_node.getChildren())
+            runs = dict()  # { (EggVertexPool, polygon state key) : [child index] }
+            for index, child in enumerate(children):
+                if isinstance(child, EggPolygon) and child.getPool():
+                    runs.setdefault((child.getPool(), self.get_polygon_state_key(child)), []).append(index)
+
+            new_children = list(children)
+            for positions in runs.values():
+                faces = [
+                    [vertex_ids.setdefault(egg_vertex, len(vertex_ids)) for egg_vertex in children[index].getVertices()]
+                    for index in positions
+                ]
+                order = VertexCache.optimize_vertex_cache(faces, cache_size)
+                for index, face_index in zip(positions, order):
+                    new_children[index] = children[positions[face_index]]
+                faces_before.extend(faces)
+                faces_after.extend(faces[face_index] for face_index in order)
+            if self._replace_children(egg_node, children, new_children):
+                self.mark_dirty(ctx)
+
+        first_use = dict()  # { face vertex id : position in the new order }
+        for face in faces_after:
+            for vertex_id in face:
+                first_use.setdefault(vertex_id, len(first_use))
+
+        def get_vertex_rank(egg_vertex: EggVertex) -> int:
+            # Vertices no polygon got reordered with keep their order, after everything else
+            return first_use.get(vertex_ids.get(egg_vertex), len(first_use) + egg_vertex.getIndex())
+
+        for vertex_pool in ctx.egg_vertex_pools:
+            pool_vertices = [
+                vertex_pool.getVertex(index) for index in range(vertex_pool.getHighestIndex() + 1)
+                if vertex_pool.hasVertex(index)
+            ]
+            new_order = sorted(pool_vertices, key = get_vertex_rank)
+            if all(new_vertex is egg_vertex for new_vertex, egg_vertex in zip(new_order, pool_vertices)):
+                continue
+            # sortByExternalIndex does the renumbering, but the external indices might mean something to someone else
+            external_indices = [egg_vertex.getExternalIndex() for egg_vertex in pool_vertices]
+            for external_index, egg_vertex in enumerate(new_order):
+                egg_vertex.setExternalIndex(external_index)
+            vertex_pool.sortByExternalIndex()
+            for egg_vertex, external_index in zip(pool_vertices, external_indices):
+                egg_vertex.setExternalIndex(external_index)
+            self.mark_dirty(ctx)
+
+        acmr_before = VertexCache.get_acmr(faces_before, cache_size)
+        acmr_after = VertexCache.get_acmr(faces_after, cache_size)
+        logging.info(f"{ctx.filename}: ACMR {acmr_before:.3f} -> {acmr_after:.3f}")
+        return {ctx.filename.getFullpath(): (acmr_before, acmr_after)}
 
     # endregion
 
@@ -30,6 +30,11 @@ BackstageConfig = NodeNameConfig(
     NODE_INCLUDES = {"bkstg*"}
 )
 
+# Groups that are kept around when collapsing or merging groups, since code finds them by name
+CollapseKeepConfig = NodeNameConfig(
+    NODE_INCLUDES = {"*origin*", "*locator*"}
+)
+
 if __name__ == "__main__":
     test_name = "decal"
     test = DecalConfig.check(test_name)
@@ -58,6 +58,10 @@ class EggContext:
         self.egg_save_timestamp = False
         self.egg_ext_file_refs = OrderedSet()
         self.egg_groups = OrderedSet()
+        self.egg_vertex_pools = OrderedSet()
+
+        self.egg_group_depths: Dict[EggGroup, int] = dict()
+        # { EggGroup : depth }, groups directly under the EggData are at depth 1
 
         # True if the corresponding egg data was created during code execution.
         # More specifically used for flagging not-iter-safe eggs during an EggMan traversal.
@@ -161,6 +165,8 @@ class EggContext:
         self.egg_save_timestamp = False
         self.egg_ext_file_refs = OrderedSet()
         self.egg_groups = OrderedSet()
+        self.egg_vertex_pools = OrderedSet()
+        self.egg_group_depths = dict()
         self.egg_generated = False
         self.point_data = dict()
         self.filename = Filename()
@@ -0,0 +1,36 @@
+import json
+import logging
+import os
+
+
+class SidecarManifest:
+    """
+    Sidecar file kept next to generated files, recording a fingerprint of the inputs each file was made from.
+    Files whose fingerprint still matches can be reused instead of being generated again.
+    """
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self, directory: str):
+        self.filename = os.path.join(directory, self.MANIFEST_NAME)
+        self.entries = dict()  # { output basename: fingerprint }
+        self.dirty = False
+        if os.path.isfile(self.filename):
+            try:
+                with open(self.filename) as manifest_file:
+                    self.entries = json.load(manifest_file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Couldn't read manifest {self.filename}, starting a new one ({e})")
+
+    def is_up_to_date(self, output_path: str, fingerprint: str) -> bool:
+        return self.entries.get(os.path.basename(output_path)) == fingerprint and os.path.isfile(output_path)
+
+    def record(self, output_path: str, fingerprint: str) -> None:
+        self.entries[os.path.basename(output_path)] = fingerprint
+        self.dirty = True
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        with open(self.filename, "w") as manifest_file:
+            json.dump(self.entries, manifest_file, indent = 2, sort_keys = True)
+        self.dirty = False
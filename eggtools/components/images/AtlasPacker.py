@@ -0,0 +1,176 @@
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+def next_power_of_two(value: int) -> int:
+    return 1 << max(int(value) - 1, 0).bit_length()
+
+
+@dataclass
+class AtlasLayout:
+    """
+    Where each rectangle ended up inside of one atlas. Positions are in pixels, from the top left corner.
+    """
+
+    def __str__(self):
+        return f"AtlasLayout: {self.width}x{self.height}, {len(self.placements)} rects, {self.occupancy:.1%} used"
+
+    width: int
+    height: int
+
+    # { key: (x, y, width, height) }
+    placements: Dict[Hashable, Tuple[int, int, int, int]] = field(default_factory = dict)
+
+    @property
+    def occupancy(self) -> float:
+        used_area = sum(width * height for _, _, width, height in self.placements.values())
+        return used_area / (self.width * self.height)
+
+
+class MaxRectsPacker:
+    """
+    MaxRects bin packer using the Best Short Side Fit heuristic, without rotation.
+
+    Reference: Jukka Jylänki, "A Thousand Ways to Pack the Bin"
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        # (x, y, width, height)
+        self.free_rects = [(0, 0, width, height)]
+
+    def insert(self, width: int, height: int) -> Optional[Tuple[int, int]]:
+        """
+        :returns: The (x, y) the rectangle was placed at, or None if it does not fit anymore.
+        """
+        best_rect = None
+        best_fit = None
+        for free_x, free_y, free_width, free_height in self.free_rects:
+            if width > free_width or height > free_height:
+                continue
+            leftover_x = free_width - width
+            leftover_y = free_height - height
+            fit = (min(leftover_x, leftover_y), max(leftover_x, leftover_y))
+            if best_fit is None or fit < best_fit:
+                best_fit = fit
+                best_rect = (free_x, free_y, width, height)
+
+        if not best_rect:
+            return None
+
+        self._split_free_rects(best_rect)
+        return best_rect[0], best_rect[1]
+
+    def _split_free_rects(self, used_rect) -> None:
+        used_x, used_y, used_width, used_height = used_rect
+        new_free_rects = []
+        for free_rect in self.free_rects:
+            free_x, free_y, free_width, free_height = free_rect
+            if used_x >= free_x + free_width or used_x + used_width <= free_x or \
+                    used_y >= free_y + free_height or used_y + used_height <= free_y:
+                new_free_rects.append(free_rect)
+                continue
+            # Keep whatever is left of the free rect on each side of the used one
+            if used_x > free_x:
+                new_free_rects.append((free_x, free_y, used_x - free_x, free_height))
+            if used_x + used_width < free_x + free_width:
+                new_free_rects.append((
+                    used_x + used_width, free_y, free_x + free_width - used_x - used_width, free_height
+                ))
+            if used_y > free_y:
+                new_free_rects.append((free_x, free_y, free_width, used_y - free_y))
+            if used_y + used_height < free_y + free_height:
+                new_free_rects.append((
+                    free_x, used_y + used_height, free_width, free_y + free_height - used_y - used_height
+                ))
+        self.free_rects = self._prune_free_rects(new_free_rects)
+
+    @staticmethod
+    def _prune_free_rects(free_rects: list) -> list:
+        """
+        Removes free rects that are completely contained by another one.
+        """
+        free_rects = list(dict.fromkeys(free_rects))
+        pruned = []
+        for rect in free_rects:
+            x, y, width, height = rect
+            contained = False
+            for other in free_rects:
+                if other is rect:
+                    continue
+                other_x, other_y, other_width, other_height = other
+                if x >= other_x and y >= other_y and \
+                        x + width <= other_x + other_width and y + height <= other_y + other_height:
+                    contained = True
+                    break
+            if not contained:
+                pruned.append(rect)
+        return pruned
+
+
+def _pack_layout(rects: list, atlas_width: int, atlas_height: int) -> Tuple[AtlasLayout, list]:
+    packer = MaxRectsPacker(atlas_width, atlas_height)
+    layout = AtlasLayout(atlas_width, atlas_height)
+    leftover = []
+    for key, (width, height) in rects:
+        position = packer.insert(width, height)
+        if position is None:
+            leftover.append((key, (width, height)))
+        else:
+            layout.placements[key] = (*position, width, height)
+    return layout, leftover
+
+
+def pack_rects(sizes: Dict[Hashable, Tuple[int, int]], max_size: int = 2048,
+               power_of_two: bool = True) -> List[AtlasLayout]:
+    """
+    Packs rectangles into as few atlases as possible, each one as small as possible.
+
+    Atlases start out square around the total area and grow one side at a time until everything fits,
+    or until they hit max_size, at which point a new atlas is started with whatever is left.
+
+    :param dict sizes: { key: (width, height) }
+    :param bool power_of_two: Keep both sides of every atlas a power of two.
+        Otherwise, the atlases are trimmed down to the area actually used.
+    :returns: [ AtlasLayout, ... ] Rectangles that are bigger than max_size are left out.
+    """
+    # Biggest rects first, they are the hardest to place
+    remaining = sorted(
+        ((key, size) for key, size in sizes.items() if size[0] <= max_size and size[1] <= max_size),
+        key = lambda item: (max(item[1]), item[1][0] * item[1][1]), reverse = True
+    )
+    layouts = []
+    while remaining:
+        total_area = sum(width * height for _, (width, height) in remaining)
+        side = next_power_of_two(math.ceil(math.sqrt(total_area)))
+        atlas_width = min(max(side, next_power_of_two(max(width for _, (width, _) in remaining))), max_size)
+        atlas_height = min(max(side, next_power_of_two(max(height for _, (_, height) in remaining))), max_size)
+
+        while True:
+            layout, leftover = _pack_layout(remaining, atlas_width, atlas_height)
+            if not leftover or (atlas_width >= max_size and atlas_height >= max_size):
+                break
+            # Grow the shorter side
+            if atlas_width <= atlas_height and atlas_width < max_size or atlas_height >= max_size:
+                atlas_width = min(atlas_width * 2, max_size)
+            else:
+                atlas_height = min(atlas_height * 2, max_size)
+
+        # Starting out square can leave half of the atlas empty; see if it still fits with a shorter side.
+        while not leftover:
+            if layout.width >= layout.height:
+                smaller_layout, smaller_leftover = _pack_layout(remaining, layout.width // 2, layout.height)
+            else:
+                smaller_layout, smaller_leftover = _pack_layout(remaining, layout.width, layout.height // 2)
+            if smaller_leftover:
+                break
+            layout = smaller_layout
+
+        if not power_of_two:
+            layout.width = max(x + width for x, _, width, _ in layout.placements.values())
+            layout.height = max(y + height for _, y, _, height in layout.placements.values())
+        layouts.append(layout)
+        remaining = leftover
+    return layouts
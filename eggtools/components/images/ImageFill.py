@@ -2,7 +2,7 @@ from enum import Enum
 import cv2
 import cv2 as cv
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageColor
 
 from eggtools.components.images import ImageUtils
 
@@ -23,6 +23,15 @@ class FillType:
     def fill_image(self, image: Image) -> Image:
         pass
 
+    def fill_array(self, image_array: np.ndarray) -> np.ndarray:
+        """
+        Fills in the transparent areas of an RGBA image array.
+        Fill types may fill the given array in place, so pass in a copy if the original is still needed.
+
+        By default, this will round trip through fill_image.
+        """
+        return np.asarray(self.fill_image(Image.fromarray(image_array)))
+
 
 class UnknownFill:
     """
@@ -35,6 +44,9 @@ class UnknownFill:
     def fill_image(self, image: Image) -> Image:
         return image
 
+    def fill_array(self, image_array: np.ndarray) -> np.ndarray:
+        return image_array
+
 
 class InpaintFill(FillType):
 
@@ -47,32 +59,95 @@ class InpaintFill(FillType):
             cv.INPAINT_NS
         ]
 
-    def __init__(self, radius: int = 0, method=cv2.INPAINT_TELEA):
+    def __init__(self, radius: int = 0, method=cv2.INPAINT_TELEA, region_limited: bool = True, scale: float = 1.0):
         """
         :param int radius: The higher the radius, the smoother that the background fill will be.
             NOTE: Computation time significantly increases with the radius value
+
+        :param bool region_limited: Only inpaint the margin band surrounding the image (plus a radius-sized border
+            of the image itself) instead of the entire expanded image.
+            Transparent pixels inside the original image are left alone in this mode.
+
+        :param float scale: Values below 1 inpaint a downsampled copy of each region and blend it back in at
+            full resolution. Lower values are faster, at the cost of a blurrier fill.
         """
         super().__init__()
         self.radius = radius
         self.method = method
+        self.region_limited = region_limited
+        self.scale = min(1.0, max(scale, 0.01))
+
+    def _inpaint_region(self, image_conv: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.scale >= 1.0:
+            return cv.inpaint(image_conv, mask, self.radius, self.method)
+
+        # Multiscale: inpaint a smaller copy and only take the masked pixels back from its upscaled result
+        height, width = mask.shape
+        small_size = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+        image_small = cv.resize(image_conv, small_size, interpolation = cv.INTER_AREA)
+        # Any downsampled pixel that was averaged with a masked pixel is contaminated, so it gets masked too
+        mask_small = np.uint8(cv.resize(mask, small_size, interpolation = cv.INTER_AREA) > 0) * 255
+        radius_small = max(1, round(self.radius * self.scale)) if self.radius else self.radius
+        inpainted_small = cv.inpaint(image_small, mask_small, radius_small, self.method)
+        inpainted = cv.resize(inpainted_small, (width, height), interpolation = cv.INTER_LINEAR)
+
+        new_image = image_conv.copy()
+        masked = mask != 0
+        new_image[masked] = inpainted[masked]
+        return new_image
+
+    def _inpaint_margins(self, image_conv: np.ndarray, mask: np.ndarray, trim_bbox) -> np.ndarray:
+        """
+        Inpaints the top, bottom, left and right margin bands one at a time.
+        The top and bottom bands span the full width to take care of the corners, and the side bands overlap into
+        them afterwards so that they can sample the pixels that were just filled in.
+        """
+        left, upper, right, lower = trim_bbox
+        height, width = mask.shape
+        border = max(self.radius, 1) + 1
+
+        regions = []
+        if upper > 0:
+            regions.append((0, min(height, upper + border), 0, width))
+        if lower < height:
+            regions.append((max(0, lower - border), height, 0, width))
+        if left > 0:
+            regions.append((max(0, upper - border), min(height, lower + border), 0, min(width, left + border)))
+        if right < width:
+            regions.append((max(0, upper - border), min(height, lower + border), max(0, right - border), width))
+
+        new_image = image_conv.copy()
+        mask = mask.copy()
+        for y1, y2, x1, x2 in regions:
+            region_mask = mask[y1:y2, x1:x2]
+            if not region_mask.any():
+                continue
+            new_image[y1:y2, x1:x2] = self._inpaint_region(
+                np.ascontiguousarray(new_image[y1:y2, x1:x2]), np.ascontiguousarray(region_mask)
+            )
+            # These pixels are known now
+            region_mask[:] = 0
+        return new_image
 
     def fill_image(self, image: Image):
-        # opencv uses bgr instead of rgb
-        image_conv = cv.cvtColor(np.array(image), cv.COLOR_RGB2BGR)
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+        return Image.fromarray(self.fill_array(np.asarray(image)))
 
-        # Grab image mask based off the alphas of the image-- this will be the newly generated outer area.
-        image_mask = ImageUtils.get_alpha_mask(image)
+    def fill_array(self, image_array: np.ndarray) -> np.ndarray:
+        # opencv uses bgr instead of rgb, but inpainting treats every channel the same way,
+        # so there's no need to swap them around.
+        image_conv = np.ascontiguousarray(image_array[..., :3])
 
-        # Color convert
-        image_mask = np.array(image_mask)
-        image_mask = image_mask[:, :].copy()
+        # Grab image mask based off the alphas of the image-- this will be the newly generated outer area.
+        mask = 255 - image_array[..., 3]
 
-        mask = np.uint8(image_mask)
-        new_image = cv.inpaint(image_conv, mask, self.radius, self.method)
+        trim_bbox = ImageUtils.get_trim_bbox(image_array)
+        if self.region_limited and trim_bbox:
+            new_image = self._inpaint_margins(image_conv, mask, trim_bbox)
+        else:
+            new_image = self._inpaint_region(image_conv, mask)
 
-        # convert it to PIL
-        new_image = cv.cvtColor(new_image, cv.COLOR_BGR2RGB)
-        new_image = Image.fromarray(new_image)
         return new_image
 
 
@@ -83,16 +158,19 @@ class SolidFill(FillType):
         self.color = color
 
     def fill_image(self, image: Image):
-        color = self.color
-        filled_image = Image.new("RGBA", image.size, color)
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+        return Image.fromarray(self.fill_array(np.asarray(image)))
 
-        # Composite the original image over the new solid color background
-        new_image = Image.alpha_composite(filled_image, image)
+    def fill_array(self, image_array: np.ndarray) -> np.ndarray:
+        color = np.array(ImageColor.getrgb(self.color)[:3], dtype = np.uint32)
 
-        # Convert the result back to RGB if you don't need the alpha channel anymore
-        new_image = new_image.convert("RGB")
+        # Composite the original image over the new solid color background
+        alpha = image_array[..., 3:].astype(np.uint32)
+        new_image = image_array[..., :3] * alpha + color * (255 - alpha)
 
-        return new_image
+        # The alpha channel gets dropped since the background is fully opaque
+        return ((new_image + 127) // 255).astype(np.uint8)
 
 
 class RepeatFill(FillType):
@@ -100,34 +178,30 @@ class RepeatFill(FillType):
         super().__init__()
 
     def fill_image(self, image: Image):
-        image_width, image_height = image.size
-        image_result = image.copy()
+        return Image.fromarray(self.fill_array(np.array(image)))
+
+    def fill_array(self, image_array: np.ndarray) -> np.ndarray:
+        image_height, image_width = image_array.shape[:2]
 
         # Trim out the transparency that was generated for our extended image
-        image_cropped = ImageUtils.trim_transparency(image)
-        cropped_width, cropped_height = image_cropped.size
+        trim_bbox = ImageUtils.get_trim_bbox(image_array)
+        if not trim_bbox:
+            return image_array
+        left, upper, right, lower = trim_bbox
         # We're going to take this image pattern and use it to fill in the transparent areas we've just created
-        pattern_width, pattern_height = image_cropped.size
+        image_pattern = image_array[upper:lower, left:right].copy()
+        pattern_height, pattern_width = image_pattern.shape[:2]
 
         # Calculate the starting position to center the image
-        start_x = (image_width // 2) - (cropped_width // 2)
-        start_y = (image_height // 2) - (cropped_height // 2)
-
-        # Calculate the number of tiles in each direction
-        x_tiles = (image_width // cropped_width) + 2
-        y_tiles = (image_height // cropped_height) + 2
+        start_x = (image_width // 2) - (pattern_width // 2)
+        start_y = (image_height // 2) - (pattern_height // 2)
 
-        # Tile the image centered on the canvas
-        for i in range(-x_tiles // 2, x_tiles // 2 + 1):
-            for j in range(-y_tiles // 2, y_tiles // 2 + 1):
-                x = start_x + i * cropped_width
-                y = start_y + j * cropped_height
-                # Check if the image is within the canvas bounds
-                if x < image_width and y < image_height and (x + cropped_width) > 0 and (y + cropped_height) > 0:
-                    # Paste the image
-                    image_result.paste(image_cropped, (x, y))
+        # Tile the pattern centered on the canvas by wrapping every canvas coordinate back into the pattern
+        rows = np.arange(image_height) - start_y
+        cols = np.arange(image_width) - start_x
+        np.take(image_pattern.take(rows, axis = 0, mode = "wrap"), cols, axis = 1, mode = "wrap", out = image_array)
 
-        return image_result
+        return image_array
 
 
 class ClampFill(FillType):
@@ -135,85 +209,37 @@ class ClampFill(FillType):
         super().__init__()
 
     def fill_image(self, image: Image):
-        # Canvas.
-        canvas = image.copy()
-        canvas_size = canvas.size
-        canvas_width, canvas_height = canvas_size
+        return Image.fromarray(self.fill_array(np.array(image)))
+
+    def fill_array(self, image_array: np.ndarray) -> np.ndarray:
+        canvas_height, canvas_width = image_array.shape[:2]
 
         # Trim out the transparency that was generated for our extended image
-        image_cropped = ImageUtils.trim_transparency(image)
-        cropped_width, cropped_height = image_cropped.size
-        original_width = cropped_width
-        original_height = cropped_height
-        original_image = image_cropped
+        trim_bbox = ImageUtils.get_trim_bbox(image_array)
+        if not trim_bbox:
+            return image_array
+        left, upper, right, lower = trim_bbox
+        original_width = right - left
+        original_height = lower - upper
 
         # Calculate the position to center the image
         center_x = (canvas_width - original_width) // 2
         center_y = (canvas_height - original_height) // 2
+        center_right = center_x + original_width
+        center_lower = center_y + original_height
+
+        if (left, upper) != (center_x, center_y):
+            image_array[center_y:center_lower, center_x:center_right] = image_array[upper:lower, left:right].copy()
+
+        # Extend the edge pixels vertically, and then extend the edge columns horizontally to cover the corners too.
+        # This is equivalent to an edge pad of the original image.
+        image_array[:center_y, center_x:center_right] = image_array[center_y:center_y + 1, center_x:center_right]
+        image_array[center_lower:, center_x:center_right] = image_array[center_lower - 1:center_lower,
+                                                                        center_x:center_right]
+        image_array[:, :center_x] = image_array[:, center_x:center_x + 1]
+        image_array[:, center_right:] = image_array[:, center_right - 1:center_right]
 
-        # Paste the original image in the center of the canvas
-        canvas.paste(original_image, (center_x, center_y))
-
-        # Extend the edge pixels horizontally
-        for x in range(center_x):
-            left_column = original_image.crop((0, 0, 1, original_height))
-            canvas.paste(left_column, (x, center_y))
-
-        for x in range(center_x + original_width, canvas_width):
-            right_column = original_image.crop((original_width - 1, 0, original_width, original_height))
-            canvas.paste(right_column, (x, center_y))
-
-        # Extend the edge pixels vertically
-        for y in range(center_y):
-            top_row = original_image.crop((0, 0, original_width, 1))
-            canvas.paste(top_row, (center_x, y))
-
-        for y in range(center_y + original_height, canvas_height):
-            bottom_row = original_image.crop((0, original_height - 1, original_width, original_height))
-            canvas.paste(bottom_row, (center_x, y))
-
-        # dude i LOVE computer graphics SO MUCH I LOVE FILLING EDGES YEAH!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-
-        # Fill the corners with the corner pixels
-        top_left_corner = original_image.crop((
-            0, 0, 1, 1
-        )).resize((
-            center_x, center_y
-        ))
-        canvas.paste(
-            top_left_corner, (0, 0)
-        )
-
-        top_right_corner = original_image.crop((
-            original_width - 1, 0, original_width, 1
-        )).resize((
-            canvas_width - (center_x + original_width), center_y
-        ))
-        canvas.paste(
-            top_right_corner, (center_x + original_width, 0)
-        )
-
-        bottom_left_corner = original_image.crop((
-            0, original_height - 1, 1, original_height
-        )).resize((
-            center_x, canvas_height - (center_y + original_height)
-        ))
-        canvas.paste(
-            bottom_left_corner, (0, center_y + original_height)
-        )
-
-        bottom_right_corner = original_image.crop((
-            original_width - 1, original_height - 1, original_width, original_height
-        )).resize((
-            canvas_width - (center_x + original_width),
-            canvas_height - (center_y + original_height)
-        ))
-        canvas.paste(
-            bottom_right_corner,
-            (center_x + original_width, center_y + original_height)
-        )
-
-        return canvas
+        return image_array
 
 
 """
@@ -1,5 +1,6 @@
 from typing import Optional, Union
 
+import numpy as np
 from PIL import Image
 
 from eggtools.components.images import ImageUtils
@@ -23,6 +24,24 @@ class ImageMarginer:
     def __init__(self, fill_type: Optional[Union[FillMode, FillType, None]] = SolidFill):
         self.fill_type = self._get_fill_type(fill_type)
 
+    @staticmethod
+    def expand_array(source_array: np.ndarray, margin_x, margin_y) -> np.ndarray:
+        """
+        Array equivalent of expand_image.
+        The source RGBA array is copied into the center of a new transparent buffer, which fill types fill in place.
+
+        :returns: Expanded (height, width, 4) RGBA array
+        """
+        image_height, image_width = source_array.shape[:2]
+        new_image_width = int(image_width + margin_x)
+        new_image_height = int(image_height + margin_y)
+        new_array = np.zeros((new_image_height, new_image_width, 4), dtype = np.uint8)
+        x_offset = (new_image_width - image_width) // 2
+        y_offset = (new_image_height - image_height) // 2
+        new_array[y_offset:y_offset + image_height, x_offset:x_offset + image_width] = source_array
+
+        return new_array
+
     @staticmethod
     def expand_image(source_image: Image, margin_x, margin_y) -> Image:
         """
@@ -36,24 +55,15 @@ class ImageMarginer:
         :returns: Expanded image in RGBA format
 
         """
+        source_array = np.asarray(source_image.convert("RGBA"))
+        return Image.fromarray(ImageMarginer.expand_array(source_array, margin_x, margin_y))
 
-        # generates a new image
-        # https://www.geeksforgeeks.org/convert-opencv-image-to-pil-image-in-python/
-        # https://stackoverflow.com/questions/14134892/convert-image-from-pil-to-opencv-format
-        # https://www.geeksforgeeks.org/add-padding-to-the-image-with-python-pillow/
-        image_width, image_height = source_image.size
-        new_image_width = int(image_width + margin_x)
-        new_image_height = int(image_height + margin_y)
-        new_image = Image.new("RGBA", (new_image_width, new_image_height))
-        c_image = source_image.copy()
-        x_offset = (new_image_width - source_image.width) // 2
-        y_offset = (new_image_height - image_height) // 2
-        new_image.paste(c_image, (x_offset, y_offset))
-
-        return new_image
-
-    def create_margined_image(self, source_image: Image, fill_type: Optional[Union[FillMode, FillType, None]],
-                              margin_x=None,  margin_y=None) -> Image:
+    def create_margined_array(self, source_array: np.ndarray,
+                              fill_type: Optional[Union[FillMode, FillType, None]],
+                              margin_x=None, margin_y=None) -> np.ndarray:
+        """
+        Expands and fills an RGBA image array without converting it to a PIL image.
+        """
         if not margin_x:
             margin_x = self.margin_x
 
@@ -64,5 +74,10 @@ class ImageMarginer:
         if not fill_type:
             fill_type = self.fill_type
 
-        expanded_image = ImageMarginer.expand_image(source_image, margin_x, margin_y)
-        return fill_type.fill_image(image=expanded_image)
+        expanded_array = ImageMarginer.expand_array(source_array, margin_x, margin_y)
+        return fill_type.fill_array(expanded_array)
+
+    def create_margined_image(self, source_image: Image, fill_type: Optional[Union[FillMode, FillType, None]],
+                              margin_x=None,  margin_y=None) -> Image:
+        source_array = np.asarray(source_image.convert("RGBA"))
+        return Image.fromarray(self.create_margined_array(source_array, fill_type, margin_x, margin_y))
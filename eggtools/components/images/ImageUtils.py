@@ -1,7 +1,8 @@
 import logging
-from typing import Union
+from typing import Optional, Tuple, Union
 
-from PIL import Image, ImageChops, ImageOps
+import numpy as np
+from PIL import Image, ImageOps
 from panda3d.core import Filename, Vec2
 import os
 
@@ -10,23 +11,12 @@ from panda3d.egg import EggTexture
 from eggtools.components.images.ImageReference import ImageReference
 
 
-def crop_image_to_box(texture: Union[EggTexture, ImageReference], bounding_box: Vec2,
-                      repeat_image: bool = True) -> Image:
+def get_crop_bounds(src_width: int, src_height: int, bounding_box: Vec2) -> Tuple[float, float, float, float]:
     """
-    :param bool repeat_image: If the resultant image is larger than the cropped image, just keep repeating/tiling it.
-    This is useful with meshes that have repeating textures.
+    Converts a UV bounding box into pixel crop bounds for an image of the given size.
 
-    :param texture: An object that holds reference data to a texture
+    :returns: (left, upper, right, lower) in PIL crop order
     """
-    tex_node_name = texture.getName()
-    tex_filename = texture.getFilename()
-
-    image_filepath = Filename.toOsSpecific(tex_filename)
-    if not os.path.isfile(image_filepath):
-        logging.warning(f"Can't find image file {image_filepath} to work with! Skipping crop for TRef {tex_node_name}")
-        return Filename()
-    image_src: Image = Image.open(image_filepath)
-    src_width, src_height = image_src.size
     # Smallest res allowed is 1 pixel
     src_width = max(1, src_width)
     src_height = max(1, src_height)
@@ -46,10 +36,65 @@ def crop_image_to_box(texture: Union[EggTexture, ImageReference], bounding_box:
     if abs(crop_x2 - crop_x1) < 1:
         crop_x2 += crop_x1
 
-    crop_bounds = (
-        crop_x1, crop_y1,
-        crop_x2, crop_y2
-    )
+    return crop_x1, crop_y1, crop_x2, crop_y2
+
+
+def get_tiled_crop_bounds(src_width: int, src_height: int, bounding_box: Vec2) -> Tuple[int, int, int, int]:
+    """
+    Converts a UV bounding box into pixel bounds on an endlessly tiled copy of an image of the given size.
+    Unlike get_crop_bounds, the bounds are not clamped, so negative and >1 UVs land on the neighbouring tiles.
+
+    :returns: (left, upper, right, lower) in PIL crop order
+    """
+    xMin, yMin = bounding_box[0]
+    xMax, yMax = bounding_box[1]
+
+    left = round(src_width * xMin)
+    right = max(round(src_width * xMax), left + 1)
+    # V goes up while image rows go down
+    upper = round(src_height * (1 - yMax))
+    lower = max(round(src_height * (1 - yMin)), upper + 1)
+    return left, upper, right, lower
+
+
+def tile_array_to_box(image_array: np.ndarray, bounding_box: Vec2) -> np.ndarray:
+    """
+    Crops a UV bounding box out of the image as if the image were repeated endlessly in every direction.
+    """
+    src_height, src_width = image_array.shape[:2]
+    left, upper, right, lower = get_tiled_crop_bounds(src_width, src_height, bounding_box)
+    rows = np.arange(upper, lower)
+    cols = np.arange(left, right)
+    return image_array.take(rows, axis = 0, mode = "wrap").take(cols, axis = 1, mode = "wrap")
+
+
+def crop_image_to_box(texture: Union[EggTexture, ImageReference], bounding_box: Vec2,
+                      repeat_image: bool = True) -> Image:
+    """
+    :param bool repeat_image: Crop out of an endlessly repeated/tiled copy of the image, so that bounding boxes
+    that are negative or go past 1 still land on the right pixels.
+    This is useful with meshes that have repeating textures.
+
+    :param texture: An object that holds reference data to a texture
+    """
+    tex_node_name = texture.getName()
+    tex_filename = texture.getFilename()
+
+    image_filepath = Filename.toOsSpecific(tex_filename)
+    if not os.path.isfile(image_filepath):
+        logging.warning(f"Can't find image file {image_filepath} to work with! Skipping crop for TRef {tex_node_name}")
+        return Filename()
+    image_src: Image = Image.open(image_filepath)
+
+    # This is a little bit different than the ImageMarginer's repeat option.
+    # This is an obligation for images that have a repeating texture, which need to conform to the new UVs.
+    if repeat_image:
+        if image_src.mode not in ("L", "LA", "RGB", "RGBA"):
+            image_src = image_src.convert("RGBA")
+        return Image.fromarray(tile_array_to_box(np.asarray(image_src), bounding_box))
+
+    src_width, src_height = image_src.size
+    crop_bounds = get_crop_bounds(src_width, src_height, bounding_box)
 
     try:
         # Sometimes we end up catching stragglers that aren't palettized, which make a fuss
@@ -60,30 +105,6 @@ def crop_image_to_box(texture: Union[EggTexture, ImageReference], bounding_box:
     except:
         return
 
-    crop_width, crop_height = image_cropped.size
-    # Smallest res allowed is 1 pixel
-    crop_width = max(1, crop_width)
-    crop_height = max(1, crop_height)
-
-    # This is a little bit different than the ImageMarginer's repeat option.
-    # This is an obligation for images that have a repeating texture, which need to conform to the new UVs.
-    if repeat_image:
-        if crop_height > src_height or crop_width > src_width:
-            # The cropped image's width/height is larger than the source, we need to repeat it
-            image_crop_copy = image_cropped.copy()
-            pixel_height = 0
-            pixel_width = 0
-
-            while pixel_height < crop_height:
-                image_crop_copy.paste(image_src, (0, pixel_height, src_width, pixel_height + src_height))
-                pixel_height += src_height
-
-            while pixel_width < crop_width:
-                image_crop_copy.paste(image_src, (pixel_width, 0, pixel_width + src_width, src_height))
-                pixel_width += src_width
-
-            image_cropped = image_crop_copy
-
     return image_cropped
 
 
@@ -95,8 +116,76 @@ def get_alpha_mask(image: Image) -> Image:
 
 
 def trim_transparency(image: Image):
-    bg = Image.new(image.mode, image.size)
-    diff = ImageChops.difference(image, bg)
-    bbox = diff.getbbox()
+    bbox = get_trim_bbox(np.asarray(image))
     if bbox:
         return image.crop(bbox)
+
+
+def get_trim_bbox(image_array: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Array equivalent of trim_transparency's bounding box.
+    If the image has an alpha channel, only the alpha channel is considered; otherwise any non-zero channel counts.
+
+    :returns: (left, upper, right, lower) in PIL crop order, or None if the image is empty
+    """
+    if image_array.ndim == 2:
+        content = image_array != 0
+    elif image_array.shape[2] in (2, 4):
+        content = image_array[..., -1] != 0
+    else:
+        content = image_array.any(axis = 2)
+
+    rows = np.flatnonzero(content.any(axis = 1))
+    if not rows.size:
+        return None
+    cols = np.flatnonzero(content.any(axis = 0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+"""
+Array methods
+
+These work on RGBA ndarrays so that a texture only needs to be converted to/from PIL when it is read and written.
+"""
+
+
+def load_image_array(image_filename: Filename) -> Optional[np.ndarray]:
+    """
+    Decodes an image file into a (height, width, 4) RGBA array.
+    """
+    image_filepath = Filename.toOsSpecific(image_filename)
+    if not os.path.isfile(image_filepath):
+        logging.warning(f"Can't find image file {image_filepath} to work with!")
+        return None
+    with Image.open(image_filepath) as image_src:
+        return np.asarray(image_src.convert("RGBA"))
+
+
+def crop_array(image_array: np.ndarray, crop_bounds) -> Optional[np.ndarray]:
+    """
+    Array equivalent of Image.crop. Bounds are rounded the same way, and any area outside of the source image
+    comes back transparent.
+
+    :returns: A view into image_array if the bounds are inside the image, otherwise a new array.
+        None if the bounds are inverted.
+    """
+    left, upper, right, lower = map(int, map(round, crop_bounds))
+    if right < left or lower < upper:
+        return None
+    src_height, src_width = image_array.shape[:2]
+    if left >= 0 and upper >= 0 and right <= src_width and lower <= src_height:
+        return image_array[upper:lower, left:right]
+
+    cropped = np.zeros((lower - upper, right - left) + image_array.shape[2:], dtype = image_array.dtype)
+    x1, y1 = max(left, 0), max(upper, 0)
+    x2, y2 = min(right, src_width), min(lower, src_height)
+    if x2 > x1 and y2 > y1:
+        cropped[y1 - upper:y2 - upper, x1 - left:x2 - left] = image_array[y1:y2, x1:x2]
+    return cropped
+
+
+def save_image_array(image_array: np.ndarray, image_filename: Filename, **image_kwargs) -> None:
+    """
+    Encodes an image array out to disk. This is the only point where the array gets converted back to PIL.
+    """
+    Image.fromarray(image_array).save(Filename.toOsSpecific(image_filename), **image_kwargs)
@@ -0,0 +1,178 @@
+"""
+Convex hulls and bounding volumes over vertex positions, used to fit and build cheap collision geometry.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+
+def convex_hull(points: np.ndarray, tolerance: float = 1e-9) -> List[Tuple[int, int, int]]:
+    """
+    Incremental 3D convex hull.
+
+    :returns: Outward facing (counter-clockwise) triangles, as indices into points.
+        Empty if the points are flat, since they don't enclose anything.
+    """
+    points = np.asarray(points, dtype = float)
+    if len(points) < 4:
+        return []
+    scale = max(float(np.ptp(points, axis = 0).max()), 1.0)
+    epsilon = tolerance * scale
+
+    # Start off from a tetrahedron of points that are as far apart as can be found quickly
+    first = int(np.argmin(points[:, 0]))
+    second = int(np.argmax(np.linalg.norm(points - points[first], axis = 1)))
+    line = points[second] - points[first]
+    if not np.any(line):
+        return []
+    line_distances = np.linalg.norm(np.cross(points - points[first], line), axis = 1)
+    third = int(np.argmax(line_distances))
+    normal = np.cross(line, points[third] - points[first])
+    if np.linalg.norm(normal) <= epsilon:
+        return []
+    plane_distances = (points - points[first]) @ normal
+    fourth = int(np.argmax(np.abs(plane_distances)))
+    if abs(plane_distances[fourth]) / np.linalg.norm(normal) <= epsilon:
+        return []
+
+    interior = points[[first, second, third, fourth]].mean(axis = 0)
+    faces = dict()  # { face id: (a, b, c, normal, offset) }
+    next_face_id = 0
+
+    def add_face(a: int, b: int, c: int) -> None:
+        nonlocal next_face_id
+        face_normal = np.cross(points[b] - points[a], points[c] - points[a])
+        face_normal /= np.linalg.norm(face_normal)
+        offset = face_normal @ points[a]
+        if face_normal @ interior - offset > 0:
+            a, b = b, a
+            face_normal, offset = -face_normal, -offset
+        faces[next_face_id] = (a, b, c, face_normal, offset)
+        next_face_id += 1
+
+    for a, b, c in ((first, second, third), (first, second, fourth), (first, third, fourth), (second, third, fourth)):
+        add_face(a, b, c)
+
+    for point_index in range(len(points)):
+        point = points[point_index]
+        visible = [face_id for face_id, face in faces.items() if face[3] @ point - face[4] > epsilon]
+        if not visible:
+            continue
+        # The horizon is made of the edges of visible faces that border a face that isn't visible
+        visible_edges = set()
+        for face_id in visible:
+            a, b, c = faces[face_id][:3]
+            visible_edges.update(((a, b), (b, c), (c, a)))
+        for face_id in visible:
+            del faces[face_id]
+        for a, b in visible_edges:
+            if (b, a) not in visible_edges:
+                add_face(a, b, point_index)
+
+    return [face[:3] for face in faces.values()]
+
+
+def get_hull_volume(points: np.ndarray, faces: List[Tuple[int, int, int]]) -> float:
+    if not faces:
+        return 0.0
+    corners = np.asarray(points, dtype = float)[np.asarray(faces)]
+    return float(abs(np.einsum("ij,ij->i", corners[:, 0], np.cross(corners[:, 1], corners[:, 2])).sum()) / 6)
+
+
+def fit_aabb(points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :returns: (min corner, max corner)
+    """
+    points = np.asarray(points, dtype = float)
+    return points.min(axis = 0), points.max(axis = 0)
+
+
+def fit_sphere(points: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Sphere around the center of the bounding box.
+
+    :returns: (center, radius)
+    """
+    bounds_min, bounds_max = fit_aabb(points)
+    center = (bounds_min + bounds_max) / 2
+    return center, float(np.linalg.norm(np.asarray(points, dtype = float) - center, axis = 1).max())
+
+
+def fit_obb(points: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Oriented bounding box along the principal axes of the points.
+    Works best on the vertices of the convex hull, since the inside points would otherwise weigh in.
+
+    :returns: (center, axes as the rows of a right-handed rotation, largest spread first, half extents)
+    """
+    points = np.asarray(points, dtype = float)
+    mean = points.mean(axis = 0)
+    centered = points - mean
+    if len(points) > 1:
+        _, eigenvectors = np.linalg.eigh(centered.T @ centered)
+        axes = eigenvectors.T[::-1].copy()
+    else:
+        axes = np.identity(3)
+    if np.linalg.det(axes) < 0:
+        axes[2] = -axes[2]
+    local = centered @ axes.T
+    local_min, local_max = local.min(axis = 0), local.max(axis = 0)
+    return mean + ((local_min + local_max) / 2) @ axes, axes, (local_max - local_min) / 2
+
+
+def fit_min_sphere(points: np.ndarray, iterations: int = 200) -> Tuple[np.ndarray, float]:
+    """
+    Close to minimal bounding sphere: Ritter's sphere, then refined with Badoiu-Clarkson steps
+    towards the farthest point. The result always encloses every point.
+
+    :returns: (center, radius)
+    """
+    points = np.asarray(points, dtype = float)
+    start = points[int(np.argmax(np.linalg.norm(points - points[0], axis = 1)))]
+    end = points[int(np.argmax(np.linalg.norm(points - start, axis = 1)))]
+    center = (start + end) / 2
+    radius = float(np.linalg.norm(end - start)) / 2
+    # Ritter: grow the sphere towards whichever point is farthest outside, until none are
+    for _ in range(len(points)):
+        distances = np.linalg.norm(points - center, axis = 1)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] <= radius:
+            break
+        new_radius = (radius + distances[farthest]) / 2
+        center = center + (points[farthest] - center) * ((distances[farthest] - new_radius) / distances[farthest])
+        radius = new_radius
+    radius = float(np.linalg.norm(points - center, axis = 1).max())
+
+    best_center, best_radius = center, radius
+    for step in range(1, iterations + 1):
+        distances = np.linalg.norm(points - center, axis = 1)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] < best_radius:
+            best_center, best_radius = center, float(distances[farthest])
+        center = center + (points[farthest] - center) / (step + 1)
+    return best_center, best_radius
+
+
+def fit_capsule(points: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Capsule along the longest principal axis, as thin as the points allow
+    and as short as its rounded caps allow.
+
+    :returns: (start, end, radius) with start and end being the centers of the caps
+    """
+    points = np.asarray(points, dtype = float)
+    center, axes, _ = fit_obb(points)
+    axis = axes[0]
+    offsets = points - center
+    along = offsets @ axis
+    distances = np.linalg.norm(offsets - np.outer(along, axis), axis = 1)
+    radius = float(distances.max())
+    # How far past each point along the axis the cap may end while still reaching it
+    reach = np.sqrt(np.maximum(radius ** 2 - distances ** 2, 0))
+    low, high = float((along + reach).min()), float((along - reach).max())
+    if low > high:
+        # Short enough to be a sphere
+        middle = center + axis * (low + high) / 2
+        radius = float(np.linalg.norm(points - middle, axis = 1).max())
+        return middle, middle.copy(), radius
+    return center + axis * low, center + axis * high, radius
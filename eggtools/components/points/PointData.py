@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import List, Optional
 
 from panda3d.core import Filename
 from panda3d.egg import EggTexture
@@ -100,3 +100,43 @@ class PointHelper:
         point_filename = point_datas[0].egg_filename
         point_texture = point_datas[0].egg_texture
         return PointData(point_filename, point_vertexes, point_texture)
+
+    @staticmethod
+    def find_uv_islands(point_datas, precision: int = 6) -> List[List[PointData]]:
+        """
+        Groups PointDatas into UV islands: polygons that share an EggVertex, or a UV coordinate
+        (rounded to the given number of decimals), end up on the same island.
+
+        :returns: [ [ PointData, ... ], ... ] in the order each island was first seen
+        """
+        point_datas = list(point_datas)
+        parents = list(range(len(point_datas)))
+
+        def find(index):
+            while parents[index] != index:
+                # Path halving
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+
+        def union(index_a, index_b):
+            root_a, root_b = find(index_a), find(index_b)
+            if root_a != root_b:
+                # Keep the lowest index as the root so islands stay in their original order
+                parents[max(root_a, root_b)] = min(root_a, root_b)
+
+        owners = dict()  # { EggVertex or (u, v): first PointData index seen with it }
+        for index, pd in enumerate(point_datas):
+            for egg_vertex, (u, v) in pd.egg_vertex_uvs.items():
+                keys = [egg_vertex]
+                if u is not None and v is not None:
+                    keys.append((round(u, precision), round(v, precision)))
+                for key in keys:
+                    owner = owners.setdefault(key, index)
+                    if owner != index:
+                        union(owner, index)
+
+        islands = dict()
+        for index, pd in enumerate(point_datas):
+            islands.setdefault(find(index), []).append(pd)
+        return list(islands.values())
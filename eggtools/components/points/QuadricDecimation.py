@@ -0,0 +1,133 @@
+"""
+Quadric error metric mesh simplification (Garland & Heckbert), using half-edge collapses.
+
+Vertices are only ever merged into one another and never moved, so whatever vertex attributes they carry
+(UVs, normals, colors) stay valid on the simplified mesh.
+"""
+import heapq
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+
+def get_plane_quadrics(positions: np.ndarray, triangles: Sequence[Sequence[int]]) -> np.ndarray:
+    """
+    :returns: Area weighted sum of the plane quadrics around each vertex, shaped (vertex count, 4, 4)
+    """
+    quadrics = np.zeros((len(positions), 4, 4))
+    if not len(triangles):
+        return quadrics
+    triangles = np.asarray(triangles)
+    corners = positions[triangles]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis = 1)
+    valid = lengths > 0
+    unit_normals = normals[valid] / lengths[valid, None]
+    planes = np.hstack([unit_normals, -np.einsum("ij,ij->i", unit_normals, corners[valid, 0])[:, None]])
+    # Twice the area of each triangle is the length of its normal
+    plane_quadrics = np.einsum("ij,ik->ijk", planes, planes) * (lengths[valid, None, None] / 2)
+    for corner in range(3):
+        np.add.at(quadrics, triangles[valid, corner], plane_quadrics)
+    return quadrics
+
+
+def get_boundary_vertices(triangles: Iterable[Sequence[int]]) -> Set[int]:
+    """
+    :returns: Vertices on edges that only one triangle uses
+    """
+    edge_uses = dict()
+    for triangle in triangles:
+        for index in range(3):
+            edge = tuple(sorted((triangle[index], triangle[index - 1])))
+            edge_uses[edge] = edge_uses.get(edge, 0) + 1
+    return {vertex for edge, uses in edge_uses.items() if uses == 1 for vertex in edge}
+
+
+def decimate(positions: Sequence[Sequence[float]], triangles: Sequence[Sequence[int]], target_triangles: int,
+             locked: Set[int] = frozenset(), max_error: Optional[float] = None) -> List[Tuple[int, Tuple[int, ...]]]:
+    """
+    Collapses edges, cheapest first, until no more than target_triangles are left.
+    Collapses that would flip a triangle or make the mesh non-manifold are skipped, so the target can't always be met.
+
+    :param locked: Vertices that must stay where they are, such as ones on UV seams or borders.
+    :param float max_error: Stop once the cheapest collapse costs more than this, in squared distance units.
+    :returns: [ (index of the source triangle, (vertex, vertex, vertex)) ] for each remaining triangle
+    """
+    positions = np.asarray(positions, dtype = float)
+    triangles = [list(triangle) for triangle in triangles]
+    quadrics = get_plane_quadrics(positions, triangles)
+    alive = [True] * len(triangles)
+    alive_count = len(triangles)
+    vertex_triangles = [set() for _ in range(len(positions))]
+    for triangle_index, triangle in enumerate(triangles):
+        for vertex in triangle:
+            vertex_triangles[vertex].add(triangle_index)
+    # Bumped every time a vertex changes, so that stale collapses in the heap can be told apart
+    stamps = [0] * len(positions)
+
+    def get_neighbors(vertex: int) -> Set[int]:
+        return {other for triangle_index in vertex_triangles[vertex] for other in triangles[triangle_index]} - {vertex}
+
+    def get_cost(vertex: int, target: int) -> float:
+        position = np.append(positions[target], 1.0)
+        return float(position @ (quadrics[vertex] + quadrics[target]) @ position)
+
+    def push_collapses(vertex: int, other: int) -> None:
+        for source, target in ((vertex, other), (other, vertex)):
+            if source not in locked:
+                heapq.heappush(heap, (get_cost(source, target), source, target, stamps[source], stamps[target]))
+
+    def get_normal(corners: Sequence[int]) -> np.ndarray:
+        a, b, c = positions[corners[0]], positions[corners[1]], positions[corners[2]]
+        return np.cross(b - a, c - a)
+
+    heap = []
+    for vertex in range(len(positions)):
+        for other in get_neighbors(vertex):
+            if vertex < other:
+                push_collapses(vertex, other)
+
+    while alive_count > target_triangles and heap:
+        cost, source, target, source_stamp, target_stamp = heapq.heappop(heap)
+        if stamps[source] != source_stamp or stamps[target] != target_stamp or not vertex_triangles[source]:
+            continue
+        if max_error is not None and cost > max_error:
+            break
+        shared = {triangle_index for triangle_index in vertex_triangles[source] if target in triangles[triangle_index]}
+        if not shared:
+            continue
+        # Link condition: the only vertices both ends share are the ones across the collapsing triangles
+        if len(get_neighbors(source) & get_neighbors(target)) != len(shared):
+            continue
+
+        flipped = False
+        for triangle_index in vertex_triangles[source] - shared:
+            corners = triangles[triangle_index]
+            old_normal = get_normal(corners)
+            new_normal = get_normal([target if corner == source else corner for corner in corners])
+            if np.dot(old_normal, new_normal) <= 0 or not np.any(new_normal):
+                flipped = True
+                break
+        if flipped:
+            continue
+
+        for triangle_index in shared:
+            alive[triangle_index] = False
+            alive_count -= 1
+            for corner in triangles[triangle_index]:
+                vertex_triangles[corner].discard(triangle_index)
+        for triangle_index in vertex_triangles[source]:
+            corners = triangles[triangle_index]
+            corners[corners.index(source)] = target
+            vertex_triangles[target].add(triangle_index)
+        vertex_triangles[source] = set()
+        quadrics[target] += quadrics[source]
+        stamps[source] += 1
+        stamps[target] += 1
+        for neighbor in get_neighbors(target):
+            push_collapses(target, neighbor)
+
+    return [
+        (triangle_index, tuple(triangle))
+        for triangle_index, triangle in enumerate(triangles) if alive[triangle_index]
+    ]
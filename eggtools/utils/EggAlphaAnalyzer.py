@@ -0,0 +1,216 @@
+import logging
+import os
+from dataclasses import dataclass
+from enum import Enum, auto
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+from panda3d.egg import EggGroup, EggGroupNode, EggPolygon, EggTexture
+
+from eggtools.EggMan import EggMan
+from eggtools.attributes.EggAlphaAttribute import EggAlphaAttribute
+from eggtools.attributes.EggAttribute import EggAttribute
+from eggtools.attributes.EggBinAttribute import EggBinAttribute
+from eggtools.components.EggDataContext import EggDataContext
+from eggtools.components.images import ImageUtils
+from eggtools.utils.TextureCatalog import TextureCatalog
+
+
+class AlphaCoverage(Enum):
+    # Every pixel is (close enough to) fully opaque; the alpha channel does nothing.
+    Opaque = auto()
+    # Pixels are either fully transparent or fully opaque, which an alpha test handles without sorting.
+    Binary = auto()
+    # Partially transparent pixels that need actual blending.
+    Blended = auto()
+
+
+# Alpha modes that draw each coverage without transparency sorting
+coverage2alpha = {
+    AlphaCoverage.Opaque: "off",
+    AlphaCoverage.Binary: "binary",
+}
+
+
+@dataclass
+class AlphaRecommendation:
+    def __str__(self):
+        return f"AlphaRecommendation: {self.egg_texture.getName()} is {self.coverage.name.lower()}" \
+               f" -> {self.alpha_name or 'leave as is'}"
+
+    egg_texture: EggTexture
+    coverage: AlphaCoverage
+
+    # Name of the alpha mode to use, as accepted by EggAlphaAttribute. None if it should be left alone.
+    alpha_name: Optional[str] = None
+
+
+class EggAlphaAnalyzer:
+    """
+    Looks at the alpha channel of every texture to find the ones that don't actually need blending,
+    and picks alpha modes that keep their polygons out of transparency sorting.
+    """
+
+    def __init__(self, file_list: list, eggman: EggMan = None, catalog: TextureCatalog = None,
+                 edge_tolerance: int = 2, max_blend_ratio: float = 0.0, overwrite: bool = False):
+        """
+        :param TextureCatalog catalog: Used to skip decoding textures that have no alpha channel at all.
+        :param int edge_tolerance: Alpha values this close to 0 or 255 still count as fully transparent/opaque.
+        :param float max_blend_ratio: Fraction of partially transparent pixels a texture can have
+            and still be considered binary.
+        :param bool overwrite: Replace alpha modes that were already specified in the egg, such as dual.
+        """
+        self.eggman = eggman
+        if not self.eggman:
+            self.eggman = EggMan(file_list)
+        self.catalog = catalog
+        if not self.catalog:
+            self.catalog = TextureCatalog(file_list, eggman = self.eggman, cache_filename = None)
+        self.edge_tolerance = edge_tolerance
+        self.max_blend_ratio = max_blend_ratio
+        self.overwrite = overwrite
+        # { texture path: AlphaCoverage }
+        self.coverages: Dict[str, Optional[AlphaCoverage]] = dict()
+
+    @staticmethod
+    def classify_alpha(alpha_array: np.ndarray, edge_tolerance: int = 2,
+                       max_blend_ratio: float = 0.0) -> AlphaCoverage:
+        """
+        Classifies an 8-bit alpha channel from its histogram.
+        """
+        histogram = np.bincount(alpha_array.ravel(), minlength = 256)
+        opaque_pixels = histogram[255 - edge_tolerance:].sum()
+        transparent_pixels = histogram[:edge_tolerance + 1].sum()
+        total_pixels = histogram.sum()
+        if opaque_pixels == total_pixels:
+            return AlphaCoverage.Opaque
+        blended_pixels = total_pixels - opaque_pixels - transparent_pixels
+        if blended_pixels <= max_blend_ratio * total_pixels:
+            return AlphaCoverage.Binary
+        return AlphaCoverage.Blended
+
+    def load_alpha(self, egg_texture: EggTexture) -> Optional[np.ndarray]:
+        """
+        :returns: The alpha channel of the texture, taken from its alpha file if it has one.
+            None if the image has no alpha to speak of, or can't be found.
+        """
+        if egg_texture.hasAlphaFilename():
+            alpha_path = egg_texture.getAlphaFullpath().toOsSpecific()
+            if not os.path.isfile(alpha_path):
+                logging.warning(f"Can't find alpha file {alpha_path} to work with!")
+                return None
+            with Image.open(alpha_path) as alpha_image:
+                channel = egg_texture.getAlphaFileChannel()
+                if channel and channel <= len(alpha_image.getbands()):
+                    return np.asarray(alpha_image.getchannel(channel - 1))
+                return np.asarray(alpha_image.convert("L"))
+
+        texture_info = self.catalog.get(egg_texture)
+        if texture_info and not texture_info.has_alpha:
+            return None
+        image_array = ImageUtils.load_image_array(egg_texture.getFullpath())
+        if image_array is None:
+            return None
+        return image_array[..., 3]
+
+    def analyze_texture(self, egg_texture: EggTexture) -> Optional[AlphaCoverage]:
+        """
+        :returns: AlphaCoverage of the texture, or None if it has no alpha channel. Results are cached per image.
+        """
+        texture_key = egg_texture.getFullpath().getFullpath()
+        if egg_texture.hasAlphaFilename():
+            texture_key += f"|{egg_texture.getAlphaFullpath().getFullpath()}:{egg_texture.getAlphaFileChannel()}"
+        if texture_key not in self.coverages:
+            alpha_array = self.load_alpha(egg_texture)
+            coverage = None
+            if alpha_array is not None:
+                coverage = self.classify_alpha(alpha_array, self.edge_tolerance, self.max_blend_ratio)
+            self.coverages[texture_key] = coverage
+        return self.coverages[texture_key]
+
+    @staticmethod
+    def _iter_polygons(egg_node: EggGroupNode):
+        for child in egg_node.getChildren():
+            if isinstance(child, EggPolygon):
+                yield child
+            elif isinstance(child, EggGroupNode):
+                yield from EggAlphaAnalyzer._iter_polygons(child)
+
+    @staticmethod
+    def has_translucent_color(egg_polygon: EggPolygon) -> bool:
+        """
+        Polygon and vertex colors blend on their own, no matter what the texture looks like.
+        """
+        if egg_polygon.hasColor() and egg_polygon.getColor()[3] < 1:
+            return True
+        return any(egg_vertex.hasColor() and egg_vertex.getColor()[3] < 1 for egg_vertex in egg_polygon.getVertices())
+
+    def recommend(self, egg_data: EggDataContext) -> List[AlphaRecommendation]:
+        """
+        Does not affect model/egg data
+        """
+        ctx = self.eggman.egg_datas[egg_data]
+        self.catalog.update()
+
+        # Textures on polygons with translucent colors have to keep blending
+        blended_textures = set()
+        for egg_polygon in self._iter_polygons(egg_data):
+            if self.has_translucent_color(egg_polygon):
+                blended_textures.update(egg_polygon.getTextures())
+
+        recommendations = []
+        for egg_texture in ctx.egg_textures:
+            coverage = self.analyze_texture(egg_texture)
+            if coverage is None:
+                continue
+            alpha_name = coverage2alpha.get(coverage)
+            if egg_texture in blended_textures:
+                alpha_name = None
+            recommendations.append(AlphaRecommendation(egg_texture, coverage, alpha_name))
+        return recommendations
+
+    def get_attributes(self, egg_data: EggDataContext) -> Dict[EggAttribute, List[str]]:
+        """
+        Turns the recommendations into attributes to be used with EggMan.apply_attributes.
+        Alpha modes target the TRef names; groups explicitly placed into the transparent bin
+        are taken out of it if none of their polygons blend anymore.
+        """
+        egg_attributes = dict()
+        unblended_textures = set()
+        for recommendation in self.recommend(egg_data):
+            if not recommendation.alpha_name:
+                continue
+            unblended_textures.add(recommendation.egg_texture)
+            alpha_attribute = next(
+                (attr for attr in egg_attributes if attr.contents == recommendation.alpha_name), None
+            )
+            if not alpha_attribute:
+                alpha_attribute = EggAlphaAttribute(recommendation.alpha_name, overwrite = self.overwrite)
+                egg_attributes[alpha_attribute] = []
+            egg_attributes[alpha_attribute].append(recommendation.egg_texture.getName())
+
+        bin_groups = []
+        for egg_group in self.eggman.egg_datas[egg_data].egg_groups:
+            if not isinstance(egg_group, EggGroup) or egg_group.getBin() != "transparent":
+                continue
+            group_textures = set()
+            for egg_polygon in self._iter_polygons(egg_group):
+                group_textures.update(egg_polygon.getTextures())
+            if group_textures and group_textures <= unblended_textures:
+                bin_groups.append(egg_group.getName())
+        if bin_groups:
+            egg_attributes[EggBinAttribute(None)] = bin_groups
+        return egg_attributes
+
+    def apply(self, egg_data: EggDataContext = None) -> None:
+        """
+        Applies the recommended alpha modes to one egg, or to every egg if none is given.
+
+        WILL affect model/egg data
+        """
+        egg_datas = [egg_data] if egg_data else list(self.eggman.egg_datas.keys())
+        for egg_data in egg_datas:
+            egg_attributes = self.get_attributes(egg_data)
+            if egg_attributes:
+                self.eggman.apply_attributes(egg_data, egg_attributes)
@@ -0,0 +1,255 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from panda3d.core import LMatrix4d, LPoint3d
+from panda3d.egg import EggGroup, EggPolygon, EggVertex, EggVertexPool
+
+from eggtools.EggMan import EggMan
+from eggtools.EggManConfig import NodeNameConfig
+from eggtools.attributes.EggCollideAttribute import EggCollideAttribute, cs2type, flags2type
+from eggtools.components.EggDataContext import EggDataContext
+from eggtools.components.points import BoundingVolumes
+
+
+class BoundingPrimitive(str, Enum):
+    AABB = "aabb"
+    # Box along the principal axes of the geometry, placed through a <Transform> on its collision group
+    OBB = "obb"
+    Sphere = "sphere"
+    Capsule = "capsule"
+
+
+# <Collide> solid each primitive is loaded as
+primitive_solids = {
+    BoundingPrimitive.AABB: "box",
+    BoundingPrimitive.OBB: "box",
+    BoundingPrimitive.Sphere: "sphere",
+    BoundingPrimitive.Capsule: "tube",
+}
+
+# Solid types Panda3D fits by itself from the vertices of the group, which fit_all looks for by default
+fitted_cs_types = (EggGroup.CST_sphere, EggGroup.CST_tube, EggGroup.CST_box)
+
+# Triangles of an octahedron around the origin. Scaled along the axes of a primitive, its vertices average out to
+# the center of a sphere and its tips end up on the ends of a capsule, which is how Panda3D fits those solids.
+octahedron_axes = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]
+octahedron_faces = [(0, 2, 4), (2, 1, 4), (1, 3, 4), (3, 0, 4), (2, 0, 5), (1, 2, 5), (3, 1, 5), (0, 3, 5)]
+
+# Box corners are indexed by their (x, y, z) bits, with 1 being the max side
+box_faces = [
+    (0, 2, 3, 1), (4, 5, 7, 6), (0, 1, 5, 4), (2, 6, 7, 3), (0, 4, 6, 2), (1, 3, 7, 5),
+]
+
+
+@dataclass
+class CollisionFit:
+    def __str__(self):
+        return f"CollisionFit: {self.group_name} {self.primitive.value} ({self.solid}) " \
+               f"volume {self.volume:.4g}, {self.fill:.1%} filled by {self.vertex_count} vertices"
+
+    group_name: str
+    primitive: BoundingPrimitive
+    center: Tuple[float, float, float]
+    # Local axes of the primitive as rows, with the capsule running along the first one
+    axes: Tuple[Tuple[float, float, float], ...]
+    # Half sizes along each axis. A capsule's first one goes from its center out to the tip of a cap.
+    half_extents: Tuple[float, float, float]
+    volume: float
+    # Volume of the convex hull of the vertices, 0 if they're flat
+    hull_volume: float
+    vertex_count: int
+    collide_attribute: Optional[EggCollideAttribute] = None
+
+    @property
+    def solid(self) -> str:
+        return primitive_solids[self.primitive]
+
+    @property
+    def fill(self) -> float:
+        """
+        How much of the primitive is taken up by the geometry, 1 being a perfect fit
+        """
+        return self.hull_volume / self.volume if self.volume else 0.0
+
+    @property
+    def fit_error(self) -> float:
+        return 1 - self.fill
+
+
+class EggCollisionFitter:
+    """
+    Fits bounding volumes around the vertices of groups, so that groups like trigger-spheres
+    can get the collision solid that suits them best along with how closely it matches.
+
+    Does not affect model/egg data, see EggCollisionSimplifier for adding the fitted solids to the eggs.
+    """
+
+    def __init__(self, file_list: list, eggman: EggMan = None,
+                 primitives: Tuple[str, ...] = ("sphere", "aabb", "obb", "capsule")):
+        """
+        :param tuple primitives: Primitives to try, in order of preference when they fit equally well.
+        """
+        self.eggman = eggman
+        if not self.eggman:
+            self.eggman = EggMan(file_list)
+        self.primitives = [BoundingPrimitive(primitive) for primitive in primitives]
+
+    @staticmethod
+    def get_collide_attribute(egg_group: EggGroup, cs_name: str = None) -> EggCollideAttribute:
+        """
+        Mirrors the <Collide> entry of the group, without the keep flag. Groups without one get a polyset.
+        """
+        if egg_group.getCsType() == EggGroup.CST_none:
+            return EggCollideAttribute(cs_name or "polyset", ["descend"])
+        if not cs_name:
+            cs_name = next(name for name, cs_type in cs2type.items() if cs_type == egg_group.getCsType())
+        flags = [
+            name for name, flag in flags2type.items()
+            if flag and name != "keep" and egg_group.getCollideFlags() & flag
+        ]
+        return EggCollideAttribute(cs_name, flags, name = egg_group.getCollisionName())
+
+    def fit_points(self, positions: np.ndarray, group_name: str = "") -> List[CollisionFit]:
+        """
+        :returns: A fit for each primitive, tightest first
+        """
+        positions = np.unique(np.asarray(positions, dtype = float), axis = 0)
+        vertex_count = len(positions)
+        hull_faces = BoundingVolumes.convex_hull(positions)
+        hull_volume = BoundingVolumes.get_hull_volume(positions, hull_faces)
+        if hull_faces:
+            # Only the hull matters to any of the fits, and the principal axes come out better without the inside
+            positions = positions[sorted({index for face in hull_faces for index in face})]
+
+        fits = []
+        for primitive in self.primitives:
+            axes = np.identity(3)
+            if primitive == BoundingPrimitive.AABB:
+                bounds_min, bounds_max = BoundingVolumes.fit_aabb(positions)
+                center, half_extents = (bounds_min + bounds_max) / 2, (bounds_max - bounds_min) / 2
+                volume = 8 * float(np.prod(half_extents))
+            elif primitive == BoundingPrimitive.OBB:
+                center, axes, half_extents = BoundingVolumes.fit_obb(positions)
+                volume = 8 * float(np.prod(half_extents))
+            elif primitive == BoundingPrimitive.Sphere:
+                center, radius = BoundingVolumes.fit_min_sphere(positions)
+                half_extents = np.full(3, radius)
+                volume = 4 / 3 * np.pi * radius ** 3
+            else:
+                start, end, radius = BoundingVolumes.fit_capsule(positions)
+                # The capsule runs along the first principal axis
+                _, axes, _ = BoundingVolumes.fit_obb(positions)
+                center, length = (start + end) / 2, float(np.linalg.norm(end - start))
+                half_extents = np.array([length / 2 + radius, radius, radius])
+                volume = np.pi * radius ** 2 * length + 4 / 3 * np.pi * radius ** 3
+            fits.append(CollisionFit(
+                group_name = group_name,
+                primitive = primitive,
+                center = tuple(float(value) for value in center),
+                axes = tuple(tuple(float(value) for value in axis) for axis in axes),
+                half_extents = tuple(float(value) for value in half_extents),
+                volume = float(volume),
+                hull_volume = hull_volume,
+                vertex_count = vertex_count,
+            ))
+        # sorted() is stable, so primitives that fit equally well (give or take rounding) stay in order of preference
+        return sorted(fits, key = lambda fit: float(f"{fit.volume:.9g}"))
+
+    def fit_group(self, egg_group: EggGroup, egg_vertices: List[EggVertex] = None) -> Optional[CollisionFit]:
+        """
+        :param list egg_vertices: Vertices to fit around, every vertex under the group by default.
+        :returns: The tightest fit, with the <Collide> entry of the group switched over to its solid
+        """
+        if egg_vertices is None:
+            egg_vertices = dict()
+            for egg_polygon in self.get_polygons(egg_group):
+                egg_vertices.update(dict.fromkeys(egg_polygon.getVertices()))
+        if not egg_vertices:
+            return None
+        positions = np.array([tuple(egg_vertex.getPos3()) for egg_vertex in egg_vertices])
+        fit = self.fit_points(positions, egg_group.getName())[0]
+        fit.collide_attribute = self.get_collide_attribute(egg_group, fit.solid)
+        return fit
+
+    @staticmethod
+    def get_polygons(egg_group: EggGroup) -> List[EggPolygon]:
+        polygons = []
+        for child in egg_group.getChildren():
+            if isinstance(child, EggPolygon):
+                polygons.append(child)
+            elif isinstance(child, EggGroup):
+                polygons.extend(EggCollisionFitter.get_polygons(child))
+        return polygons
+
+    def fit_all(self, node_names: List[str] = None, egg_data: Optional[EggDataContext] = None) -> \
+            Dict[str, List[CollisionFit]]:
+        """
+        Fits every group matching the names (wildcards allowed), or by default, every group with a sphere,
+        tube or box <Collide> entry. Vertices are gathered in a single pass over the polygons of each egg.
+
+        :returns: { egg filename: [CollisionFit] }
+        """
+        node_config = NodeNameConfig(set(node_names)) if node_names else None
+        egg_datas = [egg_data] if egg_data else list(self.eggman.egg_datas.keys())
+        report = dict()
+        for egg_data in egg_datas:
+            ctx = self.eggman.egg_datas[egg_data]
+            group_vertices = dict()  # { EggGroup: {EggVertex: None} }
+            for egg_group in ctx.egg_groups:
+                if node_config.check(egg_group.getName()) if node_config else egg_group.getCsType() in fitted_cs_types:
+                    group_vertices[egg_group] = dict()
+            if not group_vertices:
+                continue
+
+            for parent_node, point_datas in ctx.point_data.items():
+                targets = []
+                node = parent_node
+                while isinstance(node, EggGroup):
+                    if node in group_vertices:
+                        targets.append(group_vertices[node])
+                    node = node.getParent()
+                for point_data in point_datas:
+                    for vertices in targets:
+                        vertices.update(dict.fromkeys(point_data.egg_vertex_uvs))
+
+            fits = [self.fit_group(egg_group, list(vertices)) for egg_group, vertices in group_vertices.items()]
+            report[ctx.filename.getFullpath()] = [fit for fit in fits if fit]
+        return report
+
+    @staticmethod
+    def get_solid_geometry(fit: CollisionFit) -> Tuple[List[np.ndarray], List[Tuple[int, ...]]]:
+        """
+        :returns: (corners, faces) of the stand-in geometry Panda3D turns back into the fitted solid
+        """
+        center, axes, half_extents = np.array(fit.center), np.array(fit.axes), np.array(fit.half_extents)
+        if fit.primitive in (BoundingPrimitive.AABB, BoundingPrimitive.OBB):
+            corners = [
+                center + ((np.array([index & 1, index >> 1 & 1, index >> 2 & 1]) * 2 - 1) * half_extents) @ axes
+                for index in range(8)
+            ]
+            return corners, box_faces
+        return [center + (np.array(axis) * half_extents) @ axes for axis in octahedron_axes], octahedron_faces
+
+    @staticmethod
+    def make_collision_group(name: str, fit: CollisionFit) -> EggGroup:
+        """
+        Builds the stand-in geometry of the fit into a new group, ready for the <Collide> entry of its solid.
+        """
+        collision_group = EggGroup(name)
+        vertex_pool = EggVertexPool(name)
+        corners, faces = EggCollisionFitter.get_solid_geometry(fit)
+        if fit.primitive == BoundingPrimitive.OBB:
+            # Boxes are always axis aligned to the node they're on, so the node gets turned to match
+            axes, center = fit.axes, fit.center
+            collision_group.setTransform3d(LMatrix4d(*axes[0], 0, *axes[1], 0, *axes[2], 0, *center, 1))
+
+        egg_vertices = [vertex_pool.makeNewVertex(LPoint3d(*corner)) for corner in corners]
+        for face in faces:
+            egg_polygon = EggPolygon()
+            for index in face:
+                egg_polygon.addVertex(egg_vertices[index])
+            collision_group.addChild(egg_polygon)
+        collision_group.addChild(vertex_pool)
+        return collision_group
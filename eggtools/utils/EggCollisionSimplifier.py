@@ -0,0 +1,203 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from panda3d.core import LPoint3d
+from panda3d.egg import EggGroup, EggGroupNode, EggPolygon, EggVertex, EggVertexPool
+
+from eggtools.EggMan import EggMan
+from eggtools.EggManConfig import NodeNameConfig
+from eggtools.attributes.EggCollideAttribute import EggCollideAttribute
+from eggtools.components.EggDataContext import EggDataContext
+from eggtools.components.points import BoundingVolumes, QuadricDecimation
+from eggtools.utils.EggCollisionFitter import CollisionFit, EggCollisionFitter
+
+
+class CollisionMethod(str, Enum):
+    # Quadric edge collapse of the source polygons, keeping their outline
+    Decimate = "decimate"
+    # Convex hull around the source polygons
+    Hull = "hull"
+
+
+@dataclass
+class CollisionResult:
+    def __str__(self):
+        fit = f", {self.fit_error:.1%} off" if self.fit_error is not None else ""
+        return f"CollisionResult: {self.group_name} {self.source_polygons} polygons -> " \
+               f"{self.solid} with {self.collision_polygons} polygons{fit}"
+
+    group_name: str
+    # Collision solid the copy is made for, such as polyset, sphere, box or tube
+    solid: str
+    source_polygons: int
+    collision_polygons: int
+    # How much bigger the fitted solid is than the convex hull of the source, as a fraction of its volume
+    fit_error: Optional[float] = None
+
+
+class EggCollisionSimplifier:
+    """
+    Replaces the collision polysets that come from full visible meshes with cheap copies:
+    decimated or convex hull polysets, or sphere/box/tube solids when one of them fits closely enough.
+
+    The copy goes into a new <group>_collision group that gets the <Collide> entry,
+    while the original group goes back to being only visible geometry (if it was kept visible at all).
+    """
+
+    def __init__(self, file_list: list, eggman: EggMan = None, method: CollisionMethod = CollisionMethod.Decimate,
+                 ratio: float = 0.25, max_fit_error: float = 0.2,
+                 fit_primitives: Tuple[str, ...] = ("sphere", "aabb", "obb", "capsule")):
+        """
+        :param float ratio: Fraction of the triangles to keep when decimating.
+        :param float max_fit_error: Largest fraction of a fitted solid's volume that may lie outside of the
+            convex hull of the source polygons for it to be used instead of a polyset.
+        :param tuple fit_primitives: Bounding primitives to try fitting, in order of preference.
+        """
+        self.eggman = eggman
+        if not self.eggman:
+            self.eggman = EggMan(file_list)
+        self.method = CollisionMethod(method)
+        self.ratio = ratio
+        self.max_fit_error = max_fit_error
+        self.fitter = EggCollisionFitter(file_list, self.eggman, primitives = fit_primitives)
+
+    @staticmethod
+    def get_polygons(egg_node: EggGroupNode) -> List[EggPolygon]:
+        polygons = []
+        for child in egg_node.getChildren():
+            if isinstance(child, EggPolygon):
+                polygons.append(child)
+            elif isinstance(child, EggGroupNode):
+                polygons.extend(EggCollisionSimplifier.get_polygons(child))
+        return polygons
+
+    def fit_solid(self, positions: np.ndarray) -> Optional[CollisionFit]:
+        """
+        :returns: The tightest fitting solid, or None if nothing fits well enough
+        """
+        fit = self.fitter.fit_points(positions)[0]
+        if not fit.hull_volume or fit.fit_error > self.max_fit_error:
+            return None
+        return fit
+
+    def make_polyset(self, polygons: List[EggPolygon]) -> List[List]:
+        """
+        :returns: Polygons as lists of EggVertices (reused from the source) or positions (new vertices)
+        """
+        egg_vertices = list(dict.fromkeys(
+            egg_vertex for egg_polygon in polygons for egg_vertex in egg_polygon.getVertices()
+        ))
+        positions = np.array([tuple(egg_vertex.getPos3()) for egg_vertex in egg_vertices])
+        if self.method == CollisionMethod.Hull:
+            faces = BoundingVolumes.convex_hull(positions)
+            if faces:
+                return [[tuple(positions[index]) for index in face] for face in faces]
+
+        vertex_ids = {egg_vertex: vertex_id for vertex_id, egg_vertex in enumerate(egg_vertices)}
+        triangles = []
+        for egg_polygon in polygons:
+            face = [vertex_ids[egg_vertex] for egg_vertex in egg_polygon.getVertices()]
+            triangles.extend((face[0], face[index], face[index + 1]) for index in range(1, len(face) - 1))
+        target_triangles = max(1, round(len(triangles) * self.ratio))
+        decimated = QuadricDecimation.decimate(
+            positions, triangles, target_triangles, locked = QuadricDecimation.get_boundary_vertices(triangles)
+        )
+        return [[egg_vertices[vertex_id] for vertex_id in triangle] for _, triangle in decimated]
+
+    @staticmethod
+    def make_collision_group(name: str, polygons: List[List]) -> EggGroup:
+        collision_group = EggGroup(name)
+        vertex_pool = EggVertexPool(name)
+        new_vertices = dict()  # { position: EggVertex }
+        for corners in polygons:
+            egg_polygon = EggPolygon()
+            for corner in corners:
+                if not isinstance(corner, EggVertex):
+                    if corner not in new_vertices:
+                        new_vertices[corner] = vertex_pool.makeNewVertex(LPoint3d(*corner))
+                    corner = new_vertices[corner]
+                egg_polygon.addVertex(corner)
+            collision_group.addChild(egg_polygon)
+        if new_vertices:
+            collision_group.addChild(vertex_pool)
+        return collision_group
+
+    def simplify_group(self, egg_data: EggDataContext, egg_group: EggGroup,
+                       collide_attribute: EggCollideAttribute = None, dry_run: bool = False) -> \
+            Optional[CollisionResult]:
+        """
+        WILL affect model/egg data, unless dry_run is set
+
+        :param EggCollideAttribute collide_attribute: <Collide> entry for the copy. By default it mirrors the group's,
+            switching the solid type if a fitted solid is close enough.
+        """
+        polygons = self.get_polygons(egg_group)
+        if not polygons:
+            return None
+        positions = np.array([
+            tuple(egg_vertex.getPos3()) for egg_polygon in polygons for egg_vertex in egg_polygon.getVertices()
+        ])
+
+        fit = None
+        if not collide_attribute:
+            fit = self.fit_solid(positions)
+        collision_polygons = [] if fit else self.make_polyset(polygons)
+        if not collide_attribute:
+            collide_attribute = self.fitter.get_collide_attribute(egg_group, fit.solid if fit else "polyset")
+        result = CollisionResult(
+            group_name = egg_group.getName(),
+            solid = collide_attribute.contents.split()[0].lower(),
+            source_polygons = len(polygons),
+            collision_polygons = len(self.fitter.get_solid_geometry(fit)[1]) if fit else len(collision_polygons),
+            fit_error = fit.fit_error if fit else None,
+        )
+        if dry_run:
+            return result
+
+        collision_only = egg_group.getCsType() != EggGroup.CST_none and \
+            not egg_group.getCollideFlags() & EggGroup.CF_keep
+        collision_name = f"{egg_group.getName()}_collision"
+        if fit:
+            collision_group = self.fitter.make_collision_group(collision_name, fit)
+        else:
+            collision_group = self.make_collision_group(collision_name, collision_polygons)
+        if collision_only:
+            # Nothing but the collision was ever made out of these
+            for egg_polygon in polygons:
+                egg_polygon.getParent().removeChild(egg_polygon)
+        egg_group.setCsType(EggGroup.CST_none)
+        egg_group.setCollideFlags(EggGroup.CF_none)
+        egg_group.addChild(collision_group)
+        collide_attribute.apply(egg_group, self.eggman.egg_datas[egg_data], node_entries = [collision_group.getName()])
+        return result
+
+    def simplify_all(self, node_names: List[str] = None, egg_data: Optional[EggDataContext] = None,
+                     dry_run: bool = False) -> Dict[str, List[CollisionResult]]:
+        """
+        Simplifies the collisions of every group matching the names (wildcards allowed), or by default,
+        every polyset group.
+
+        :returns: { egg filename: [CollisionResult] }
+        """
+        node_config = NodeNameConfig(set(node_names)) if node_names else None
+        egg_datas = [egg_data] if egg_data else list(self.eggman.egg_datas.keys())
+        report = dict()
+        for egg_data in egg_datas:
+            ctx = self.eggman.egg_datas[egg_data]
+            results = []
+            for egg_group in list(ctx.egg_groups):
+                if node_config:
+                    if not node_config.check(egg_group.getName()):
+                        continue
+                elif egg_group.getCsType() != EggGroup.CST_polyset:
+                    continue
+                result = self.simplify_group(egg_data, egg_group, dry_run = dry_run)
+                if result:
+                    results.append(result)
+            if results:
+                if not dry_run:
+                    self.eggman.rebuild_egg_context(egg_data)
+                report[ctx.filename.getFullpath()] = results
+        return report
@@ -1,12 +1,20 @@
+import hashlib
+import json
+import logging
 import os
-from typing import Optional
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
-from PIL.Image import Image
+import numpy as np
+from PIL import Image
 from panda3d.core import StringStream, LPoint2d, Filename
-from panda3d.egg import EggPolygon, EggNode
+from panda3d.egg import EggPolygon, EggNode, EggTexture
 
 from eggtools.EggMan import EggMan
 from eggtools.components.EggDataContext import EggDataContext
+from eggtools.components.SidecarManifest import SidecarManifest
 from eggtools.components.EggEnums import TextureWrapMode
 from eggtools.components.images.ImageFill import FillTypes, FillType, FillMode
 from eggtools.components.images.ImageMarginer import ImageMarginer
@@ -16,14 +24,119 @@ from eggtools.components.images import ImageUtils, ImageFill
 from eggtools.utils.MarginCalculator import MarginCalculator
 
 
+@dataclass
+class DepalettizeJob:
+    """
+    A single planned crop: the UVs of one texture on one node, cut out of the source palette.
+    """
+
+    def __str__(self):
+        (min_x, min_y), (max_x, max_y) = self.bbox
+        return f"DepalettizeJob: {self.source_filename} [{min_x:.4f}, {min_y:.4f}] -> [{max_x:.4f}, {max_y:.4f}] " \
+               f"-> {self.output_filename if self.palettized else '(not palettized)'}"
+
+    def __hash__(self):
+        return hash(id(self))
+
+    egg_data: EggDataContext
+    egg_node: EggNode
+
+    # Aggregated PointData of every polygon using the source texture on this node
+    point_data: PointData
+
+    # ( [xMin, yMin], [xMax, yMax] )
+    bbox: list
+
+    output_filename: Filename
+
+    # False if the UVs already span the entire texture, meaning there is nothing to crop out.
+    palettized: bool = True
+
+    # Set once the cropped image has been generated.
+    completed: bool = False
+
+    # True if the job only covers one UV island of the texture, rather than every polygon using it on the node.
+    uv_island: bool = False
+
+    @property
+    def source_texture(self) -> EggTexture:
+        return self.point_data.egg_texture
+
+    @property
+    def source_filename(self) -> Filename:
+        return self.point_data.egg_texture.getFilename()
+
+
+@dataclass
+class DepalettizePlan:
+    """
+    Every crop the Depalettizer is going to make, laid out before any images or egg files are touched.
+    Print it out for a dry run.
+    """
+
+    def __str__(self):
+        palette_jobs = self.by_palette()
+        out = f"DepalettizePlan: {len(self.egg_datas)} eggs, {len(self.jobs)} jobs, " \
+              f"{len(palette_jobs)} palettes, {len(self.unpalettized_jobs)} not palettized\n"
+        for palette_name, jobs in palette_jobs.items():
+            out += f"{palette_name} ({len(jobs)} crops)\n"
+            for job in jobs:
+                out += f"    {job.egg_node.getName()} -> {job.output_filename}\n"
+        for job in self.unpalettized_jobs:
+            out += f"{job.source_filename} on {job.egg_node.getName()} is not palettized, skipping\n"
+        return out
+
+    egg_datas: List[EggDataContext] = field(default_factory = list)
+    jobs: List[DepalettizeJob] = field(default_factory = list)
+
+    @property
+    def unpalettized_jobs(self) -> List[DepalettizeJob]:
+        return [job for job in self.jobs if not job.palettized]
+
+    def by_palette(self) -> Dict[str, List[DepalettizeJob]]:
+        """
+        Groups the palettized jobs by their source image, so that each palette only needs to be decoded once.
+
+        { source fullpath: [ DepalettizeJob, ... ] }
+        """
+        palette_jobs = dict()
+        for job in self.jobs:
+            if not job.palettized:
+                continue
+            palette_jobs.setdefault(job.source_filename.getFullpath(), []).append(job)
+        return palette_jobs
+
+    def by_egg(self, egg_data: EggDataContext) -> List[DepalettizeJob]:
+        return [job for job in self.jobs if job.egg_data is egg_data]
+
+
+class DepalettizeManifest(SidecarManifest):
+    """
+    Kept next to the cropped images. Crops whose source palette, UV bbox, fill type and padding
+    have not changed since can be reused.
+    """
+    MANIFEST_NAME = "depalettize_manifest.json"
+
+
 # how to debug:
 # compare the size of the unused space (margins) with the texture and the uvs
 class Depalettizer:
     def __init__(self, file_list: list, padding_u: float = 0.001, padding_v: float = 0.001,
-                 default_fill_type: ImageFill.FillType = ImageFill.UnknownFill, eggman: EggMan = None):
+                 default_fill_type: ImageFill.FillType = ImageFill.UnknownFill, eggman: EggMan = None,
+                 incremental: bool = False, pipeline_threads: int = 2, pipeline_queue_size: int = 4,
+                 split_uv_islands: bool = False):
         """
         By default, padding is equivalent to 1% of the texture size [0-1]
         (meaning that the uv would effectively be 99% of its normalized scale)
+
+        :param bool incremental: Reuse cropped images from a previous run if their source palette, UV bbox,
+            fill type and padding have not changed since. Keeps a depalettize_manifest.json next to the
+            cropped images to tell, see DepalettizeManifest.
+        :param int pipeline_threads: Number of threads for each stage (decode, crop, write) of the image pipeline.
+        :param int pipeline_queue_size: How many decoded palettes, and cropped images, may wait between stages.
+        :param bool split_uv_islands: Crop each UV island of a texture on its own, instead of one bbox around
+            every polygon using it on the node. Saves a lot of texture space when the UVs are scattered
+            across the palette.
         """
         self.eggman = eggman
         if not self.eggman:
@@ -32,6 +145,10 @@ class Depalettizer:
         self.padding_u = max(padding_u, 0.00000000001)
         self.padding_v = max(padding_v, 0.00000000001)
         self.default_fill_type = default_fill_type
+        self.incremental = incremental
+        self.pipeline_threads = max(pipeline_threads, 1)
+        self.pipeline_queue_size = max(pipeline_queue_size, 1)
+        self.split_uv_islands = split_uv_islands
 
         # Problem: You cannot just add new textures to a texture collection or to polygons. You think it would be easy?
         # No, we need to effectively 'inject' these new texture headers into our working EggData.
@@ -66,25 +183,50 @@ class Depalettizer:
                           image_kwargs: dict,
                           write_to_disk: bool = True,
                           fill_type: ImageFill.FillType = None,
-                          ) -> Optional[Image]:
+                          ) -> Optional[Image.Image]:
         """
         :param PointData point_data: Includes the texture and uvs needed to generate a bbox
         """
+        expanded_array = self.depalettize_array(point_data, fill_type)
+        if expanded_array is None:
+            return
+
+        if write_to_disk:
+            self.write_image(expanded_array, dest_file, image_kwargs)
+        return Image.fromarray(expanded_array)
+
+    def depalettize_array(self,
+                          point_data: PointData,
+                          fill_type: ImageFill.FillType = None,
+                          source_array: np.ndarray = None,
+                          ) -> Optional[np.ndarray]:
+        """
+        The palette is decoded once into an RGBA array, and the crop, margin expansion and fill all happen on arrays.
+        It only gets converted back into an image when it is written out.
+
+        :param PointData point_data: Includes the texture and uvs needed to generate a bbox
+        :param source_array: Already decoded RGBA array of the palette. It is loaded from disk if not given.
+        :returns: The depalettized image as an RGBA/RGB array
+        """
         if not fill_type:
             fill_type = self.default_fill_type
 
         # If we can't create a cropped image let's bounce before something explodes for now
         bbox_coords = point_data.get_bbox()
-        source_texture = point_data.egg_texture
-        cropped_texture = ImageUtils.crop_image_to_box(
-            texture = source_texture,
-            bounding_box = bbox_coords,
-            repeat_image = False
+        if source_array is None:
+            source_array = ImageUtils.load_image_array(point_data.egg_texture.getFilename())
+        if source_array is None:
+            return
+
+        src_height, src_width = source_array.shape[:2]
+        cropped_array = ImageUtils.crop_array(
+            source_array, ImageUtils.get_crop_bounds(src_width, src_height, bbox_coords)
         )
-        if not cropped_texture:
+        # Sometimes we end up catching stragglers that aren't palettized, which make a fuss
+        if cropped_array is None or not cropped_array.size:
             return
 
-        crop_width, crop_height = cropped_texture.size
+        crop_height, crop_width = cropped_array.shape[:2]
 
         margin_coords, _ = MarginCalculator.get_margined_by_ratio(
             crop_width, crop_height,
@@ -92,36 +234,36 @@ class Depalettizer:
         )
         margin_x, margin_y = margin_coords
 
-        expanded_image = ImageMarginer().create_margined_image(cropped_texture, fill_type, margin_x, margin_y)
+        return ImageMarginer().create_margined_array(cropped_array, fill_type, margin_x, margin_y)
 
-        if write_to_disk:
-            file_ext = dest_file.getExtension()
-
-            if file_ext == "png":
-                image_kwargs['quality'] = 95  # intended
-            elif file_ext == "jpg":
-                # imageKwargs['subsampling'] = 0
-                image_kwargs['quality'] = 'keep'
-            expanded_image.save(
-                Filename.toOsSpecific(dest_file),
-                **image_kwargs
-            )
-        return expanded_image
+    @staticmethod
+    def write_image(image_array: np.ndarray, dest_file: Filename, image_kwargs: dict) -> None:
+        image_kwargs = dict(image_kwargs)
+        file_ext = dest_file.getExtension()
 
-    def depalettize_node(self,
-                         egg_data: EggDataContext, egg_node: EggNode,
-                         image_kwargs: dict = None,
-                         uv_wrap_mode: TextureWrapMode = TextureWrapMode.Unspecified,
-                         ):
+        if file_ext == "png":
+            image_kwargs['quality'] = 95  # intended
+        elif file_ext == "jpg":
+            # imageKwargs['subsampling'] = 0
+            image_kwargs['quality'] = 'keep'
+        ImageUtils.save_image_array(image_array, dest_file, **image_kwargs)
+
+    @staticmethod
+    def is_palettized(bbox) -> bool:
         """
-        Depalettizes an EggNode completely.
+        UVs that already cover the whole texture have nothing to gain from being cropped.
+        """
+        (min_x, min_y), (max_x, max_y) = bbox
+        return not (min_x <= 0 and min_y <= 0 and max_x >= 1 and max_y >= 1)
 
-        WILL affect model/egg data
+    def plan_node(self, egg_data: EggDataContext, egg_node: EggNode) -> List[DepalettizeJob]:
         """
-        if not image_kwargs:
-            image_kwargs = dict()
+        Plans out the crops for every texture used on an EggNode.
 
+        Does not affect model/egg data
+        """
         ctx = self.eggman.egg_datas[egg_data]
+        jobs = []
         i = 0
 
         # Nodes will most likely contain numerous of textures. We can group related polygons by mutual textures.
@@ -132,57 +274,286 @@ class Depalettizer:
             # Well, now we have PointDatas whose only differences are the different egg_vertex_uvs.
             # Let's aggregate them...
             point_datas = point_texture_lookup[point_texture]
+            point_groups = [point_datas]
+            if self.split_uv_islands:
+                point_groups = PointHelper.find_uv_islands(point_datas)
+
+            for point_group in point_groups:
+                # THIS is all of our aggregated point data. Don't mind the similar variable names here.
+                point_data = PointHelper.unify_point_datas(point_group)
+
+                # sometimes we get a food truck with no food
+                if not point_data:
+                    continue
+
+                bbox = point_data.get_bbox()
+                palettized = self.is_palettized(bbox)
+
+                file_ext = point_texture.getFilename().getExtension().lower()
+                image_cropped_name = point_texture.getFilename().getBasenameWoExtension() + f"_cropped_" \
+                                                                                            f"{egg_node.getName()}_{i}"
+                # At the very moment lets not try to merge node textures who share identical cropped textures
+                image_cropped_filename = Filename.fromOsSpecific(
+                    os.path.join(
+                        point_data.egg_filename.getDirname(),
+                        f"{image_cropped_name}.{file_ext}"
+
+                    )
+                )
+                jobs.append(DepalettizeJob(
+                    egg_data = egg_data,
+                    egg_node = egg_node,
+                    point_data = point_data,
+                    bbox = bbox,
+                    output_filename = image_cropped_filename,
+                    palettized = palettized,
+                    uv_island = len(point_groups) > 1,
+                ))
+                if palettized:
+                    i += 1
+
+        return jobs
+
+    def plan_egg(self, egg_data: EggDataContext, plan: DepalettizePlan = None) -> DepalettizePlan:
+        """
+        Plans out the crops for every node of an Egg file (EggData).
+        """
+        if not plan:
+            plan = DepalettizePlan()
+        plan.egg_datas.append(egg_data)
+        ctx = self.eggman.egg_datas[egg_data]
+        if ctx.configured:
+            for egg_node in ctx.point_data.keys():
+                plan.jobs.extend(self.plan_node(egg_data, egg_node))
+        return plan
 
-            # THIS is all of our aggregated point data. Don't mind the similar variable names here.
-            point_data = PointHelper.unify_point_datas(point_datas)
+    def plan_all(self) -> DepalettizePlan:
+        """
+        Plans out the crops for all Egg files registered in EggMan, without writing or modifying anything.
+        """
+        plan = DepalettizePlan()
+        # Take a snapshot, we do not want to traverse any new registries into EggMan.
+        # can't use a deep copy here..
+        context_snapshot = [*self.eggman.egg_datas.keys()]
+        for egg_data in context_snapshot:
+            ctx = self.eggman.egg_datas.get(egg_data)
+            if ctx and not ctx.egg_generated:
+                self.plan_egg(egg_data, plan)
+        return plan
 
-            # sometimes we get a food truck with no food
-            if not point_data:
-                continue
+    def fingerprint_job(self, job: DepalettizeJob, image_kwargs: dict = None) -> str:
+        """
+        Hashes everything that goes into a job's cropped image:
+        the source palette on disk, the UV bbox, the fill type, the padding and the image options.
+        """
+        source_path = job.source_filename.toOsSpecific()
+        source_stat = os.stat(source_path) if os.path.isfile(source_path) else None
+
+        fill_type = self.default_fill_type
+        if isinstance(fill_type, FillMode):
+            fill_type = fill_type.value
+        if isinstance(fill_type, type):
+            fill_type_desc = fill_type.__name__
+        else:
+            fill_type_desc = f"{type(fill_type).__name__}{sorted(vars(fill_type).items())}"
+
+        job_inputs = {
+            "source": job.source_filename.getFullpath(),
+            "source_mtime": source_stat.st_mtime_ns if source_stat else None,
+            "source_size": source_stat.st_size if source_stat else None,
+            "bbox": [[round(float(coord), 8) for coord in corner] for corner in job.bbox],
+            "fill_type": fill_type_desc,
+            "padding": [self.padding_u, self.padding_v],
+            "image_kwargs": sorted((image_kwargs or dict()).items()),
+        }
+        return hashlib.sha1(json.dumps(job_inputs, sort_keys = True, default = str).encode("utf-8")).hexdigest()
+
+    def generate_images(self, jobs: List[DepalettizeJob], image_kwargs: dict = None) -> None:
+        """
+        Generates the cropped images for the given jobs, decoding each source palette only once.
+        If incremental, images that are still up to date with their manifest entry are reused as-is.
+        """
+        if not image_kwargs:
+            image_kwargs = dict()
 
-            # Generates and writes out the new texture images.
-            file_ext = point_texture.getFilename().getExtension().lower()
+        manifests = dict()  # { output directory: DepalettizeManifest }
+        reused = 0
+        # Palettes that have nothing left to crop are never decoded
+        stale_palettes = []
+
+        plan = DepalettizePlan(jobs = jobs)
+        for palette_jobs in plan.by_palette().values():
+            stale_jobs = []
+            for job in palette_jobs:
+                if not self.incremental:
+                    stale_jobs.append((job, None, None))
+                    continue
+                output_path = job.output_filename.toOsSpecific()
+                output_dir = os.path.dirname(output_path)
+                if output_dir not in manifests:
+                    manifests[output_dir] = DepalettizeManifest(output_dir)
+                job_fingerprint = self.fingerprint_job(job, image_kwargs)
+                if manifests[output_dir].is_up_to_date(output_path, job_fingerprint):
+                    job.completed = True
+                    reused += 1
+                else:
+                    stale_jobs.append((job, manifests[output_dir], job_fingerprint))
+
+            if stale_jobs:
+                stale_palettes.append((palette_jobs[0].source_filename, stale_jobs))
+
+        self.run_image_pipeline(stale_palettes, image_kwargs)
+
+        for manifest in manifests.values():
+            manifest.save()
+        if reused:
+            logging.info(f"Reused {reused} up-to-date cropped images")
+
+    def run_image_pipeline(self, stale_palettes: list, image_kwargs: dict) -> None:
+        """
+        Decodes, crops and writes out images on three stages of worker threads, so that disk I/O and
+        image encoding overlap with the cropping and filling of other palettes.
 
-            image_cropped_name = point_texture.getFilename().getBasenameWoExtension() + f"_cropped_" \
-                                                                                        f"{egg_node.getName()}_{i}"
-            # At the very moment lets not try to merge node textures who share identical cropped textures
-            image_cropped_filename = Filename.fromOsSpecific(
-                os.path.join(
-                    point_data.egg_filename.getDirname(),
-                    f"{image_cropped_name}.{file_ext}"
+        The queues between stages are bounded; a stage that gets ahead of the next one blocks instead of
+        holding every decoded palette in memory at once.
 
-                )
-            )
-            depal_texture = self.depalettize_image(point_data, image_cropped_filename, image_kwargs)
+        :param list stale_palettes: [ (source Filename, [ (DepalettizeJob, DepalettizeManifest, fingerprint), ... ]) ]
+            The manifest and fingerprint are None when not running incrementally.
+        """
+        palette_queue = queue.Queue()
+        decoded_queue = queue.Queue(maxsize = self.pipeline_queue_size)
+        encode_queue = queue.Queue(maxsize = self.pipeline_queue_size)
+        manifest_lock = threading.Lock()
+
+        def read_palettes():
+            while (item := palette_queue.get()) is not None:
+                source_filename, stale_jobs = item
+                try:
+                    source_array = ImageUtils.load_image_array(source_filename)
+                except Exception:
+                    logging.exception(f"Couldn't decode palette {source_filename}")
+                    continue
+                if source_array is not None:
+                    decoded_queue.put((source_array, stale_jobs))
+
+        def crop_images():
+            while (item := decoded_queue.get()) is not None:
+                source_array, stale_jobs = item
+                for job, manifest, job_fingerprint in stale_jobs:
+                    try:
+                        image_array = self.depalettize_array(job.point_data, source_array = source_array)
+                    except Exception:
+                        logging.exception(f"Couldn't crop {job.output_filename}")
+                        continue
+                    if image_array is not None:
+                        encode_queue.put((job, image_array, manifest, job_fingerprint))
+
+        def write_images():
+            while (item := encode_queue.get()) is not None:
+                job, image_array, manifest, job_fingerprint = item
+                try:
+                    self.write_image(image_array, job.output_filename, image_kwargs)
+                except Exception:
+                    logging.exception(f"Couldn't write {job.output_filename}")
+                    continue
+                job.completed = True
+                if manifest is not None:
+                    with manifest_lock:
+                        manifest.record(job.output_filename.toOsSpecific(), job_fingerprint)
+
+        def start_stage(target, stage_queue: queue.Queue = None) -> List[threading.Thread]:
+            threads = [threading.Thread(target = target, daemon = True) for _ in range(self.pipeline_threads)]
+            for thread in threads:
+                thread.start()
+                if stage_queue is not None:
+                    stage_queue.put(None)
+            return threads
+
+        def finish_stage(threads: List[threading.Thread], next_queue: queue.Queue = None) -> None:
+            for thread in threads:
+                thread.join()
+            # One sentinel per thread of the next stage, only once everything upstream has been queued
+            if next_queue is not None:
+                for _ in range(self.pipeline_threads):
+                    next_queue.put(None)
+
+        for palette in stale_palettes:
+            palette_queue.put(palette)
+        readers = start_stage(read_palettes, palette_queue)
+        croppers = start_stage(crop_images)
+        writers = start_stage(write_images)
+
+        finish_stage(readers, decoded_queue)
+        finish_stage(croppers, encode_queue)
+        finish_stage(writers)
+
+    def apply_job(self, job: DepalettizeJob, uv_wrap_mode: TextureWrapMode = TextureWrapMode.Unspecified) -> None:
+        """
+        Points the polygons of a completed job to their cropped texture.
 
-            if not depal_texture:
-                continue
+        WILL affect model/egg data
+        """
+        if not job.completed:
+            return
+
+        ctx = self.eggman.egg_datas[job.egg_data]
+        point_data = job.point_data
+        image_cropped_filename = job.output_filename
 
-            # Cross my fingers that this works babyy!!
-            self.normalize_uvs(point_data)
+        # Cross my fingers that this works babyy!!
+        self.normalize_uvs(point_data)
+
+        # Generate a new EggTexture, only differences here is just the filename/paths.
+        egg_texture_new = self.eggman.rebase_egg_texture(
+            image_cropped_filename.getBasenameWoExtension(), image_cropped_filename, point_data.egg_texture
+        )
 
-            # Generate a new EggTexture, only differences here is just the filename/paths.
-            egg_texture_new = self.eggman.rebase_egg_texture(
-                image_cropped_filename.getBasenameWoExtension(), image_cropped_filename, point_data.egg_texture
-            )
+        recorded_texture = ctx.egg_texture_collection.findFilename(egg_texture_new.getFilename())
 
-            recorded_texture = ctx.egg_texture_collection.findFilename(egg_texture_new.getFilename())
+        if not recorded_texture:
+            # Adding the new texture into our records.
+            ctx.add_collect_texture(egg_texture_new)
+            self.raw_data.append(egg_texture_new)
+            recorded_texture = egg_texture_new
 
-            if not recorded_texture:
-                # Adding the new texture into our records.
-                ctx.add_collect_texture(egg_texture_new)
-                self.raw_data.append(egg_texture_new)
-                recorded_texture = egg_texture_new
+        for child in job.egg_node.getChildren():
+            if isinstance(child, EggPolygon):
+                # Other islands of the same texture get their own crop
+                if job.uv_island and not all(vertex in point_data.egg_vertex_uvs for vertex in child.getVertices()):
+                    continue
+                if recorded_texture not in ctx.get_used_node_textures(child):
+                    child.clearTexture()
+                    child.addTexture(recorded_texture)
 
-            for child in egg_node.getChildren():
-                if isinstance(child, EggPolygon):
-                    if recorded_texture not in ctx.get_used_node_textures(child):
-                        child.clearTexture()
-                        child.addTexture(recorded_texture)
+        point_data.egg_texture.setWrapU(uv_wrap_mode)
+        point_data.egg_texture.setWrapV(uv_wrap_mode)
+
+    def execute_plan(self, plan: DepalettizePlan, image_opts: dict = None,
+                     uv_wrap_mode: TextureWrapMode = TextureWrapMode.Unspecified) -> None:
+        """
+        Generates every image in the plan first, and then updates each planned egg.
+        """
+        self.generate_images(plan.jobs, image_kwargs = image_opts)
+        for egg_data in plan.egg_datas:
+            self.raw_data = []
+            for job in plan.by_egg(egg_data):
+                self.apply_job(job, uv_wrap_mode = uv_wrap_mode)
+            self.append_new_eggdata(egg_data)
+
+    def depalettize_node(self,
+                         egg_data: EggDataContext, egg_node: EggNode,
+                         image_kwargs: dict = None,
+                         uv_wrap_mode: TextureWrapMode = TextureWrapMode.Unspecified,
+                         ):
+        """
+        Depalettizes an EggNode completely.
 
-            point_data.egg_texture.setWrapU(uv_wrap_mode)
-            point_data.egg_texture.setWrapV(uv_wrap_mode)
-            i += 1
+        WILL affect model/egg data
+        """
+        jobs = self.plan_node(egg_data, egg_node)
+        self.generate_images(jobs, image_kwargs = image_kwargs)
+        for job in jobs:
+            self.apply_job(job, uv_wrap_mode = uv_wrap_mode)
 
         return True
 
@@ -205,30 +576,31 @@ class Depalettizer:
         ctx.egg_generated = True
 
     def depalettize_egg(self, egg_data: EggDataContext, image_opts: dict = None,
-                        uv_wrap_mode: TextureWrapMode = TextureWrapMode.Unspecified):
+                        uv_wrap_mode: TextureWrapMode = TextureWrapMode.Unspecified, dry_run: bool = False):
         """
         Depalettizes an Egg file (EggData) completely.
 
-        :param bool clamp_uvs: Sets the UV wrap mode to clamp. Strongly recommended due to padding artifacts.
+        :param TextureWrapMode uv_wrap_mode: Clamp is strongly recommended due to padding artifacts.
+        :param bool dry_run: Only plan out the crops, without writing images or modifying the egg.
+        :returns: The DepalettizePlan that was (or would have been) executed
         """
-        self.raw_data = []
-        ctx = self.eggman.egg_datas[egg_data]
-        for egg_node in ctx.point_data.keys():
-            if ctx.configured:
-                self.depalettize_node(egg_data, egg_node, image_kwargs = image_opts, uv_wrap_mode = uv_wrap_mode)
-                # ctx.merge_replace(new_ctx)
-        self.append_new_eggdata(egg_data)
+        plan = self.plan_egg(egg_data)
+        if not dry_run:
+            self.execute_plan(plan, image_opts = image_opts, uv_wrap_mode = uv_wrap_mode)
+        return plan
 
-    def depalettize_all(self, image_opts: dict = None, uv_wrap_mode: TextureWrapMode = TextureWrapMode.Unspecified):
+    def depalettize_all(self, image_opts: dict = None, uv_wrap_mode: TextureWrapMode = TextureWrapMode.Unspecified,
+                        dry_run: bool = False):
         """
         Depalettizes all Egg files registered in EggMan.
+
+        :param bool dry_run: Only plan out the crops, without writing images or modifying any eggs.
+        :returns: The DepalettizePlan that was (or would have been) executed
         """
-        # Take a snapshot, we do not want to traverse any new registries into EggMan.
-        # can't use a deep copy here..
-        context_snapshot = [*self.eggman.egg_datas.keys()]
-        for egg_data in context_snapshot:
-            ctx = self.eggman.egg_datas.get(egg_data)
-            if ctx and not ctx.egg_generated:
-                self.depalettize_egg(egg_data, image_opts = image_opts, uv_wrap_mode = uv_wrap_mode)
+        plan = self.plan_all()
+        if dry_run:
+            return plan
 
+        self.execute_plan(plan, image_opts = image_opts, uv_wrap_mode = uv_wrap_mode)
         self.eggman.remove_texture_duplicates()
+        return plan
@@ -0,0 +1,255 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from panda3d.core import LPoint3d
+from panda3d.egg import EggGroup, EggGroupNode, EggPolygon, EggSwitchConditionDistance, EggVertex
+
+from eggtools.EggMan import EggMan
+from eggtools.EggManConfig import NodeNameConfig
+from eggtools.components.EggDataContext import EggDataContext
+from eggtools.components.points import QuadricDecimation
+
+
+@dataclass
+class LODLevel:
+    """
+    One <SwitchCondition> band. A level is shown from the previous level's distance out to its own.
+    """
+
+    def __str__(self):
+        return f"LODLevel: {self.ratio:.0%} of the triangles up to {self.distance}"
+
+    # Fraction of the triangles to keep. A ratio of 1 keeps the original polygons.
+    ratio: float
+    distance: float
+
+
+# Same bands as the hand-made -1000/-500/-250 LOD eggs
+DEFAULT_LEVELS = [LODLevel(1.0, 70), LODLevel(0.5, 125), LODLevel(0.25, 10000000)]
+
+
+class EggLODGenerator:
+    """
+    Builds reduced polygon copies of groups through quadric edge collapse,
+    and wraps them into <SwitchCondition> groups so that Panda3D loads them as an LODNode.
+
+    Vertices on UV seams, borders and texture/state boundaries are never collapsed,
+    so seams stay closed and every polygon keeps the textures of the polygon it came from.
+    """
+
+    def __init__(self, file_list: list, eggman: EggMan = None, levels: List[LODLevel] = None,
+                 lock_borders: bool = True, seam_precision: int = 6):
+        """
+        :param list levels: LOD levels, nearest first. The nearest one shows the original polygons,
+            so it needs a ratio of 1.
+        :param bool lock_borders: Keep the outline of open meshes in place.
+        :param int seam_precision: Decimal places vertex positions are compared with to find UV seams.
+        """
+        self.eggman = eggman
+        if not self.eggman:
+            self.eggman = EggMan(file_list)
+        self.levels = sorted(levels or DEFAULT_LEVELS, key = lambda level: level.distance)
+        if self.levels[0].ratio < 1:
+            raise ValueError(f"The nearest LOD level holds the original polygons, expected a ratio of 1, "
+                             f"got {self.levels[0].ratio}")
+        self.lock_borders = lock_borders
+        self.seam_precision = seam_precision
+
+    @staticmethod
+    def is_collision_only(egg_group: EggGroup) -> bool:
+        return egg_group.getCsType() != EggGroup.CST_none and not egg_group.getCollideFlags() & EggGroup.CF_keep
+
+    def get_lod_polygons(self, egg_node: EggGroupNode) -> List[EggPolygon]:
+        """
+        :returns: Every visible polygon under the node. Collision geometry and existing LODs are left out.
+        """
+        polygons = []
+        for child in egg_node.getChildren():
+            if isinstance(child, EggPolygon):
+                polygons.append(child)
+            elif isinstance(child, EggGroup):
+                if not self.is_collision_only(child) and not child.hasLod():
+                    polygons.extend(self.get_lod_polygons(child))
+            elif isinstance(child, EggGroupNode):
+                polygons.extend(self.get_lod_polygons(child))
+        return polygons
+
+    @staticmethod
+    def is_same_vertex(egg_vertex: EggVertex, other: EggVertex) -> bool:
+        """
+        True if the vertices are in the same pool and only differ by position, which the caller has already rounded off.
+        """
+        if egg_vertex.getPool() != other.getPool():
+            return False
+        probe = EggVertex(egg_vertex)
+        probe.setPos4(other.getPos4())
+        probe.setExternalIndex(other.getExternalIndex())
+        return probe.compareTo(other) == 0
+
+    def decimate_polygons(self, polygons: List[EggPolygon], ratio: float) -> List[Tuple[EggPolygon, EggPolygon]]:
+        """
+        Does not affect model/egg data
+
+        :returns: [(source polygon, new triangle)], the triangles reusing the original vertices and polygon attributes
+        """
+        # Unwelded meshes give every polygon its own copy of a vertex. Copies that match apart from rounding
+        # are welded into one node, so that only vertices that really differ are left sharing a position.
+        vertex_ids = dict()  # { EggVertex: id }
+        egg_vertices: List[EggVertex] = []  # the first vertex of each node
+        position_vertices = dict()  # { rounded position: [id] }
+        triangles = []
+        triangle_polygons = []  # index of the source polygon of each triangle
+        vertex_states = dict()  # { id: {polygon state key} }
+        for polygon_index, egg_polygon in enumerate(polygons):
+            face = []
+            state_key = EggMan.get_polygon_state_key(egg_polygon)
+            for egg_vertex in egg_polygon.getVertices():
+                if egg_vertex not in vertex_ids:
+                    position_key = tuple(round(coordinate, self.seam_precision) for coordinate in egg_vertex.getPos3())
+                    node_ids = position_vertices.setdefault(position_key, [])
+                    vertex_ids[egg_vertex] = next(
+                        (node_id for node_id in node_ids if self.is_same_vertex(egg_vertex, egg_vertices[node_id])),
+                        len(egg_vertices)
+                    )
+                    if vertex_ids[egg_vertex] == len(egg_vertices):
+                        node_ids.append(len(egg_vertices))
+                        egg_vertices.append(egg_vertex)
+                face.append(vertex_ids[egg_vertex])
+                vertex_states.setdefault(vertex_ids[egg_vertex], set()).add(state_key)
+            for index in range(1, len(face) - 1):
+                triangle = (face[0], face[index], face[index + 1])
+                # Degenerate triangles can't survive welding
+                if len(set(triangle)) == 3:
+                    triangles.append(triangle)
+                    triangle_polygons.append(polygon_index)
+
+        positions = [tuple(egg_vertex.getPos3()) for egg_vertex in egg_vertices]
+        # Nodes still sharing a position with another node sit on a UV, normal or color seam
+        locked = {
+            vertex_id for vertex_list in position_vertices.values() if len(vertex_list) > 1 for vertex_id in vertex_list
+        }
+        locked.update(vertex_id for vertex_id, state_keys in vertex_states.items() if len(state_keys) > 1)
+        if self.lock_borders:
+            locked.update(QuadricDecimation.get_boundary_vertices(triangles))
+
+        target_triangles = max(1, round(len(triangles) * ratio))
+        decimated = QuadricDecimation.decimate(positions, triangles, target_triangles, locked = locked)
+        if len(decimated) > target_triangles:
+            logging.info(
+                f"Could only reduce {len(triangles)} triangles to {len(decimated)} instead of {target_triangles}"
+            )
+
+        new_polygons = []
+        for triangle_index, triangle in decimated:
+            # Copies the textures, material, color and render modes of the original polygon
+            source_polygon = polygons[triangle_polygons[triangle_index]]
+            new_polygon = EggPolygon(source_polygon)
+            new_polygon.clear()
+            for vertex_id in triangle:
+                new_polygon.addVertex(egg_vertices[vertex_id])
+            new_polygons.append((source_polygon, new_polygon))
+        return new_polygons
+
+    @staticmethod
+    def get_center(polygons: List[EggPolygon]) -> LPoint3d:
+        positions = [egg_vertex.getPos3() for egg_polygon in polygons for egg_vertex in egg_polygon.getVertices()]
+        bounds_min = [min(position[axis] for position in positions) for axis in range(3)]
+        bounds_max = [max(position[axis] for position in positions) for axis in range(3)]
+        return LPoint3d(*((low + high) / 2 for low, high in zip(bounds_min, bounds_max)))
+
+    @staticmethod
+    def get_state_group(source_node: EggGroupNode, state_groups: Dict[EggGroupNode, EggGroupNode]) -> EggGroupNode:
+        """
+        :param dict state_groups: { source group: group in the LOD level }, starting out with the full detail level.
+        :returns: The group in the LOD level to put copies of the source group's polygons in.
+            Source groups with render state of their own get a group with the same render state, created as needed.
+        """
+        state_group = state_groups.get(source_node)
+        if state_group is None:
+            state_group = EggLODGenerator.get_state_group(source_node.getParent(), state_groups)
+            if isinstance(source_node, EggGroup) and \
+                    EggMan.get_group_render_state(source_node) != EggMan.get_group_render_state(EggGroup()):
+                parent_group = state_group
+                state_group = EggGroup(source_node.getName())
+                EggMan.copy_group_render_state(source_node, state_group)
+                parent_group.addChild(state_group)
+            state_groups[source_node] = state_group
+        return state_group
+
+    def make_lods(self, egg_group: EggGroup) -> List[int]:
+        """
+        Moves the visible contents of the group into the first LOD level and adds a decimated copy for each
+        other level, all under a new <group>_lod group. Collision groups stay where they are.
+        Decimated polygons go under groups with the render state of the groups they came from.
+
+        WILL affect model/egg data
+
+        :returns: Triangle count of each level
+        """
+        polygons = self.get_lod_polygons(egg_group)
+        if not polygons:
+            return []
+        center = self.get_center(polygons)
+        original_triangles = sum(egg_polygon.getNumVertices() - 2 for egg_polygon in polygons)
+
+        lod_root = EggGroup(f"{egg_group.getName()}_lod")
+        triangle_counts = []
+        switch_out = 0.0
+        full_detail_group = None
+        for level_index, level in enumerate(self.levels):
+            lod_group = EggGroup(f"{egg_group.getName()}_lod{level_index}")
+            lod_group.setLod(EggSwitchConditionDistance(level.distance, switch_out, center))
+            switch_out = level.distance
+            if level_index == 0:
+                for child in list(egg_group.getChildren()):
+                    if isinstance(child, EggGroup) and self.is_collision_only(child):
+                        continue
+                    egg_group.removeChild(child)
+                    lod_group.addChild(child)
+                full_detail_group = lod_group
+                triangle_counts.append(original_triangles)
+            else:
+                new_polygons = self.decimate_polygons(polygons, level.ratio)
+                # The original polygons have been moved into the first level by now
+                state_groups = {full_detail_group: lod_group}
+                for source_polygon, new_polygon in new_polygons:
+                    self.get_state_group(source_polygon.getParent(), state_groups).addChild(new_polygon)
+                triangle_counts.append(len(new_polygons))
+            lod_root.addChild(lod_group)
+        egg_group.addChild(lod_root)
+        return triangle_counts
+
+    def generate_lods(self, node_names: List[str], egg_data: Optional[EggDataContext] = None) -> \
+            Dict[str, Dict[str, List[int]]]:
+        """
+        Generates LODs for every group matching the names (wildcards allowed), in one egg or in all of them.
+        Groups inside a group that already matched are left alone.
+
+        WILL affect model/egg data
+
+        :returns: { egg filename: { group name: [triangle count of each level] } }
+        """
+        node_config = NodeNameConfig(set(node_names))
+        egg_datas = [egg_data] if egg_data else list(self.eggman.egg_datas.keys())
+        report = dict()
+        for egg_data in egg_datas:
+            ctx = self.eggman.egg_datas[egg_data]
+            egg_report = dict()
+            matched_groups = set()
+            for egg_group in list(ctx.egg_groups):
+                if not node_config.check(egg_group.getName()):
+                    continue
+                matched_groups.add(egg_group)
+                parent = egg_group.getParent()
+                while isinstance(parent, EggGroup) and parent not in matched_groups:
+                    parent = parent.getParent()
+                if parent in matched_groups:
+                    continue
+                triangle_counts = self.make_lods(egg_group)
+                if triangle_counts:
+                    egg_report[egg_group.getName()] = triangle_counts
+            if egg_report:
+                self.eggman.rebuild_egg_context(egg_data)
+                report[ctx.filename.getFullpath()] = egg_report
+        return report
@@ -0,0 +1,194 @@
+import json
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from panda3d.egg import EggGroup, EggGroupNode, EggPolygon, EggRenderMode
+
+from eggtools.EggMan import EggMan
+from eggtools.components.EggDataContext import EggDataContext
+from eggtools.components.EggEnums import BlendMode, DepthTestMode, DepthWriteMode, RenderAlphaMode
+
+
+@dataclass(frozen = True)
+class RenderState:
+    """
+    Everything about a polygon that keeps it from sharing a Geom (and a draw call) with another polygon.
+    """
+    textures: Tuple[str, ...] = ()
+    material: str = ""
+    alpha_mode: str = RenderAlphaMode.Unspecified.name
+    bin: str = ""
+    draw_order: int = 0
+    depth_write: str = DepthWriteMode.Unspecified.name
+    depth_test: str = DepthTestMode.Unspecified.name
+    depth_offset: int = 0
+    two_sided: bool = False
+    decal: bool = False
+    blend_mode: str = BlendMode.Unspecified.name
+
+
+@dataclass
+class _NodeScope:
+    """
+    Inherited group settings while walking down the egg.
+    """
+    path: str
+    # Path of the closest node that flattening can't see past
+    barrier: str
+    decal: bool = False
+    blend_mode: int = BlendMode.Unspecified
+    # Collision geometry without the keep flag doesn't get rendered
+    collision_only: bool = False
+
+
+class EggRenderAnalyzer:
+    """
+    Estimates how expensive eggs are to render, by counting the distinct render states of their polygons.
+
+    Geoms are counted as they get loaded: one per render state per group.
+    Draw calls are estimated after a flattenStrong: one per render state under each node that can't be flattened,
+    such as billboards, DCS/model nodes, switches, LODs and scrolling UVs.
+    """
+
+    def __init__(self, file_list: list, eggman: EggMan = None):
+        self.eggman = eggman
+        if not self.eggman:
+            self.eggman = EggMan(file_list)
+
+    @staticmethod
+    def is_flatten_barrier(egg_group: EggGroup) -> bool:
+        # DC_none is an explicit <DCS> { none }, DC_unspecified is the default
+        return egg_group.getDcsType() not in (EggGroup.DC_unspecified, EggGroup.DC_none) or \
+            egg_group.getModelFlag() or egg_group.getBillboardType() != EggGroup.BT_none or egg_group.getSwitchFlag() or \
+            egg_group.hasLod() or egg_group.hasScrollingUvs() or egg_group.getDartType() != EggGroup.DT_none
+
+    @staticmethod
+    def _get_mode(render_mode: Optional[EggRenderMode], getter: str, default=0):
+        if not render_mode:
+            return default
+        return getattr(render_mode, getter)()
+
+    @staticmethod
+    def get_render_state(egg_polygon: EggPolygon, scope: _NodeScope) -> RenderState:
+        get_mode = EggRenderAnalyzer._get_mode
+        return RenderState(
+            textures = tuple(egg_texture.getFullpath().getFullpath() for egg_texture in egg_polygon.getTextures()),
+            material = egg_polygon.getMaterial().getName() if egg_polygon.hasMaterial() else "",
+            alpha_mode = RenderAlphaMode(get_mode(egg_polygon.determineAlphaMode(), "getAlphaMode")).name,
+            bin = get_mode(egg_polygon.determineBin(), "getBin", ""),
+            draw_order = get_mode(egg_polygon.determineDrawOrder(), "getDrawOrder"),
+            depth_write = DepthWriteMode(get_mode(egg_polygon.determineDepthWriteMode(), "getDepthWriteMode")).name,
+            depth_test = DepthTestMode(get_mode(egg_polygon.determineDepthTestMode(), "getDepthTestMode")).name,
+            depth_offset = get_mode(egg_polygon.determineDepthOffset(), "getDepthOffset"),
+            two_sided = egg_polygon.getBfaceFlag(),
+            decal = scope.decal,
+            blend_mode = BlendMode(scope.blend_mode).name,
+        )
+
+    def _walk(self, egg_node: EggGroupNode, scope: _NodeScope, depth: int, analysis: dict) -> None:
+        for child in egg_node.getChildren():
+            if isinstance(child, EggPolygon):
+                if scope.collision_only:
+                    continue
+                visibility = child.determineVisibilityMode()
+                if visibility and visibility.getVisibilityMode() == EggRenderMode.VM_hidden:
+                    continue
+                state = self.get_render_state(child, scope)
+                analysis["states"].setdefault(state, [set(), 0])
+                analysis["states"][state][0].add(scope.path)
+                analysis["states"][state][1] += 1
+                analysis["flattened"].add((scope.barrier, state))
+                group_stats = analysis["groups"].setdefault(scope.path, [set(), 0])
+                group_stats[0].add(state)
+                group_stats[1] += 1
+
+            elif isinstance(child, EggGroupNode):
+                analysis["levels"][depth] = analysis["levels"].get(depth, 0) + 1
+                child_scope = _NodeScope(
+                    path = f"{scope.path}/{child.getName()}",
+                    barrier = scope.barrier,
+                    decal = scope.decal,
+                    blend_mode = scope.blend_mode,
+                    collision_only = scope.collision_only,
+                )
+                if isinstance(child, EggGroup):
+                    if self.is_flatten_barrier(child):
+                        child_scope.barrier = child_scope.path
+                    # Decals are drawn in a separate pass over their base geometry
+                    child_scope.decal = child_scope.decal or child.getDecalFlag()
+                    if child.getBlendMode() != EggGroup.BM_unspecified:
+                        child_scope.blend_mode = child.getBlendMode()
+                    if child.getCsType() != EggGroup.CST_none and not child.getCollideFlags() & EggGroup.CF_keep:
+                        child_scope.collision_only = True
+                self._walk(child, child_scope, depth + 1, analysis)
+
+    def analyze_egg(self, egg_data: EggDataContext) -> dict:
+        """
+        :returns: JSON friendly summary of the render states in the egg
+        """
+        ctx = self.eggman.egg_datas[egg_data]
+        analysis = {
+            "states": dict(),  # { RenderState: [ {group path}, polygon count ] }
+            "flattened": set(),  # { (barrier path, RenderState) }
+            "groups": dict(),  # { group path: [ {RenderState}, polygon count ] }
+            "levels": dict(),  # { depth: group count }
+        }
+        self._walk(egg_data, _NodeScope(path = "", barrier = ""), 0, analysis)
+
+        states = sorted(
+            (
+                {
+                    "state": dict(asdict(state), textures = list(state.textures)),
+                    "geoms": len(group_paths),
+                    "polygons": polygon_count,
+                }
+                for state, (group_paths, polygon_count) in analysis["states"].items()
+            ),
+            key = lambda state_info: state_info["geoms"], reverse = True
+        )
+        groups = sorted(
+            (
+                {"group": group_path or "/", "geoms": len(group_states), "polygons": polygon_count}
+                for group_path, (group_states, polygon_count) in analysis["groups"].items()
+            ),
+            key = lambda group_info: group_info["geoms"], reverse = True
+        )
+        return {
+            "filename": ctx.filename.getFullpath() if ctx.filename else "",
+            "polygons": sum(state_info["polygons"] for state_info in states),
+            "render_states": len(states),
+            "geoms": sum(state_info["geoms"] for state_info in states),
+            "draw_calls": len(analysis["flattened"]),
+            "states": states,
+            "groups": groups,
+            "nodes_per_level": {str(depth): count for depth, count in sorted(analysis["levels"].items())},
+        }
+
+    def analyze_all(self) -> dict:
+        """
+        Analyzes every egg registered in EggMan, most expensive first.
+        """
+        eggs = sorted(
+            (self.analyze_egg(egg_data) for egg_data in self.eggman.egg_datas.keys()),
+            key = lambda egg_info: (egg_info["draw_calls"], egg_info["geoms"]), reverse = True
+        )
+        return {
+            "eggs": eggs,
+            "draw_calls": sum(egg_info["draw_calls"] for egg_info in eggs),
+            "geoms": sum(egg_info["geoms"] for egg_info in eggs),
+        }
+
+    def get_over_budget(self, max_draw_calls: int, report: dict = None) -> List[str]:
+        """
+        :returns: Filenames of the eggs estimated to need more than max_draw_calls draw calls.
+        """
+        if not report:
+            report = self.analyze_all()
+        return [egg_info["filename"] for egg_info in report["eggs"] if egg_info["draw_calls"] > max_draw_calls]
+
+    def write_json(self, filename: str, report: dict = None) -> Dict:
+        if not report:
+            report = self.analyze_all()
+        with open(filename, "w") as report_file:
+            json.dump(report, report_file, indent = 2)
+        return report
@@ -0,0 +1,458 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from panda3d.core import Filename, LPoint2d, StringStream
+from panda3d.egg import EggGroupNode, EggPolygon, EggTexture
+
+from eggtools.EggMan import EggMan
+from eggtools.components.EggDataContext import EggDataContext
+from eggtools.components.EggEnums import TextureWrapMode
+from eggtools.components.images import ImageUtils
+from eggtools.components.images.AtlasPacker import AtlasLayout, pack_rects
+
+# UVs this far outside of [0, 1] are still treated as not wrapping
+UV_EPSILON = 0.001
+
+
+@dataclass
+class AtlasEntry:
+    """
+    One source image going into an atlas, along with every polygon that uses it.
+    """
+
+    def __str__(self):
+        return f"AtlasEntry: {self.source_filename} ({self.width}x{self.height}), {len(self.polygons)} polygons"
+
+    def __hash__(self):
+        return hash(id(self))
+
+    source_filename: Filename
+    width: int = 0
+    height: int = 0
+
+    # Textures referring to the source image, the first one is used as the template for the atlas texture.
+    egg_textures: List[EggTexture] = field(default_factory = list)
+    polygons: List[Tuple[EggDataContext, EggPolygon]] = field(default_factory = list)
+
+    # Index into RepalettizePlan.layouts, -1 if the image did not make it into an atlas.
+    atlas_index: int = -1
+    # Top left corner of the image in the atlas, past the padding.
+    position: Tuple[int, int] = (0, 0)
+
+
+@dataclass
+class RepalettizeReport:
+    def __str__(self):
+        return f"RepalettizeReport:\n" \
+               f"    textures: {self.textures_before} -> {self.textures_after}\n" \
+               f"    estimated draw calls: {self.draw_calls_before} -> {self.draw_calls_after}\n" \
+               f"    texture memory: {self.texture_bytes_before / 1024:.1f} KiB -> " \
+               f"{self.texture_bytes_after / 1024:.1f} KiB\n" \
+               f"    skipped: {len(self.skipped)} textures"
+
+    textures_before: int = 0
+    textures_after: int = 0
+
+    # One draw call per distinct texture used in each egg, assuming the rest of the render state is shared.
+    draw_calls_before: int = 0
+    draw_calls_after: int = 0
+
+    # Uncompressed RGBA, mipmaps included, of the images that got packed vs. the atlases they were packed into.
+    texture_bytes_before: int = 0
+    texture_bytes_after: int = 0
+
+    # { source fullpath: reason }
+    skipped: Dict[str, str] = field(default_factory = dict)
+
+
+@dataclass
+class RepalettizePlan:
+    """
+    Every atlas the Repalettizer is going to build, laid out before any images or egg files are touched.
+    """
+
+    def __str__(self):
+        out = f"RepalettizePlan: {len(self.egg_datas)} eggs, {len(self.layouts)} atlases\n"
+        for atlas_index, layout in enumerate(self.layouts):
+            out += f"{self.atlas_filenames[atlas_index]}: {layout}\n"
+            for entry in self.entries_in_atlas(atlas_index):
+                out += f"    {entry.source_filename}\n"
+        for fullpath, reason in self.skipped.items():
+            out += f"{fullpath} skipped: {reason}\n"
+        return out
+
+    egg_datas: List[EggDataContext] = field(default_factory = list)
+
+    # { (source fullpath, texture attributes): AtlasEntry }
+    entries: Dict[tuple, AtlasEntry] = field(default_factory = dict)
+    layouts: List[AtlasLayout] = field(default_factory = list)
+    atlas_filenames: List[Filename] = field(default_factory = list)
+
+    # { source fullpath: reason }
+    skipped: Dict[str, str] = field(default_factory = dict)
+
+    # Polygons left as they are; their vertices must not be remapped either.
+    skipped_polygons: List[Tuple[str, EggPolygon]] = field(default_factory = list)
+
+    def entries_in_atlas(self, atlas_index: int) -> List[AtlasEntry]:
+        return [entry for entry in self.entries.values() if entry.atlas_index == atlas_index]
+
+
+class Repalettizer:
+    """
+    The reverse of the Depalettizer: packs the textures used by a set of eggs into shared atlases,
+    so that polygons that only differed by texture can be drawn together.
+    """
+
+    def __init__(self, file_list: list, padding: int = 2, max_size: int = 2048, power_of_two: bool = True,
+                 atlas_name: str = "atlas", output_dir: str = None, eggman: EggMan = None):
+        """
+        :param int padding: Pixels of margin around each image in the atlas, repeating its edge pixels.
+            Keeps neighbouring images from bleeding into each other when filtering and mipmapping.
+        :param int max_size: Largest width/height of an atlas. Images that don't fit are left alone.
+        :param bool power_of_two: Keep the atlas dimensions a power of two.
+        :param str output_dir: Where to write the atlases, defaults to the directory of the first egg.
+        """
+        self.eggman = eggman
+        if not self.eggman:
+            self.eggman = EggMan(file_list)
+        self.padding = max(int(padding), 0)
+        self.max_size = max_size
+        self.power_of_two = power_of_two
+        self.atlas_name = atlas_name
+        self.output_dir = output_dir
+
+    @staticmethod
+    def _iter_polygons(egg_node: EggGroupNode):
+        for child in egg_node.getChildren():
+            if isinstance(child, EggPolygon):
+                yield child
+            elif isinstance(child, EggGroupNode):
+                yield from Repalettizer._iter_polygons(child)
+
+    @staticmethod
+    def _texture_key(egg_texture: EggTexture) -> tuple:
+        """
+        Textures can only share an atlas if they would be rendered with the same texture attributes,
+        since the atlas texture copies every one of them from the first texture packed into it.
+        """
+        # Settings that were never set can hold anything, so only their has* flag counts
+        optional_settings = tuple(
+            getattr(egg_texture, f"get{setting}")() if getattr(egg_texture, f"has{setting}")() else None
+            for setting in (
+                "LodBias", "MinLod", "MaxLod", "StageName", "Priority",
+                "RgbScale", "AlphaScale", "Bin", "DrawOrder", "DepthOffset",
+            )
+        )
+        return (
+            egg_texture.getFormat(), egg_texture.getEnvType(),
+            egg_texture.getMinfilter(), egg_texture.getMagfilter(),
+            egg_texture.getAnisotropicDegree(), egg_texture.getQualityLevel(),
+            egg_texture.getCompressionMode(), egg_texture.getReadMipmaps(), egg_texture.getSavedResult(),
+            tuple(egg_texture.getColor()) if egg_texture.hasColor() else None,
+            egg_texture.getAlphaMode(), egg_texture.getDepthWriteMode(), egg_texture.getDepthTestMode(),
+            optional_settings,
+        )
+
+    @staticmethod
+    def _get_ineligible_reason(egg_texture: EggTexture) -> Optional[str]:
+        if egg_texture.getTextureType() not in (EggTexture.TT_unspecified, EggTexture.TT_2d_texture):
+            return "not a 2d texture"
+        if egg_texture.hasAlphaFilename():
+            return "uses a separate alpha file"
+        if egg_texture.hasUvName():
+            return "uses a named UV set"
+        if egg_texture.getTexGen() != EggTexture.TG_unspecified:
+            return "uses generated texture coordinates"
+        if egg_texture.getMultiview():
+            return "is a multiview texture"
+        return None
+
+    def plan_egg(self, egg_data: EggDataContext, plan: RepalettizePlan) -> None:
+        """
+        Collects the polygons of an egg into the plan's atlas entries.
+
+        Does not affect model/egg data
+        """
+        ctx = self.eggman.egg_datas[egg_data]
+        if not ctx.configured or ctx.egg_generated:
+            return
+        plan.egg_datas.append(egg_data)
+
+        for egg_polygon in self._iter_polygons(egg_data):
+            egg_textures = egg_polygon.getTextures()
+            if not egg_textures:
+                continue
+            if len(egg_textures) > 1:
+                for egg_texture in egg_textures:
+                    fullpath = egg_texture.getFullpath().getFullpath()
+                    plan.skipped[fullpath] = "used for multitexturing"
+                    plan.skipped_polygons.append((fullpath, egg_polygon))
+                continue
+
+            egg_texture = egg_textures[0]
+            fullpath = egg_texture.getFullpath().getFullpath()
+            reason = self._get_ineligible_reason(egg_texture)
+            if not reason:
+                # Atlases can't wrap, so the UVs have to stay within the image
+                for egg_vertex in egg_polygon.getVertices():
+                    if not egg_vertex.hasUv():
+                        reason = "has polygons without UVs"
+                        break
+                    u, v = egg_vertex.getUv()
+                    if not (-UV_EPSILON <= u <= 1 + UV_EPSILON and -UV_EPSILON <= v <= 1 + UV_EPSILON):
+                        reason = "has UVs outside of [0, 1]"
+                        break
+            if reason:
+                plan.skipped[fullpath] = reason
+                plan.skipped_polygons.append((fullpath, egg_polygon))
+                continue
+
+            entry_key = (fullpath, self._texture_key(egg_texture))
+            entry = plan.entries.get(entry_key)
+            if not entry:
+                entry = plan.entries[entry_key] = AtlasEntry(source_filename = egg_texture.getFullpath())
+            if egg_texture not in entry.egg_textures:
+                entry.egg_textures.append(egg_texture)
+            entry.polygons.append((egg_data, egg_polygon))
+
+    def _discard_skipped_entries(self, plan: RepalettizePlan) -> None:
+        """
+        Drops entries whose image can't be atlased, or whose vertices are shared with another texture.
+        """
+        # Entries of the same image with different texture attributes go into different atlases,
+        # so each entry owns its vertices, and skipped polygons own theirs by image.
+        vertex_owners = dict()  # { EggVertex: entry key or source fullpath }
+        polygons = plan.skipped_polygons + [
+            (entry_key, egg_polygon) for entry_key, entry in plan.entries.items() for _, egg_polygon in entry.polygons
+        ]
+        for owner_key, egg_polygon in polygons:
+            for egg_vertex in egg_polygon.getVertices():
+                owner = vertex_owners.setdefault(egg_vertex, owner_key)
+                if owner != owner_key:
+                    # The vertex can only have one UV; remapping it for one texture would break the other
+                    for shared_key in (owner, owner_key):
+                        shared_fullpath = shared_key[0] if isinstance(shared_key, tuple) else shared_key
+                        plan.skipped.setdefault(shared_fullpath, "shares vertices with another texture")
+
+        for entry_key, entry in list(plan.entries.items()):
+            fullpath = entry_key[0]
+            if fullpath not in plan.skipped:
+                source_path = entry.source_filename.toOsSpecific()
+                try:
+                    with Image.open(source_path) as image:
+                        entry.width, entry.height = image.size
+                except OSError:
+                    plan.skipped[fullpath] = "image could not be read"
+            if fullpath in plan.skipped:
+                del plan.entries[entry_key]
+
+    def plan_all(self) -> RepalettizePlan:
+        """
+        Plans out the atlases for all Egg files registered in EggMan, without writing or modifying anything.
+        """
+        plan = RepalettizePlan()
+        for egg_data in [*self.eggman.egg_datas.keys()]:
+            self.plan_egg(egg_data, plan)
+        self._discard_skipped_entries(plan)
+
+        output_dir = self.output_dir
+        if not output_dir and plan.egg_datas:
+            output_dir = self.eggman.egg_datas[plan.egg_datas[0]].filename.toOsSpecific()
+            output_dir = os.path.dirname(output_dir)
+
+        # Only textures rendered the same way can end up in the same atlas.
+        entry_groups = dict()
+        for entry_key, entry in plan.entries.items():
+            entry_groups.setdefault(entry_key[1], []).append(entry_key)
+
+        for entry_keys in entry_groups.values():
+            sizes = {
+                entry_key: (plan.entries[entry_key].width + self.padding * 2,
+                            plan.entries[entry_key].height + self.padding * 2)
+                for entry_key in entry_keys
+            }
+            for layout in pack_rects(sizes, max_size = self.max_size, power_of_two = self.power_of_two):
+                # An atlas of one image saves nothing
+                if len(layout.placements) < 2:
+                    continue
+                atlas_index = len(plan.layouts)
+                plan.layouts.append(layout)
+                plan.atlas_filenames.append(
+                    Filename.fromOsSpecific(os.path.join(output_dir, f"{self.atlas_name}_{atlas_index}.png"))
+                )
+                for entry_key, (x, y, _, _) in layout.placements.items():
+                    plan.entries[entry_key].atlas_index = atlas_index
+                    plan.entries[entry_key].position = (x + self.padding, y + self.padding)
+
+        for entry_key, entry in list(plan.entries.items()):
+            if entry.atlas_index < 0:
+                del plan.entries[entry_key]
+        return plan
+
+    def build_atlas(self, plan: RepalettizePlan, atlas_index: int) -> np.ndarray:
+        """
+        Composes the atlas image, each source image surrounded by a copy of its own edge pixels.
+        """
+        layout = plan.layouts[atlas_index]
+        atlas_array = np.zeros((layout.height, layout.width, 4), dtype = np.uint8)
+        padding = self.padding
+        for entry_key, (x, y, width, height) in layout.placements.items():
+            entry = plan.entries[entry_key]
+            source_array = ImageUtils.load_image_array(entry.source_filename)
+            if source_array is None:
+                continue
+            # The source fills its whole spot, so it gets padded as is; transparent pixels stay transparent
+            atlas_array[y:y + height, x:x + width] = np.pad(
+                source_array, ((padding, padding), (padding, padding), (0, 0)), mode = "edge"
+            )
+        return atlas_array
+
+    def remap_entry(self, plan: RepalettizePlan, entry: AtlasEntry, atlas_texture: EggTexture,
+                    egg_data: EggDataContext, remapped_vertices: set) -> None:
+        """
+        Moves the UVs of the entry's polygons into its spot on the atlas, and points them to the atlas texture.
+
+        WILL affect model/egg data
+        """
+        layout = plan.layouts[entry.atlas_index]
+        x, y = entry.position
+        # Egg UVs start from the bottom left, the layout from the top left.
+        offset_u = x / layout.width
+        offset_v = (layout.height - y - entry.height) / layout.height
+        scale_u = entry.width / layout.width
+        scale_v = entry.height / layout.height
+
+        for polygon_egg_data, egg_polygon in entry.polygons:
+            if polygon_egg_data is not egg_data:
+                continue
+            for egg_vertex in egg_polygon.getVertices():
+                if egg_vertex in remapped_vertices:
+                    continue
+                u, v = egg_vertex.getUv()
+                egg_vertex.setUv(LPoint2d(offset_u + u * scale_u, offset_v + v * scale_v))
+                remapped_vertices.add(egg_vertex)
+            egg_polygon.clearTexture()
+            egg_polygon.addTexture(atlas_texture)
+
+    def apply_egg(self, plan: RepalettizePlan, egg_data: EggDataContext) -> None:
+        """
+        Points every planned polygon of an egg to its atlas.
+
+        WILL affect model/egg data
+        """
+        ctx = self.eggman.egg_datas[egg_data]
+        atlas_textures = dict()  # { atlas index: EggTexture }
+        remapped_vertices = set()
+        replaced_trefs = set()
+        for entry in plan.entries.values():
+            if not any(polygon_egg_data is egg_data for polygon_egg_data, _ in entry.polygons):
+                continue
+            replaced_trefs.update(
+                egg_texture.getName() for polygon_egg_data, egg_polygon in entry.polygons
+                if polygon_egg_data is egg_data for egg_texture in egg_polygon.getTextures()
+            )
+            if entry.atlas_index not in atlas_textures:
+                atlas_filename = plan.atlas_filenames[entry.atlas_index]
+                atlas_texture = self.eggman.rebase_egg_texture(
+                    atlas_filename.getBasenameWoExtension(), atlas_filename, entry.egg_textures[0]
+                )
+                atlas_texture.setWrapU(TextureWrapMode.Clamp)
+                atlas_texture.setWrapV(TextureWrapMode.Clamp)
+                ctx.add_collect_texture(atlas_texture)
+                atlas_textures[entry.atlas_index] = atlas_texture
+            self.remap_entry(plan, entry, atlas_textures[entry.atlas_index], egg_data, remapped_vertices)
+
+        if not atlas_textures:
+            return
+
+        # Same workaround as Depalettizer.append_new_eggdata: new texture entries only get written out
+        # if they are read in at the top of the egg.
+        eggstr = '\n'.join([str(atlas_texture) for atlas_texture in atlas_textures.values()])
+        egg_data_new = EggDataContext()
+        egg_data_new.read(StringStream(bytes(eggstr, encoding = 'utf-8')))
+        egg_data_new.merge(egg_data)
+
+        # The textures that were packed away are left with nothing referring to them,
+        # textures that were already unused are left alone.
+        used_trefs = {
+            egg_texture.getName()
+            for egg_polygon in self._iter_polygons(egg_data_new) for egg_texture in egg_polygon.getTextures()
+        }
+        for child in list(egg_data_new.getChildren()):
+            if isinstance(child, EggTexture) and child.getName() in replaced_trefs - used_trefs:
+                egg_data_new.removeChild(child)
+
+        self.eggman.replace_eggdata(egg_data, egg_data_new)
+        self.eggman.egg_datas[egg_data_new].egg_generated = True
+
+    def get_report(self, plan: RepalettizePlan) -> RepalettizeReport:
+        """
+        Estimates what the plan saves. Can be called before executing it.
+        """
+        report = RepalettizeReport(skipped = dict(plan.skipped))
+        atlas_by_texture = dict()  # { EggTexture: atlas index }
+        for entry in plan.entries.values():
+            for egg_texture in entry.egg_textures:
+                atlas_by_texture[egg_texture] = entry.atlas_index
+
+        sources_before = set()
+        sources_after = set()
+        for egg_data in plan.egg_datas:
+            textures_before = set()
+            textures_after = set()
+            for egg_polygon in self._iter_polygons(egg_data):
+                egg_textures = egg_polygon.getTextures()
+                if not egg_textures:
+                    # Untextured polygons still need a draw call of their own
+                    textures_before.add(None)
+                    textures_after.add(None)
+                for egg_texture in egg_textures:
+                    fullpath = egg_texture.getFullpath().getFullpath()
+                    textures_before.add(fullpath)
+                    atlas_index = atlas_by_texture.get(egg_texture)
+                    textures_after.add(fullpath if atlas_index is None else atlas_index)
+            report.draw_calls_before += len(textures_before)
+            report.draw_calls_after += len(textures_after)
+            sources_before |= textures_before - {None}
+            sources_after |= textures_after - {None}
+        report.textures_before = len(sources_before)
+        report.textures_after = len(sources_after)
+
+        # Mipmaps add another third on top of the base level
+        for entry in plan.entries.values():
+            report.texture_bytes_before += entry.width * entry.height * 4 * 4 // 3
+        for layout in plan.layouts:
+            report.texture_bytes_after += layout.width * layout.height * 4 * 4 // 3
+        return report
+
+    def execute_plan(self, plan: RepalettizePlan, image_kwargs: dict = None) -> None:
+        """
+        Writes every atlas in the plan, and then updates each planned egg.
+        """
+        if not image_kwargs:
+            image_kwargs = dict()
+        for atlas_index, atlas_filename in enumerate(plan.atlas_filenames):
+            ImageUtils.save_image_array(self.build_atlas(plan, atlas_index), atlas_filename, **image_kwargs)
+        for egg_data in plan.egg_datas:
+            self.apply_egg(plan, egg_data)
+        self.eggman.remove_texture_duplicates()
+
+    def repalettize_all(self, image_kwargs: dict = None, dry_run: bool = False) -> RepalettizeReport:
+        """
+        Packs the textures of all Egg files registered in EggMan into atlases.
+
+        :param bool dry_run: Only plan out the atlases and estimate the savings,
+            without writing images or modifying any eggs.
+        :returns: RepalettizeReport of the estimated savings
+        """
+        plan = self.plan_all()
+        report = self.get_report(plan)
+        if not dry_run:
+            self.execute_plan(plan, image_kwargs = image_kwargs)
+        logging.info(str(report))
+        return report
@@ -0,0 +1,238 @@
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional, Set
+
+from panda3d.egg import EggGroup, EggGroupNode, EggPolygon, EggTexture, EggVertex, EggVertexPool
+
+from eggtools.EggMan import EggMan
+from eggtools.components.EggDataContext import EggDataContext
+from eggtools.utils.EggVertexWelder import EggVertexWelder, get_egg_bytes
+
+
+class VertexAttribute(str, Enum):
+    Normal = "normal"
+    Color = "color"
+    # Only the default UV set, named ones are left alone
+    UV = "uv"
+
+
+# Texture modes that read the vertex normals, even on polygons without a <Material>
+normal_env_types = (
+    EggTexture.ET_normal, EggTexture.ET_normal_height, EggTexture.ET_normal_gloss, EggTexture.ET_height,
+)
+normal_tex_gens = (
+    EggTexture.TG_eye_sphere_map, EggTexture.TG_eye_cube_map, EggTexture.TG_world_cube_map,
+    EggTexture.TG_eye_normal, EggTexture.TG_world_normal,
+)
+
+
+@dataclass
+class StripReport:
+    def __str__(self):
+        counts = ", ".join(f"{count} {attribute.value}" for attribute, count in self.strippable.items() if count)
+        return f"StripReport: {self.vertex_pool} {self.vertices} vertices, {counts or 'nothing'} to strip"
+
+    vertex_pool: str
+    vertices: int
+    # { VertexAttribute: number of vertices carrying it for nothing }
+    strippable: Dict[VertexAttribute, int] = field(default_factory = dict)
+
+    @property
+    def constant(self) -> List[VertexAttribute]:
+        """
+        Attributes that can go from every vertex of the pool, which drops them from the vertex format
+        """
+        return [attribute for attribute, count in self.strippable.items() if count == self.vertices]
+
+
+class EggVertexAttributeStripper:
+    """
+    Finds vertex attributes that can't make a difference to how anything renders, and strips them:
+
+    - Normals on unlit polygons
+    - White vertex colors on polygons that aren't colored otherwise
+    - UVs on untextured polygons
+
+    Polygons that only make up collision geometry don't render at all, so none of their attributes matter.
+    Vertex colors that are the same across a whole pool are moved onto the polygons using them instead.
+    """
+
+    def __init__(self, file_list: list, eggman: EggMan = None, assume_lit: bool = True,
+                 color_tolerance: float = 1 / 512):
+        """
+        :param bool assume_lit: Keep the normals of polygons without a <Material> too. Panda3D still lights those
+            when a light is set on them at runtime, so only turn this off for models that are never lit.
+        :param float color_tolerance: How far off each channel can be from 1 for a color to still count as white.
+        """
+        self.eggman = eggman
+        if not self.eggman:
+            self.eggman = EggMan(file_list)
+        self.assume_lit = assume_lit
+        self.color_tolerance = color_tolerance
+
+    def is_white(self, color) -> bool:
+        return self.is_same_color(color, (1, 1, 1, 1))
+
+    def is_same_color(self, color, other) -> bool:
+        return all(abs(channel - other_channel) <= self.color_tolerance for channel, other_channel in zip(color, other))
+
+    def get_needed_attributes(self, egg_polygon: EggPolygon) -> Set[VertexAttribute]:
+        """
+        :returns: Vertex attributes the polygon shows when it renders.
+            A vertex color counts as needed if the polygon has a color of its own, since vertex colors replace it.
+        """
+        needed = set()
+        egg_textures = egg_polygon.getTextures()
+        if self.assume_lit or egg_polygon.hasMaterial() or any(
+                egg_texture.getEnvType() in normal_env_types or egg_texture.getTexGen() in normal_tex_gens
+                for egg_texture in egg_textures
+        ):
+            needed.add(VertexAttribute.Normal)
+        if egg_polygon.hasColor() and not self.is_white(egg_polygon.getColor()):
+            needed.add(VertexAttribute.Color)
+        if any(
+                not egg_texture.getUvName() and egg_texture.getTexGen() == EggTexture.TG_unspecified
+                for egg_texture in egg_textures
+        ):
+            needed.add(VertexAttribute.UV)
+        return needed
+
+    def _collect_needs(self, egg_node: EggGroupNode, vertex_needs: Dict[EggVertex, Set[VertexAttribute]]) -> None:
+        for child in egg_node.getChildren():
+            if isinstance(child, EggPolygon):
+                needed = self.get_needed_attributes(child)
+                for egg_vertex in child.getVertices():
+                    vertex_needs.setdefault(egg_vertex, set()).update(needed)
+            elif isinstance(child, EggGroup) and child.getCsType() != EggGroup.CST_none and \
+                    not child.getCollideFlags() & EggGroup.CF_keep:
+                # Collision only, but the vertices still count as used
+                for egg_polygon in self._iter_polygons(child):
+                    for egg_vertex in egg_polygon.getVertices():
+                        vertex_needs.setdefault(egg_vertex, set())
+            elif isinstance(child, EggGroupNode):
+                self._collect_needs(child, vertex_needs)
+
+    @staticmethod
+    def _iter_polygons(egg_node: EggGroupNode):
+        for child in egg_node.getChildren():
+            if isinstance(child, EggPolygon):
+                yield child
+            elif isinstance(child, EggGroupNode):
+                yield from EggVertexAttributeStripper._iter_polygons(child)
+
+    def get_strippable(self, egg_vertex: EggVertex, needed: Set[VertexAttribute]) -> Set[VertexAttribute]:
+        strippable = set()
+        if egg_vertex.hasNormal() and VertexAttribute.Normal not in needed:
+            strippable.add(VertexAttribute.Normal)
+        # A white vertex color looks the same as no color, as long as the polygon has no color to show instead
+        if egg_vertex.hasColor() and VertexAttribute.Color not in needed and self.is_white(egg_vertex.getColor()):
+            strippable.add(VertexAttribute.Color)
+        if egg_vertex.hasUv() and VertexAttribute.UV not in needed:
+            strippable.add(VertexAttribute.UV)
+        return strippable
+
+    def find_strippable(self, egg_data: EggDataContext) -> Dict[EggVertexPool, Dict[EggVertex, Set[VertexAttribute]]]:
+        """
+        Does not affect model/egg data
+
+        :returns: { EggVertexPool: { EggVertex: {VertexAttribute} } } for every vertex used by a polygon
+        """
+        vertex_needs = dict()
+        self._collect_needs(egg_data, vertex_needs)
+        strippable = dict()
+        for egg_vertex, needed in vertex_needs.items():
+            strippable.setdefault(egg_vertex.getPool(), dict())[egg_vertex] = self.get_strippable(egg_vertex, needed)
+        return strippable
+
+    def analyze(self, egg_data: EggDataContext) -> List[StripReport]:
+        """
+        Does not affect model/egg data
+        """
+        reports = []
+        for vertex_pool, vertex_attributes in self.find_strippable(egg_data).items():
+            report = StripReport(
+                vertex_pool = vertex_pool.getName(),
+                vertices = len(vertex_attributes),
+                strippable = {attribute: 0 for attribute in VertexAttribute},
+            )
+            for attributes in vertex_attributes.values():
+                for attribute in attributes:
+                    report.strippable[attribute] += 1
+            reports.append(report)
+        return reports
+
+    def analyze_all(self) -> Dict[str, List[StripReport]]:
+        """
+        :returns: { egg filename: [StripReport] }
+        """
+        return {
+            ctx.filename.getFullpath(): self.analyze(egg_data) for egg_data, ctx in self.eggman.egg_datas.items()
+        }
+
+    def hoist_constant_colors(self, egg_data: EggDataContext) -> int:
+        """
+        Moves the vertex color of pools where every vertex in use has the same one onto the polygons using them,
+        which renders the same since vertex colors replace polygon colors.
+
+        WILL affect model/egg data
+
+        :returns: Number of vertices the color was moved off of
+        """
+        pool_uses = dict()  # { EggVertexPool: { EggVertex: [EggPrimitive] } }
+        for egg_vertex, primitives in EggVertexWelder.get_vertex_uses(egg_data).items():
+            pool_uses.setdefault(egg_vertex.getPool(), dict())[egg_vertex] = primitives
+        hoisted = 0
+        for vertex_uses in pool_uses.values():
+            egg_vertices = list(vertex_uses)
+            if not all(egg_vertex.hasColor() for egg_vertex in egg_vertices):
+                continue
+            color = egg_vertices[0].getColor()
+            if not all(self.is_same_color(egg_vertex.getColor(), color) for egg_vertex in egg_vertices):
+                continue
+            primitives = [egg_primitive for primitives in vertex_uses.values() for egg_primitive in primitives]
+            # Lines and points have no polygon color to take it
+            if not all(isinstance(egg_primitive, EggPolygon) for egg_primitive in primitives):
+                continue
+            for egg_polygon in primitives:
+                egg_polygon.setColor(color)
+            for egg_vertex in egg_vertices:
+                egg_vertex.clearColor()
+            hoisted += len(egg_vertices)
+        return hoisted
+
+    def strip(self, egg_data: Optional[EggDataContext] = None, attributes: List[VertexAttribute] = None) -> \
+            Dict[str, Dict[str, int]]:
+        """
+        Strips the attributes that make no difference from every vertex, in one egg or in all of them.
+        When stripping colors, colors that are constant across a pool are moved onto the polygons too.
+
+        WILL affect model/egg data
+
+        :param list attributes: Kinds of attributes to strip, all of them by default.
+        :returns: { egg filename: { attribute: vertices stripped of it, "color_hoisted": ...,
+            "bytes_before": ..., "bytes_after": ... } }
+        """
+        attributes = {VertexAttribute(attribute) for attribute in attributes or VertexAttribute}
+        egg_datas = [egg_data] if egg_data else list(self.eggman.egg_datas.keys())
+        report = dict()
+        for egg_data in egg_datas:
+            ctx = self.eggman.egg_datas[egg_data]
+            egg_report = {attribute.value: 0 for attribute in attributes}
+            egg_report["bytes_before"] = get_egg_bytes(egg_data)
+            for vertex_attributes in self.find_strippable(egg_data).values():
+                for egg_vertex, strippable in vertex_attributes.items():
+                    for attribute in strippable & attributes:
+                        if attribute == VertexAttribute.Normal:
+                            egg_vertex.clearNormal()
+                        elif attribute == VertexAttribute.Color:
+                            egg_vertex.clearColor()
+                        else:
+                            egg_vertex.clearUv("")
+                        egg_report[attribute.value] += 1
+            if VertexAttribute.Color in attributes:
+                egg_report["color_hoisted"] = self.hoist_constant_colors(egg_data)
+            egg_report["bytes_after"] = get_egg_bytes(egg_data)
+            if any(egg_report[attribute.value] for attribute in attributes) or egg_report.get("color_hoisted"):
+                self.eggman.mark_dirty(ctx)
+            report[ctx.filename.getFullpath()] = egg_report
+        return report
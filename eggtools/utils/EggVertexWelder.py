@@ -0,0 +1,245 @@
+import itertools
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from panda3d.core import StringStream
+from panda3d.egg import EggData, EggGroup, EggGroupNode, EggPrimitive, EggVertex, EggVertexPool
+
+from eggtools.EggMan import EggMan
+from eggtools.EggManConfig import NodeNameConfig
+from eggtools.components.EggDataContext import EggDataContext
+
+
+@dataclass
+class WeldTolerances:
+    """
+    Largest difference on any one component for two vertices to still be welded together.
+    Everything else about the vertices (named UVs, aux data, morphs, joint membership) has to match as is.
+    """
+
+    def __str__(self):
+        return f"WeldTolerances: position {self.position}, normal {self.normal}, uv {self.uv}, color {self.color}"
+
+    position: float = 1e-4
+    normal: float = 1e-3
+    # Only the default UV set; named ones are compared as is
+    uv: float = 1e-5
+    color: float = 1 / 512
+
+
+@dataclass
+class WeldResult:
+    def __str__(self):
+        return f"WeldResult: {self.vertices_before} -> {self.vertices_after} vertices " \
+               f"({self.welded} welded, {self.unused} unused), {self.vertex_pools_before} -> " \
+               f"{self.vertex_pools_after} vertex pools, {self.bytes_before} -> {self.bytes_after} bytes"
+
+    vertex_pools_before: int = 0
+    vertex_pools_after: int = 0
+    vertices_before: int = 0
+    vertices_after: int = 0
+    welded: int = 0
+    unused: int = 0
+    # Size of the egg as it would be written out
+    bytes_before: int = 0
+    bytes_after: int = 0
+    # Primitives removed for having too few vertices left after welding
+    invalid_primitives: int = 0
+
+
+def get_egg_bytes(egg_data: EggData) -> int:
+    egg_stream = StringStream()
+    egg_data.writeEgg(egg_stream)
+    return len(egg_stream.getData())
+
+
+class EggVertexWelder:
+    """
+    Merges vertex pools together, welds duplicate and nearly duplicate vertices, and drops the vertices
+    that nothing uses anymore, renumbering what's left.
+    """
+
+    def __init__(self, file_list: list, eggman: EggMan = None, tolerances: WeldTolerances = None):
+        self.eggman = eggman
+        if not self.eggman:
+            self.eggman = EggMan(file_list)
+        self.tolerances = tolerances or WeldTolerances()
+
+    @staticmethod
+    def get_vertex_pools(egg_node: EggGroupNode) -> List[EggVertexPool]:
+        vertex_pools = []
+        for child in egg_node.getChildren():
+            if isinstance(child, EggVertexPool):
+                vertex_pools.append(child)
+            elif isinstance(child, EggGroupNode):
+                vertex_pools.extend(EggVertexWelder.get_vertex_pools(child))
+        return vertex_pools
+
+    @staticmethod
+    def get_vertex_uses(egg_node: EggGroupNode, vertex_uses: dict = None) -> Dict[EggVertex, List[EggPrimitive]]:
+        """
+        :returns: { EggVertex: [every primitive using it] }
+        """
+        if vertex_uses is None:
+            vertex_uses = dict()
+        for child in egg_node.getChildren():
+            if isinstance(child, EggPrimitive):
+                for egg_vertex in child.getVertices():
+                    vertex_uses.setdefault(egg_vertex, []).append(child)
+            elif isinstance(child, EggGroupNode):
+                EggVertexWelder.get_vertex_uses(child, vertex_uses)
+        return vertex_uses
+
+    @staticmethod
+    def get_pool_vertices(vertex_pool: EggVertexPool) -> List[EggVertex]:
+        return [
+            vertex_pool.getVertex(index) for index in range(vertex_pool.getHighestIndex() + 1)
+            if vertex_pool.hasVertex(index)
+        ]
+
+    def merge_pools(self, egg_node: EggGroupNode) -> None:
+        """
+        Merges every vertex pool under the node into the first one.
+        Pools under an <Instance> hold local coordinates, so those only get merged with pools of the same instance.
+        """
+        frame_pools = dict()  # { instance: [EggVertexPool] }
+        for vertex_pool in self.get_vertex_pools(egg_node):
+            instance = vertex_pool.getParent()
+            while isinstance(instance, EggGroup) and instance.getGroupType() != EggGroup.GT_instance:
+                instance = instance.getParent()
+            frame_pools.setdefault(instance if isinstance(instance, EggGroup) else None, []).append(vertex_pool)
+        for vertex_pools in frame_pools.values():
+            if len(vertex_pools) > 1:
+                EggMan.merge_vertex_pools(vertex_pools)
+
+    def is_close(self, egg_vertex: EggVertex, other: EggVertex) -> bool:
+        """
+        Checks the attributes that have a tolerance, then copies them over onto a probe vertex
+        to let Panda3D compare the rest.
+        """
+        tolerances = self.tolerances
+        if max(abs(a - b) for a, b in zip(egg_vertex.getPos4(), other.getPos4())) > tolerances.position:
+            return False
+        probe = EggVertex(egg_vertex)
+        probe.setPos4(other.getPos4())
+        probe.setExternalIndex(other.getExternalIndex())
+        for has_attribute, getter, setter, tolerance in (
+                ("hasNormal", "getNormal", "setNormal", tolerances.normal),
+                ("hasColor", "getColor", "setColor", tolerances.color),
+                ("hasUv", "getUv", "setUv", tolerances.uv),
+        ):
+            if getattr(egg_vertex, has_attribute)() != getattr(other, has_attribute)():
+                return False
+            if not getattr(egg_vertex, has_attribute)():
+                continue
+            value, other_value = getattr(egg_vertex, getter)(), getattr(other, getter)()
+            if max(abs(a - b) for a, b in zip(value, other_value)) > tolerance:
+                return False
+            getattr(probe, setter)(other_value)
+        return probe.compareTo(other) == 0
+
+    def weld_pool(self, vertex_pool: EggVertexPool, vertex_uses: Dict[EggVertex, List[EggPrimitive]],
+                  joints: List[EggGroup]) -> Tuple[int, int]:
+        """
+        Welds the vertices of the pool through a spatial hash, points the primitives at the vertices that stay,
+        then drops everything unused and renumbers the rest from 0.
+
+        :returns: (welded vertex count, unused vertex count)
+        """
+        cell_size = max(self.tolerances.position, 1e-9)
+        cells = dict()  # { (x, y, z) cell: [EggVertex that stays] }
+        kept_vertices = []
+        dropped_vertices = []
+        memberships = dict()  # { EggVertex: (membership of each joint) }
+        welded = unused = 0
+        for egg_vertex in self.get_pool_vertices(vertex_pool):
+            primitives = vertex_uses.get(egg_vertex)
+            if not primitives:
+                unused += 1
+                dropped_vertices.append(egg_vertex)
+                continue
+            memberships[egg_vertex] = tuple(joint.getVertexMembership(egg_vertex) for joint in joints)
+            cell = tuple(math.floor(coordinate / cell_size) for coordinate in egg_vertex.getPos3())
+            match = None
+            for offset in itertools.product((-1, 0, 1), repeat = 3):
+                neighbor = tuple(index + step for index, step in zip(cell, offset))
+                for other in cells.get(neighbor, ()):
+                    if memberships[egg_vertex] == memberships[other] and self.is_close(egg_vertex, other):
+                        match = other
+                        break
+                if match is not None:
+                    break
+            if match is None:
+                cells.setdefault(cell, []).append(egg_vertex)
+                kept_vertices.append(egg_vertex)
+                continue
+
+            welded += 1
+            dropped_vertices.append(egg_vertex)
+            for egg_primitive in primitives:
+                for index, primitive_vertex in enumerate(egg_primitive.getVertices()):
+                    # EggVertex == compares attributes, not identity
+                    if primitive_vertex.this == egg_vertex.this:
+                        egg_primitive.setVertex(index, match)
+            vertex_uses[match].extend(primitives)
+            del vertex_uses[egg_vertex]
+
+        for egg_vertex in dropped_vertices:
+            for joint in joints:
+                if joint.getVertexMembership(egg_vertex):
+                    joint.unrefVertex(egg_vertex)
+        # Take everything out, and put back only what stays, numbered from 0 in the same order
+        for egg_vertex in self.get_pool_vertices(vertex_pool):
+            vertex_pool.removeVertex(egg_vertex)
+        for index, egg_vertex in enumerate(kept_vertices):
+            vertex_pool.addVertex(egg_vertex, index)
+        return welded, unused
+
+    def consolidate(self, egg_data: Optional[EggDataContext] = None, node_names: List[str] = None,
+                    merge_pools: bool = True) -> Dict[str, WeldResult]:
+        """
+        Merges the vertex pools of the egg, or by group when node names are given (wildcards allowed),
+        then welds the vertices in each pool. Primitives left with too few vertices are removed.
+
+        WILL affect model/egg data
+
+        :returns: { egg filename: WeldResult }
+        """
+        node_config = NodeNameConfig(set(node_names)) if node_names else None
+        egg_datas = [egg_data] if egg_data else list(self.eggman.egg_datas.keys())
+        report = dict()
+        for egg_data in egg_datas:
+            ctx = self.eggman.egg_datas[egg_data]
+            vertex_pools = self.get_vertex_pools(egg_data)
+            result = WeldResult(
+                vertex_pools_before = len(vertex_pools),
+                vertices_before = sum(len(vertex_pool) for vertex_pool in vertex_pools),
+                bytes_before = get_egg_bytes(egg_data),
+            )
+
+            scopes = [egg_data]
+            if node_config:
+                scopes = [egg_group for egg_group in ctx.egg_groups if node_config.check(egg_group.getName())]
+            if merge_pools:
+                for egg_node in scopes:
+                    self.merge_pools(egg_node)
+
+            vertex_uses = self.get_vertex_uses(egg_data)
+            joints = [egg_group for egg_group in ctx.egg_groups if egg_group.getGroupType() == EggGroup.GT_joint]
+            weld_pools = dict.fromkeys(
+                vertex_pool for egg_node in scopes for vertex_pool in self.get_vertex_pools(egg_node)
+            )
+            for vertex_pool in weld_pools:
+                welded, unused = self.weld_pool(vertex_pool, vertex_uses, joints)
+                result.welded += welded
+                result.unused += unused
+            result.invalid_primitives = egg_data.removeInvalidPrimitives(True)
+
+            vertex_pools = self.get_vertex_pools(egg_data)
+            result.vertex_pools_after = len(vertex_pools)
+            result.vertices_after = sum(len(vertex_pool) for vertex_pool in vertex_pools)
+            result.bytes_after = get_egg_bytes(egg_data)
+            self.eggman.rebuild_egg_context(egg_data)
+            report[ctx.filename.getFullpath()] = result
+        return report
@@ -0,0 +1,214 @@
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from panda3d.core import Filename
+from panda3d.egg import EggGroup, EggTexture
+
+from eggtools.EggMan import EggMan
+from eggtools.components.EggContext import EggContext
+from eggtools.components.EggDataContext import EggDataContext
+from eggtools.utils.TextureCatalog import TextureCatalog
+
+# Counts every egg and group entry in the report has, and that it can be sorted by
+STAT_KEYS = ("polygons", "vertices", "vertex_pools", "textures", "texture_bytes", "depth")
+
+
+def get_texture_bytes(egg_texture: EggTexture, catalog: TextureCatalog) -> int:
+    """
+    Uncompressed size of the texture once loaded, going by its image header.
+    A separate alpha file gets folded into the texture as an extra channel.
+    """
+    texture_info = catalog.get(egg_texture)
+    if not texture_info:
+        return 0
+    channels = texture_info.channels
+    if egg_texture.hasAlphaFilename() and not texture_info.has_alpha:
+        channels += 1
+    return texture_info.pixel_count * channels
+
+
+def get_group_path(egg_group: EggGroup, ctx: EggContext) -> str:
+    names = []
+    node = egg_group
+    while node in ctx.egg_group_depths:
+        names.append(node.getName())
+        node = node.getParent()
+    return "/" + "/".join(reversed(names))
+
+
+def get_egg_stats(egg_data: EggDataContext, ctx: EggContext, catalog: TextureCatalog) -> dict:
+    """
+    Sums up what EggMan recorded while registering the egg; the egg itself isn't traversed again.
+    Group counts include everything under the group. Polygons count towards a group's textures by their first TRef.
+
+    :returns: JSON friendly counts for the egg and each of its groups
+    """
+    texture_bytes = dict()  # { texture path: bytes }
+    for egg_texture in ctx.egg_textures:
+        texture_bytes[egg_texture.getFullpath().toOsSpecific()] = get_texture_bytes(egg_texture, catalog)
+
+    group_contents = dict()  # { EggGroup: [polygon count, {EggVertex}, {EggVertexPool}, {texture path}] }
+    polygons = 0
+    vertices = set()
+    for egg_node, point_datas in ctx.point_data.items():
+        node_vertices = set()
+        node_textures = set()
+        for point_data in point_datas:
+            node_vertices.update(point_data.egg_vertex_uvs.keys())
+            if point_data.egg_texture:
+                node_textures.add(point_data.egg_texture.getFullpath().toOsSpecific())
+        node_pools = {egg_vertex.getPool() for egg_vertex in node_vertices}
+        polygons += len(point_datas)
+        vertices.update(node_vertices)
+
+        # Every group above the polygons gets them too
+        while egg_node in ctx.egg_group_depths:
+            contents = group_contents.setdefault(egg_node, [0, set(), set(), set()])
+            contents[0] += len(point_datas)
+            contents[1].update(node_vertices)
+            contents[2].update(node_pools)
+            contents[3].update(node_textures)
+            egg_node = egg_node.getParent()
+
+    groups = []
+    for egg_group, (group_polygons, group_vertices, group_pools, group_textures) in group_contents.items():
+        groups.append({
+            "group": get_group_path(egg_group, ctx),
+            "polygons": group_polygons,
+            "vertices": len(group_vertices),
+            "vertex_pools": len(group_pools),
+            "textures": len(group_textures),
+            "texture_bytes": sum(texture_bytes.get(texture_path, 0) for texture_path in group_textures),
+            "depth": ctx.egg_group_depths[egg_group],
+        })
+
+    return {
+        "filename": ctx.filename.getFullpath() if ctx.filename else "",
+        "polygons": polygons,
+        "vertices": len(vertices),
+        "vertex_pools": len(ctx.egg_vertex_pools),
+        "textures": len(texture_bytes),
+        "texture_bytes": sum(texture_bytes.values()),
+        "depth": max(ctx.egg_group_depths.values(), default = 0),
+        "groups": groups,
+        "texture_paths": texture_bytes,
+    }
+
+
+def collect_egg_stats(egg_path: str) -> Optional[dict]:
+    """
+    Registers a single egg and returns its counts.
+    Kept at the module level so that it can run in a worker process.
+    """
+    try:
+        eggman = EggMan([Filename.fromOsSpecific(egg_path)])
+    except Exception as e:
+        logging.warning(f"Couldn't read {egg_path} ({e})")
+        return None
+    catalog = TextureCatalog(None, eggman = eggman, cache_filename = None, max_workers = 1)
+    catalog.update()
+    for egg_data, ctx in eggman.egg_datas.items():
+        return get_egg_stats(egg_data, ctx, catalog)
+    return None
+
+
+class GeometryReport:
+    """
+    Counts polygons, vertices, vertex pools, textures, texture memory and hierarchy depth for every egg and group,
+    so that large asset trees can be checked against a geometry budget.
+
+    Without an EggMan, eggs are registered in parallel worker processes, one egg at a time,
+    instead of holding the whole asset tree in memory at once.
+    """
+
+    def __init__(self, file_list: list, eggman: EggMan = None, max_workers: int = None,
+                 use_processes: bool = True):
+        """
+        :param EggMan eggman: Report on eggs that are already registered, in this process.
+        :param int max_workers: Worker count, defaults to what the executor picks.
+        :param bool use_processes: Collect in worker processes. Otherwise, threads are used.
+        """
+        self.file_list = file_list or []
+        self.eggman = eggman
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+
+    def collect(self) -> List[dict]:
+        """
+        Does not affect model/egg data
+
+        :returns: Counts for each egg, in no particular order
+        """
+        if self.eggman:
+            catalog = TextureCatalog(None, eggman = self.eggman, cache_filename = None, max_workers = self.max_workers)
+            catalog.update()
+            return [get_egg_stats(egg_data, ctx, catalog) for egg_data, ctx in self.eggman.egg_datas.items()]
+
+        egg_paths = [
+            egg_path.toOsSpecific() if isinstance(egg_path, Filename) else str(egg_path) for egg_path in self.file_list
+        ]
+        executor_type = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        with executor_type(max_workers = self.max_workers) as executor:
+            egg_stats = list(executor.map(collect_egg_stats, egg_paths))
+        return [egg_info for egg_info in egg_stats if egg_info]
+
+    @staticmethod
+    def build_report(egg_stats: List[dict], sort_by: str = "polygons", max_groups: int = None) -> dict:
+        """
+        Aggregates the counts of every egg, largest first.
+
+        :param str sort_by: One of STAT_KEYS to rank eggs and groups by.
+        :param int max_groups: Only keep this many of the largest groups across all eggs.
+        """
+        if sort_by not in STAT_KEYS:
+            raise ValueError(f"Can't sort by {sort_by}, expected one of {', '.join(STAT_KEYS)}")
+
+        texture_bytes = dict()
+        groups = []
+        for egg_info in egg_stats:
+            texture_bytes.update(egg_info["texture_paths"])
+            groups.extend(dict(group_info, filename = egg_info["filename"]) for group_info in egg_info["groups"])
+        groups.sort(key = lambda group_info: group_info[sort_by], reverse = True)
+        eggs = sorted(
+            ({key: value for key, value in egg_info.items() if key != "texture_paths"} for egg_info in egg_stats),
+            key = lambda egg_info: egg_info[sort_by], reverse = True
+        )
+
+        totals = {key: sum(egg_info[key] for egg_info in eggs) for key in STAT_KEYS if key != "depth"}
+        # Textures shared between eggs only get loaded once
+        totals["textures"] = len(texture_bytes)
+        totals["texture_bytes"] = sum(texture_bytes.values())
+        totals["depth"] = max((egg_info["depth"] for egg_info in eggs), default = 0)
+        totals["eggs"] = len(eggs)
+        return {
+            "sort_by": sort_by,
+            "totals": totals,
+            "eggs": eggs,
+            "groups": groups[:max_groups] if max_groups else groups,
+        }
+
+    def generate(self, sort_by: str = "polygons", max_groups: int = None) -> dict:
+        return self.build_report(self.collect(), sort_by = sort_by, max_groups = max_groups)
+
+    def get_over_budget(self, budget: Dict[str, int], report: dict = None) -> Dict[str, List[str]]:
+        """
+        :param dict budget: { stat key: highest allowed count per egg }
+        :returns: { egg filename: [stat keys over budget] }
+        """
+        if not report:
+            report = self.generate()
+        over_budget = dict()
+        for egg_info in report["eggs"]:
+            exceeded = [key for key, limit in budget.items() if egg_info[key] > limit]
+            if exceeded:
+                over_budget[egg_info["filename"]] = exceeded
+        return over_budget
+
+    def write_json(self, filename: str, report: dict = None) -> dict:
+        if not report:
+            report = self.generate()
+        with open(filename, "w") as report_file:
+            json.dump(report, report_file, indent = 2)
+        return report
@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Union
+
+from PIL import Image
+from panda3d.core import Filename
+from panda3d.egg import EggTexture
+
+from eggtools.EggMan import EggMan
+from eggtools.components.EggDataContext import EggDataContext
+
+
+@dataclass
+class TextureInfo:
+    """
+    What an image file looks like, as far as its header can tell. Nothing here requires decoding pixels.
+    """
+
+    def __str__(self):
+        return f"TextureInfo: {self.path} {self.width}x{self.height} {self.mode} ({self.format}, {self.file_size} bytes)"
+
+    path: str
+    width: int
+    height: int
+
+    # PIL image mode, such as RGB, RGBA, L or P
+    mode: str
+    channels: int
+
+    # PIL format name, such as PNG or JPEG
+    format: str
+
+    file_size: int
+    mtime_ns: int
+
+    @property
+    def has_alpha(self) -> bool:
+        return "A" in self.mode.upper() or self.channels == 4
+
+    @property
+    def is_power_of_two(self) -> bool:
+        return self.width & (self.width - 1) == 0 and self.height & (self.height - 1) == 0
+
+    @property
+    def pixel_count(self) -> int:
+        return self.width * self.height
+
+
+class TextureCatalog:
+    """
+    Project-wide catalog of every texture referenced by the eggs in EggMan, read from image headers only.
+
+    Entries can be cached on disk, and are only read again when a file's size or modification time changes.
+    """
+    # Suggested name for the cache, kept next to the eggs or textures it catalogs
+    CACHE_NAME = "texture_catalog.json"
+
+    def __init__(self, file_list: list, eggman: EggMan = None, cache_filename: str = None,
+                 max_workers: int = None):
+        """
+        :param str cache_filename: JSON file the catalog is kept in between runs, such as
+            os.path.join(texture_root, TextureCatalog.CACHE_NAME). Nothing is cached on disk by default.
+        :param int max_workers: Threads used to read image headers, defaults to what ThreadPoolExecutor picks.
+        """
+        self.eggman = eggman
+        if not self.eggman:
+            self.eggman = EggMan(file_list)
+        self.cache_filename = cache_filename
+        self.max_workers = max_workers
+        self.entries: Dict[str, TextureInfo] = dict()
+        self.load()
+
+    @staticmethod
+    def get_texture_paths(egg_texture: EggTexture) -> list:
+        """
+        :returns: The OS specific paths of the image, and the alpha image if there is one, used by the EggTexture.
+        """
+        texture_paths = [egg_texture.getFullpath().toOsSpecific()]
+        if egg_texture.hasAlphaFilename():
+            texture_paths.append(egg_texture.getAlphaFullpath().toOsSpecific())
+        return texture_paths
+
+    @staticmethod
+    def read_texture_info(texture_path: str) -> Optional[TextureInfo]:
+        """
+        Reads the dimensions and format of an image. PIL opens images lazily, so only the header is read.
+        """
+        try:
+            texture_stat = os.stat(texture_path)
+            with Image.open(texture_path) as image:
+                width, height = image.size
+                mode = image.mode
+                channels = len(image.getbands())
+                if mode == "P" and image.info.get("transparency") is not None:
+                    # Paletted images with a transparent index get expanded to RGBA when loaded
+                    channels = 4
+                image_format = image.format
+        except OSError as e:
+            logging.warning(f"Couldn't read the header of {texture_path} ({e})")
+            return None
+        return TextureInfo(
+            path = texture_path, width = width, height = height, mode = mode, channels = channels,
+            format = image_format, file_size = texture_stat.st_size, mtime_ns = texture_stat.st_mtime_ns,
+        )
+
+    def is_up_to_date(self, texture_path: str) -> bool:
+        texture_info = self.entries.get(texture_path)
+        if not texture_info:
+            return False
+        try:
+            texture_stat = os.stat(texture_path)
+        except OSError:
+            return False
+        return texture_info.file_size == texture_stat.st_size and texture_info.mtime_ns == texture_stat.st_mtime_ns
+
+    def update(self) -> None:
+        """
+        Catalogs every texture referenced by EggMan. Stale or missing entries are read in parallel.
+        """
+        texture_paths = set()
+        for ctx in self.eggman.egg_datas.values():
+            for egg_texture in ctx.egg_textures:
+                texture_paths.update(self.get_texture_paths(egg_texture))
+
+        stale_paths = sorted(path for path in texture_paths if not self.is_up_to_date(path))
+        if stale_paths:
+            with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+                for texture_path, texture_info in zip(stale_paths, executor.map(self.read_texture_info, stale_paths)):
+                    if texture_info:
+                        self.entries[texture_path] = texture_info
+                    else:
+                        self.entries.pop(texture_path, None)
+            self.save()
+        logging.info(f"Cataloged {len(texture_paths)} textures, {len(stale_paths)} read from disk")
+
+    def get(self, texture: Union[EggTexture, Filename, str]) -> Optional[TextureInfo]:
+        if isinstance(texture, EggTexture):
+            texture = texture.getFullpath()
+        if isinstance(texture, Filename):
+            texture = texture.toOsSpecific()
+        return self.entries.get(texture)
+
+    def get_egg_textures(self, egg_data: EggDataContext) -> Dict[EggTexture, Optional[TextureInfo]]:
+        """
+        :returns: { EggTexture: TextureInfo } for every texture of the egg. Missing images map to None.
+        """
+        ctx = self.eggman.egg_datas[egg_data]
+        return {egg_texture: self.get(egg_texture) for egg_texture in ctx.egg_textures}
+
+    def load(self) -> None:
+        if not self.cache_filename or not os.path.isfile(self.cache_filename):
+            return
+        try:
+            with open(self.cache_filename) as cache_file:
+                self.entries = {
+                    texture_path: TextureInfo(**texture_info)
+                    for texture_path, texture_info in json.load(cache_file).items()
+                }
+        except (OSError, ValueError, TypeError) as e:
+            logging.warning(f"Couldn't read texture catalog {self.cache_filename}, starting a new one ({e})")
+            self.entries = dict()
+
+    def save(self) -> None:
+        if not self.cache_filename:
+            return
+        with open(self.cache_filename, "w") as cache_file:
+            json.dump(
+                {texture_path: asdict(texture_info) for texture_path, texture_info in self.entries.items()},
+                cache_file, indent = 2, sort_keys = True
+            )
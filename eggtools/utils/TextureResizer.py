@@ -0,0 +1,225 @@
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+from panda3d.core import Filename
+from panda3d.egg import EggTexture
+
+from eggtools.EggMan import EggMan
+from eggtools.components.EggDataContext import EggDataContext
+from eggtools.components.points.PointData import PointData
+from eggtools.utils.TextureCatalog import TextureCatalog
+
+
+def previous_power_of_two(value: int) -> int:
+    return 1 << max(int(value).bit_length() - 1, 0)
+
+
+@dataclass
+class TextureResizeJob:
+    """
+    One source image to be resized, and every EggTexture that gets pointed to the result.
+    """
+
+    def __str__(self):
+        density = f"{self.texel_density:.1f} texels/unit" if self.texel_density else "no density"
+        return f"TextureResizeJob: {self.source_path} {self.size[0]}x{self.size[1]} ({density}) -> " \
+               f"{self.target_size[0]}x{self.target_size[1]}"
+
+    def __hash__(self):
+        return hash(id(self))
+
+    source_path: str
+    size: Tuple[int, int]
+    target_size: Tuple[int, int]
+
+    # Texels per world unit the texture currently has on the model, None if it couldn't be measured.
+    texel_density: Optional[float] = None
+
+    egg_textures: List[Tuple[EggDataContext, EggTexture]] = field(default_factory = list)
+
+    @property
+    def output_basename(self) -> str:
+        base, ext = os.path.splitext(os.path.basename(self.source_path))
+        return f"{base}_{self.target_size[0]}x{self.target_size[1]}{ext}"
+
+    @property
+    def output_path(self) -> str:
+        return os.path.join(os.path.dirname(self.source_path), self.output_basename)
+
+
+class TextureResizer:
+    """
+    Shrinks oversized textures down to a texel density and/or power-of-two size, and repaths the eggs using them.
+    The source images are left untouched; resized copies are written next to them.
+    """
+
+    def __init__(self, file_list: list, eggman: EggMan = None, catalog: TextureCatalog = None,
+                 target_density: float = None, max_size: int = None, power_of_two: bool = True,
+                 min_size: int = 4, max_workers: int = None, resample=Image.Resampling.LANCZOS):
+        """
+        :param float target_density: Texels per world unit to aim for. Textures are never scaled up to reach it.
+        :param int max_size: Largest width/height a texture is allowed to have.
+        :param bool power_of_two: Round both sides down to a power of two.
+        :param int min_size: Smallest width/height a texture is shrunk to.
+        :param int max_workers: Threads used to resize images, defaults to what ThreadPoolExecutor picks.
+        """
+        self.eggman = eggman
+        if not self.eggman:
+            self.eggman = EggMan(file_list)
+        self.catalog = catalog
+        if not self.catalog:
+            self.catalog = TextureCatalog(file_list, eggman = self.eggman, cache_filename = None)
+        self.target_density = target_density
+        self.max_size = max_size
+        self.power_of_two = power_of_two
+        self.min_size = min_size
+        self.max_workers = max_workers
+        self.resample = resample
+
+    @staticmethod
+    def get_surface_areas(point_data: PointData) -> Tuple[float, float]:
+        """
+        Area of a polygon in model space and in UV space, using the order its vertices were registered in.
+
+        :returns: (world area, uv area)
+        """
+        positions = [egg_vertex.getPos3() for egg_vertex in point_data.egg_vertex_uvs.keys()]
+        uvs = list(point_data.egg_vertex_uvs.values())
+        if len(positions) < 3 or any(u is None for u, _ in uvs):
+            return 0.0, 0.0
+
+        # Newell's method; the length of the summed cross products is twice the area of the polygon
+        normal = [0.0, 0.0, 0.0]
+        uv_area = 0.0
+        for index in range(len(positions)):
+            (x1, y1, z1), (x2, y2, z2) = positions[index - 1], positions[index]
+            normal[0] += (y1 - y2) * (z1 + z2)
+            normal[1] += (z1 - z2) * (x1 + x2)
+            normal[2] += (x1 - x2) * (y1 + y2)
+            (u1, v1), (u2, v2) = uvs[index - 1], uvs[index]
+            uv_area += u1 * v2 - u2 * v1
+        world_area = math.sqrt(sum(component * component for component in normal)) / 2
+        return world_area, abs(uv_area) / 2
+
+    def get_texel_densities(self) -> Dict[str, float]:
+        """
+        Measures how many texels each texture has per world unit, averaged over the surface of every polygon
+        using it across all eggs. Polygon positions are taken in model space, without group transforms.
+
+        :returns: { texture path: texels per unit }
+        """
+        self.catalog.update()
+        surface_areas = dict()  # { texture path: [world area, uv area] }
+        for egg_data, ctx in self.eggman.egg_datas.items():
+            for point_datas in ctx.point_data.values():
+                for point_data in point_datas:
+                    if not point_data.egg_texture:
+                        continue
+                    texture_path = point_data.egg_texture.getFullpath().toOsSpecific()
+                    world_area, uv_area = self.get_surface_areas(point_data)
+                    areas = surface_areas.setdefault(texture_path, [0.0, 0.0])
+                    areas[0] += world_area
+                    areas[1] += uv_area
+
+        densities = dict()
+        for texture_path, (world_area, uv_area) in surface_areas.items():
+            texture_info = self.catalog.get(texture_path)
+            if not texture_info or not world_area or not uv_area:
+                continue
+            densities[texture_path] = math.sqrt(uv_area * texture_info.pixel_count / world_area)
+        return densities
+
+    def get_target_size(self, size: Tuple[int, int], texel_density: Optional[float]) -> Tuple[int, int]:
+        width, height = size
+        scale = 1.0
+        if self.target_density and texel_density:
+            scale = min(scale, self.target_density / texel_density)
+        if self.max_size:
+            scale = min(scale, self.max_size / max(width, height))
+
+        target_width = max(round(width * scale), self.min_size)
+        target_height = max(round(height * scale), self.min_size)
+        if self.power_of_two:
+            target_width = previous_power_of_two(target_width)
+            target_height = previous_power_of_two(target_height)
+        # Never scale up
+        return min(target_width, width), min(target_height, height)
+
+    def plan(self) -> List[TextureResizeJob]:
+        """
+        Does not affect model/egg data
+        """
+        densities = self.get_texel_densities()
+
+        jobs = dict()  # { texture path: TextureResizeJob }
+        for egg_data, ctx in self.eggman.egg_datas.items():
+            for egg_texture in ctx.egg_textures:
+                texture_path = egg_texture.getFullpath().toOsSpecific()
+                if texture_path not in jobs:
+                    texture_info = self.catalog.get(texture_path)
+                    if not texture_info:
+                        continue
+                    size = (texture_info.width, texture_info.height)
+                    texel_density = densities.get(texture_path)
+                    target_size = self.get_target_size(size, texel_density)
+                    if target_size == size:
+                        continue
+                    jobs[texture_path] = TextureResizeJob(texture_path, size, target_size, texel_density)
+                jobs[texture_path].egg_textures.append((egg_data, egg_texture))
+        return list(jobs.values())
+
+    @staticmethod
+    def is_up_to_date(job: TextureResizeJob) -> bool:
+        return os.path.isfile(job.output_path) and \
+            os.path.getmtime(job.output_path) >= os.path.getmtime(job.source_path)
+
+    def resize_image(self, job: TextureResizeJob) -> bool:
+        if self.is_up_to_date(job):
+            return True
+        try:
+            with Image.open(job.source_path) as source_image:
+                save_kwargs = dict()
+                if source_image.format == "JPEG":
+                    save_kwargs['quality'] = 95
+                resized_image = source_image.resize(job.target_size, resample = self.resample)
+                resized_image.save(job.output_path, **save_kwargs)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Couldn't resize {job.source_path} ({e})")
+            return False
+        return True
+
+    def apply_job(self, job: TextureResizeJob) -> None:
+        """
+        Points every EggTexture of the job to the resized image, keeping their paths relative if they were.
+
+        WILL affect model/egg data
+        """
+        for egg_data, egg_texture in job.egg_textures:
+            filename = Filename(egg_texture.getFilename())
+            filename.setBasename(job.output_basename)
+            fullpath = Filename(egg_texture.getFullpath())
+            fullpath.setBasename(job.output_basename)
+            egg_texture.setFilename(filename)
+            egg_texture.setFullpath(fullpath)
+            self.eggman.mark_dirty(egg_data)
+
+    def resize_all(self, dry_run: bool = False) -> List[TextureResizeJob]:
+        """
+        Resizes every texture over the density or size targets, in parallel, and repaths the eggs to them.
+
+        :param bool dry_run: Only plan out the new sizes, without writing images or modifying any eggs.
+        :returns: The planned TextureResizeJobs
+        """
+        jobs = self.plan()
+        if dry_run:
+            return jobs
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            for job, resized in zip(jobs, executor.map(self.resize_image, jobs)):
+                if resized:
+                    self.apply_job(job)
+        return jobs
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Tuple
+
+from panda3d.core import Filename, SamplerState, Texture
+from panda3d.egg import EggTexture
+
+from eggtools.EggMan import EggMan
+from eggtools.components.EggDataContext import EggDataContext
+from eggtools.components.SidecarManifest import SidecarManifest
+
+egg2filter = {
+    EggTexture.FT_nearest: SamplerState.FT_nearest,
+    EggTexture.FT_linear: SamplerState.FT_linear,
+    EggTexture.FT_nearest_mipmap_nearest: SamplerState.FT_nearest_mipmap_nearest,
+    EggTexture.FT_linear_mipmap_nearest: SamplerState.FT_linear_mipmap_nearest,
+    EggTexture.FT_nearest_mipmap_linear: SamplerState.FT_nearest_mipmap_linear,
+    EggTexture.FT_linear_mipmap_linear: SamplerState.FT_linear_mipmap_linear,
+}
+
+egg2wrap = {
+    EggTexture.WM_clamp: SamplerState.WM_clamp,
+    EggTexture.WM_repeat: SamplerState.WM_repeat,
+    EggTexture.WM_mirror: SamplerState.WM_mirror,
+    EggTexture.WM_mirror_once: SamplerState.WM_mirror_once,
+    EggTexture.WM_border_color: SamplerState.WM_border_color,
+}
+
+egg2compression = {
+    EggTexture.CM_default: Texture.CM_default,
+    EggTexture.CM_off: Texture.CM_off,
+    EggTexture.CM_on: Texture.CM_on,
+    EggTexture.CM_fxt1: Texture.CM_fxt1,
+    EggTexture.CM_dxt1: Texture.CM_dxt1,
+    EggTexture.CM_dxt2: Texture.CM_dxt2,
+    EggTexture.CM_dxt3: Texture.CM_dxt3,
+    EggTexture.CM_dxt4: Texture.CM_dxt4,
+    EggTexture.CM_dxt5: Texture.CM_dxt5,
+}
+
+mipmap_filters = {
+    EggTexture.FT_nearest_mipmap_nearest, EggTexture.FT_linear_mipmap_nearest,
+    EggTexture.FT_nearest_mipmap_linear, EggTexture.FT_linear_mipmap_linear,
+}
+
+
+@dataclass
+class TxoJob:
+    """
+    Everything needed to write one .txo file. Only holds plain values so that it can be sent to worker processes.
+    """
+
+    def __str__(self):
+        return f"TxoJob: {self.source_path} -> {self.output_path}{' (mipmapped)' if self.mipmaps else ''}"
+
+    source_path: str
+    output_path: str
+    alpha_path: str = ""
+    alpha_file_channel: int = 0
+
+    mipmaps: bool = False
+    # Texture.CompressionMode; stored in the .txo as a hint for when the texture gets loaded.
+    compression: int = Texture.CM_default
+    # Compress the RAM image now, rather than leaving it up to the graphics driver at load time.
+    precompress: bool = False
+    quality_level: int = Texture.QL_default
+
+    minfilter: int = SamplerState.FT_default
+    magfilter: int = SamplerState.FT_default
+    wrap_u: int = SamplerState.WM_repeat
+    wrap_v: int = SamplerState.WM_repeat
+    anisotropic_degree: int = 0
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Hash of the images and every setting that goes into the .txo file
+        """
+        return hashlib.sha1(json.dumps(asdict(self), sort_keys = True).encode("utf-8")).hexdigest()
+
+    def is_up_to_date(self, manifest: "TxoManifest") -> bool:
+        """
+        True if the .txo file is newer than its images, and was written with the same settings.
+        """
+        if not manifest.is_up_to_date(self.output_path, self.fingerprint):
+            return False
+        output_mtime = os.path.getmtime(self.output_path)
+        source_paths = [self.source_path] + ([self.alpha_path] if self.alpha_path else [])
+        return all(os.path.getmtime(source_path) <= output_mtime for source_path in source_paths)
+
+
+class TxoManifest(SidecarManifest):
+    """
+    Kept next to the .txo files, recording the settings each one was written with,
+    so that changing the settings of a texture converts it again.
+    """
+    MANIFEST_NAME = "txo_manifest.json"
+
+
+def write_txo(job: TxoJob) -> bool:
+    """
+    Converts an image into a .txo file with Panda3D.
+    Kept at the module level so that it can run in a worker process.
+    """
+    texture = Texture()
+    source_filename = Filename.fromOsSpecific(job.source_path)
+    if job.alpha_path:
+        loaded = texture.read(source_filename, Filename.fromOsSpecific(job.alpha_path), 0, job.alpha_file_channel)
+    else:
+        loaded = texture.read(source_filename)
+    if not loaded:
+        logging.warning(f"Couldn't read {job.source_path}")
+        return False
+
+    texture.setMinfilter(job.minfilter)
+    texture.setMagfilter(job.magfilter)
+    texture.setWrapU(job.wrap_u)
+    texture.setWrapV(job.wrap_v)
+    if job.anisotropic_degree:
+        texture.setAnisotropicDegree(job.anisotropic_degree)
+    texture.setCompression(job.compression)
+    texture.setQualityLevel(job.quality_level)
+
+    if job.mipmaps:
+        texture.generateRamMipmapImages()
+    if job.precompress and job.compression not in (Texture.CM_default, Texture.CM_off):
+        if not texture.compressRamImage(job.compression, job.quality_level):
+            logging.warning(f"Couldn't compress {job.source_path}, writing it uncompressed")
+
+    return texture.write(Filename.fromOsSpecific(job.output_path))
+
+
+class TxoConverter:
+    """
+    Converts every texture referenced by the eggs in EggMan into Panda3D's .txo format, so that the
+    client loads ready-made (and optionally mipmapped) RAM images instead of decoding PNGs and JPGs.
+    """
+
+    def __init__(self, file_list: list, eggman: EggMan = None, mipmaps: bool = None, precompress: bool = False,
+                 max_workers: int = None, use_processes: bool = True):
+        """
+        :param bool mipmaps: Precompute mipmaps. By default, only textures with a mipmapping minfilter get them.
+        :param bool precompress: Compress textures that ask for it (<Scalar> compression) during conversion.
+        :param int max_workers: Worker count, defaults to what the executor picks.
+        :param bool use_processes: Convert in worker processes. Otherwise, threads are used.
+        """
+        self.eggman = eggman
+        if not self.eggman:
+            self.eggman = EggMan(file_list)
+        self.mipmaps = mipmaps
+        self.precompress = precompress
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+
+    def make_job(self, egg_texture: EggTexture) -> TxoJob:
+        # Panda3D keeps its own working directory, so don't hand it relative paths
+        source_path = os.path.abspath(egg_texture.getFullpath().toOsSpecific())
+        mipmaps = self.mipmaps
+        if mipmaps is None:
+            mipmaps = egg_texture.getMinfilter() in mipmap_filters
+
+        job = TxoJob(
+            source_path = source_path,
+            # Keeping the extension keeps wall.png and wall.jpg from converting into the same file
+            output_path = source_path + ".txo",
+            mipmaps = mipmaps,
+            compression = egg2compression.get(egg_texture.getCompressionMode(), Texture.CM_default),
+            precompress = self.precompress,
+            quality_level = egg_texture.getQualityLevel(),
+            minfilter = egg2filter.get(egg_texture.getMinfilter(), SamplerState.FT_default),
+            magfilter = egg2filter.get(egg_texture.getMagfilter(), SamplerState.FT_default),
+            wrap_u = egg2wrap.get(egg_texture.determineWrapU(), SamplerState.WM_repeat),
+            wrap_v = egg2wrap.get(egg_texture.determineWrapV(), SamplerState.WM_repeat),
+            anisotropic_degree = egg_texture.getAnisotropicDegree(),
+        )
+        if egg_texture.hasAlphaFilename():
+            job.alpha_path = os.path.abspath(egg_texture.getAlphaFullpath().toOsSpecific())
+            job.alpha_file_channel = egg_texture.getAlphaFileChannel()
+        return job
+
+    def plan(self) -> Tuple[List[TxoJob], Dict[str, List[Tuple[EggDataContext, EggTexture]]]]:
+        """
+        Does not affect model/egg data
+
+        :returns: The conversion jobs, and { output path: [ (EggData, EggTexture), ... ] } to repath afterwards
+        """
+        jobs = dict()  # { output path: TxoJob }
+        egg_textures = dict()
+        for egg_data, ctx in self.eggman.egg_datas.items():
+            for egg_texture in ctx.egg_textures:
+                if egg_texture.getFilename().getExtension().lower() in ("txo", "dds", "ktx"):
+                    continue
+                if not os.path.isfile(egg_texture.getFullpath().toOsSpecific()):
+                    logging.warning(f"Can't find image file {egg_texture.getFullpath()} to convert!")
+                    continue
+                job = self.make_job(egg_texture)
+                if job.output_path not in jobs:
+                    jobs[job.output_path] = job
+                elif jobs[job.output_path] != job:
+                    logging.warning(
+                        f"{egg_texture.getName()} converts {job.source_path} with different settings than "
+                        f"another texture using it, leaving it as is"
+                    )
+                    continue
+                egg_textures.setdefault(job.output_path, []).append((egg_data, egg_texture))
+        return list(jobs.values()), egg_textures
+
+    def apply_job(self, job: TxoJob, egg_textures: List[Tuple[EggDataContext, EggTexture]]) -> None:
+        """
+        Points the EggTextures to the .txo file, which already carries the alpha channel.
+
+        WILL affect model/egg data
+        """
+        for egg_data, egg_texture in egg_textures:
+            egg_texture.setFilename(Filename(f"{egg_texture.getFilename().getFullpath()}.txo"))
+            egg_texture.setFullpath(Filename(f"{egg_texture.getFullpath().getFullpath()}.txo"))
+            egg_texture.clearAlphaFilename()
+            egg_texture.clearAlphaFileChannel()
+            self.eggman.mark_dirty(egg_data)
+
+    def convert_all(self, dry_run: bool = False) -> List[TxoJob]:
+        """
+        Converts every referenced texture to .txo in parallel, skipping the ones that are already up to date,
+        and repaths the eggs to them. See TxoManifest.
+
+        :param bool dry_run: Only plan out the conversions, without writing anything or modifying any eggs.
+        :returns: The planned TxoJobs
+        """
+        jobs, egg_textures = self.plan()
+        if dry_run:
+            return jobs
+
+        manifests = dict()  # { output directory: TxoManifest }
+        stale_jobs = []
+        for job in jobs:
+            output_dir = os.path.dirname(job.output_path)
+            if output_dir not in manifests:
+                manifests[output_dir] = TxoManifest(output_dir)
+            if not job.is_up_to_date(manifests[output_dir]):
+                stale_jobs.append(job)
+
+        executor_type = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        converted = dict.fromkeys((job.output_path for job in jobs), True)
+        if stale_jobs:
+            with executor_type(max_workers = self.max_workers) as executor:
+                for job, written in zip(stale_jobs, executor.map(write_txo, stale_jobs)):
+                    converted[job.output_path] = written
+                    if written:
+                        manifests[os.path.dirname(job.output_path)].record(job.output_path, job.fingerprint)
+        for manifest in manifests.values():
+            manifest.save()
+        logging.info(f"Converted {len(stale_jobs)} textures to txo, {len(jobs) - len(stale_jobs)} already up to date")
+
+        for job in jobs:
+            if converted[job.output_path]:
+                self.apply_job(job, egg_textures[job.output_path])
+            else:
+                logging.warning(f"Couldn't write {job.output_path}")
+        return jobs
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+from panda3d.core import Filename
+
+from eggtools.EggMan import EggMan
+from eggtools.utils.EggDepalettizer import Depalettizer
+
+
+@pytest.fixture
+def base_dir() -> str:
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def test_egg(base_dir) -> Filename:
+    return Filename.fromOsSpecific(os.path.join(base_dir, "models", "test_grid_1.egg"))
+
+
+@pytest.fixture
+def make_depalettizer(base_dir, test_egg):
+    """
+    :returns: A function making a Depalettizer for an egg, test_grid_1.egg and its maps by default
+    """
+
+    def make(egg_filename = test_egg, maps_dir = os.path.join(base_dir, "maps"), **kwargs) -> Depalettizer:
+        eggman = EggMan(
+            egg_filepaths = [egg_filename],
+            search_paths = [maps_dir],
+        )
+        eggman.fix_broken_texpaths(try_names = False, try_absolute = True)
+        return Depalettizer([egg_filename], eggman = eggman, **kwargs)
+
+    return make
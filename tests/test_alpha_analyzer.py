@@ -0,0 +1,93 @@
+import numpy as np
+from PIL import Image
+from panda3d.core import Filename
+from panda3d.egg import EggPolygon, EggRenderMode
+
+from eggtools.EggMan import EggMan
+from eggtools.utils.EggAlphaAnalyzer import AlphaCoverage, EggAlphaAnalyzer
+
+alpha_egg = """<CoordinateSystem> { Y-Up }
+
+<Texture> solid { "solid.png" }
+<Texture> cutout { "cutout.png" }
+<Texture> glass { "glass.png" }
+<Texture> faded { "cutout.png" }
+<Group> props {
+  <Scalar> bin { transparent }
+  <VertexPool> props.verts {
+    <Vertex> 0 { 0 0 0 <UV> { 0 0 } }
+    <Vertex> 1 { 1 0 0 <UV> { 1 0 } }
+    <Vertex> 2 { 1 0 1 <UV> { 1 1 } }
+    <Vertex> 3 { 0 0 1 <UV> { 0 1 } <RGBA> { 1 1 1 0.5 } }
+  }
+  <Polygon> { <TRef> { solid } <VertexRef> { 0 1 2 <Ref> { props.verts } } }
+  <Polygon> { <TRef> { cutout } <VertexRef> { 0 1 2 <Ref> { props.verts } } }
+}
+<Group> window {
+  <VertexPool> window.verts {
+    <Vertex> 0 { 0 0 0 <UV> { 0 0 } }
+    <Vertex> 1 { 1 0 0 <UV> { 1 0 } }
+    <Vertex> 2 { 1 0 1 <UV> { 1 1 } }
+    <Vertex> 3 { 0 0 1 <UV> { 0 1 } <RGBA> { 1 1 1 0.5 } }
+  }
+  <Polygon> { <TRef> { glass } <VertexRef> { 0 1 2 <Ref> { window.verts } } }
+  <Polygon> { <TRef> { faded } <VertexRef> { 0 1 3 <Ref> { window.verts } } }
+}
+"""
+
+
+def make_alpha_image(alpha):
+    alpha = np.asarray(alpha, dtype = np.uint8)
+    rgb = np.full(alpha.shape + (3,), 128, dtype = np.uint8)
+    return Image.fromarray(np.dstack([rgb, alpha]))
+
+
+def test_classify_alpha():
+    assert EggAlphaAnalyzer.classify_alpha(np.full((4, 4), 254, np.uint8)) is AlphaCoverage.Opaque
+    assert EggAlphaAnalyzer.classify_alpha(np.array([[0, 255], [1, 255]], np.uint8)) is AlphaCoverage.Binary
+    assert EggAlphaAnalyzer.classify_alpha(np.array([[0, 128], [255, 255]], np.uint8)) is AlphaCoverage.Blended
+    assert EggAlphaAnalyzer.classify_alpha(
+        np.array([[0, 128], [255, 255]], np.uint8), max_blend_ratio = 0.25
+    ) is AlphaCoverage.Binary
+
+
+def test_apply_alpha_modes(tmp_path, monkeypatch):
+    """
+    Opaque and binary textures get alpha modes that don't need sorting, unless their polygons blend anyway.
+    """
+    monkeypatch.chdir(tmp_path)
+    make_alpha_image(np.full((8, 8), 255)).save(tmp_path / "solid.png")
+    make_alpha_image(np.tile([0, 255], (8, 4))).save(tmp_path / "cutout.png")
+    make_alpha_image(np.tile([0, 100, 255, 255], (8, 2))).save(tmp_path / "glass.png")
+    with open(tmp_path / "props.egg", "w") as egg_file:
+        egg_file.write(alpha_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "props.egg"))
+
+    analyzer = EggAlphaAnalyzer([egg_filename], eggman = EggMan([egg_filename]))
+    egg_data = next(iter(analyzer.eggman.egg_datas))
+    recommendations = {
+        recommendation.egg_texture.getName(): (recommendation.coverage, recommendation.alpha_name)
+        for recommendation in analyzer.recommend(egg_data)
+    }
+    assert recommendations == {
+        "solid": (AlphaCoverage.Opaque, "off"),
+        "cutout": (AlphaCoverage.Binary, "binary"),
+        "glass": (AlphaCoverage.Blended, None),
+        # Its polygon has a translucent vertex color
+        "faded": (AlphaCoverage.Binary, None),
+    }
+
+    analyzer.apply(egg_data)
+    polygon_modes = dict()
+    for group_name in ("props", "window"):
+        for child in egg_data.findChild(group_name).getChildren():
+            if isinstance(child, EggPolygon):
+                alpha_mode = child.determineAlphaMode()
+                polygon_modes[child.getTexture().getName()] = alpha_mode.getAlphaMode() if alpha_mode else None
+    assert polygon_modes == {
+        "solid": EggRenderMode.AM_off,
+        "cutout": EggRenderMode.AM_binary,
+        "glass": None,
+        "faded": None,
+    }
+    assert not egg_data.findChild("props").getBin()
@@ -0,0 +1,133 @@
+from panda3d.core import DecalEffect, Filename, NodePath
+from panda3d.egg import EggData, EggGroup, EggPolygon, EggVertexPool, loadEggData
+
+from eggtools.EggMan import EggMan
+from eggtools.EggManConfig import NodeNameConfig
+
+exported_egg = """<CoordinateSystem> { Z-Up }
+<Group> house {
+  <Group> group1 {
+    <Group> group2 {
+      <VertexPool> walls {
+        <Vertex> 0 { 0 0 0 }
+        <Vertex> 1 { 1 0 0 }
+        <Vertex> 2 { 1 0 1 }
+        <Vertex> 3 { 0 0 1 }
+      }
+      <Polygon> { <VertexRef> { 0 1 2 <Ref> { walls } } }
+    }
+    <Polygon> { <VertexRef> { 0 2 3 <Ref> { walls } } }
+  }
+  <Group> door_origin {
+    <Transform> { <Translate> { 0.5 0 0 } }
+  }
+  <Group> sign {
+    <Tag> sign { front }
+    <Group> sign_geom {
+      <Polygon> { <VertexRef> { 1 2 3 <Ref> { walls } } }
+    }
+  }
+  <Group> anim {
+    <Switch> { 1 }
+    <Scalar> fps { 2 }
+    <Group> frame1 {
+      <Polygon> { <VertexRef> { 0 1 2 <Ref> { walls } } }
+    }
+    <Group> frame2 {
+      <Polygon> { <VertexRef> { 0 1 3 <Ref> { walls } } }
+    }
+  }
+  <Group> barrier {
+    <Collide> { Polyset descend }
+    <Group> barrier_geom {
+      <Polygon> { <VertexRef> { 0 1 2 <Ref> { walls } } }
+    }
+  }
+  <Group> empty_locator { }
+}
+"""
+
+
+def test_collapse_groups(tmp_path):
+    with open(tmp_path / "house.egg", "w") as egg_file:
+        egg_file.write(exported_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "house.egg"))
+    eggman = EggMan([egg_filename])
+    egg_data = next(iter(eggman.egg_datas))
+    # The loader bins the polygons of the egg it's given, so it gets a copy
+    original_egg = EggData()
+    original_egg.read(egg_filename)
+    node_count = NodePath(loadEggData(original_egg)).findAllMatches("**").getNumPaths()
+
+    keep_config = NodeNameConfig({"house", "*_locator"})
+    assert eggman.collapse_groups(keep_config = keep_config) == {
+        egg_filename.getFullpath(): 4
+    }
+    house = egg_data.getFirstChild()
+    children = list(house.getChildren())
+    # group1 and group2 are gone, with their contents put in their place
+    assert isinstance(children[0], EggVertexPool) and isinstance(children[1], EggPolygon)
+    assert isinstance(children[2], EggPolygon)
+    assert [child.getName() for child in children[3:]] == ["door_origin", "sign", "anim", "barrier", "empty_locator"]
+    assert isinstance(house.findChild("sign").getFirstChild(), EggPolygon)
+    assert [child.getName() for child in house.findChild("anim").getChildren()] == ["frame1", "frame2"]
+    assert isinstance(house.findChild("barrier").getFirstChild(), EggPolygon)
+    assert {egg_group.getName() for egg_group in eggman.egg_datas[egg_data].egg_groups} == {
+        "house", "door_origin", "sign", "anim", "frame1", "frame2", "barrier", "empty_locator"
+    }
+
+    # Nothing left to do
+    assert eggman.collapse_groups(keep_config = keep_config) == {egg_filename.getFullpath(): 0}
+
+    model = NodePath(loadEggData(egg_data))
+    # barrier_geom was already folded into the CollisionNode by the loader, the other three are gone now
+    assert model.findAllMatches("**").getNumPaths() == node_count - 3
+    assert model.find("**/sign").getTag("sign") == "front"
+    assert model.find("**/anim").node().getNumChildren() == 2
+
+
+def test_bare_group():
+    egg_group = EggGroup("bare")
+    assert EggMan.is_bare_group(egg_group)
+    egg_group.setTag("key", "value")
+    assert not EggMan.is_bare_group(egg_group)
+    egg_group = EggGroup("masked")
+    egg_group.setCollideMask(0x02)
+    assert not EggMan.is_bare_group(egg_group)
+    egg_group = EggGroup("typed")
+    egg_group.addObjectType("barrier")
+    assert not EggMan.is_bare_group(egg_group)
+
+
+decal_egg = """<CoordinateSystem> { Z-Up }
+<VertexPool> wall_vertices {
+  <Vertex> 0 { 0 0 0 }
+  <Vertex> 1 { 4 0 0 }
+  <Vertex> 2 { 4 0 3 }
+  <Vertex> 3 { 0 0 3 }
+  <Vertex> 4 { 1 0 1 }
+  <Vertex> 5 { 2 0 1 }
+  <Vertex> 6 { 2 0 2 }
+}
+<Group> wall {
+  <Scalar> decal { 1 }
+  <Polygon> { <VertexRef> { 0 1 2 3 <Ref> { wall_vertices } } }
+  <Group> window {
+    <Polygon> { <VertexRef> { 4 5 6 <Ref> { wall_vertices } } }
+  }
+}
+"""
+
+
+def test_collapse_keeps_decals(tmp_path):
+    with open(tmp_path / "wall.egg", "w") as egg_file:
+        egg_file.write(decal_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "wall.egg"))
+    eggman = EggMan([egg_filename])
+    egg_data = next(iter(eggman.egg_datas))
+
+    assert eggman.collapse_groups(keep_config = NodeNameConfig({"wall"})) == {egg_filename.getFullpath(): 0}
+    assert isinstance(egg_data.findChild("wall").findChild("window"), EggGroup)
+    # The window still loads as a decal on top of the wall
+    model = NodePath(loadEggData(egg_data))
+    assert model.find("**/window").getParent().node().hasEffect(DecalEffect.getClassType())
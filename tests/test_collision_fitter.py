@@ -0,0 +1,134 @@
+import math
+
+import numpy as np
+from panda3d.core import CollisionBox, CollisionCapsule, CollisionSphere, Filename, NodePath
+from panda3d.egg import EggData, EggGroup, loadEggData
+
+from eggtools.EggMan import EggMan
+from eggtools.components.points import BoundingVolumes
+from eggtools.utils.EggCollisionFitter import BoundingPrimitive, EggCollisionFitter
+
+
+def get_rotation(yaw: float, pitch: float) -> np.ndarray:
+    yaw, pitch = math.radians(yaw), math.radians(pitch)
+    turn = np.array([[math.cos(yaw), -math.sin(yaw), 0], [math.sin(yaw), math.cos(yaw), 0], [0, 0, 1]])
+    tilt = np.array([[1, 0, 0], [0, math.cos(pitch), -math.sin(pitch)], [0, math.sin(pitch), math.cos(pitch)]])
+    return turn @ tilt
+
+
+def make_cylinder(radius: float, length: float, segments: int = 16) -> np.ndarray:
+    angles = np.linspace(0, 2 * np.pi, segments, endpoint = False)
+    ring = np.stack([np.zeros(segments), np.cos(angles) * radius, np.sin(angles) * radius], axis = 1)
+    return np.vstack([ring - (length / 2, 0, 0), ring + (length / 2, 0, 0)])
+
+
+def load_collision(fit) -> NodePath:
+    collision_group = EggCollisionFitter.make_collision_group("fit", fit)
+    egg_data = EggData()
+    egg_data.addChild(collision_group)
+    fit.collide_attribute.apply(egg_data, None, node_entries = ["fit"])
+    return NodePath(loadEggData(egg_data)).find("**/+CollisionNode")
+
+
+def test_bounding_volumes():
+    rng = np.random.default_rng(7)
+    points = rng.normal(size = (200, 3)) * (4, 1, 0.5) @ get_rotation(30, 45).T + (10, -2, 3)
+
+    center, radius = BoundingVolumes.fit_min_sphere(points)
+    distances = np.linalg.norm(points - center, axis = 1)
+    assert distances.max() <= radius + 1e-9
+    # Within a few percent of touching points on opposite sides
+    assert radius < BoundingVolumes.fit_sphere(points)[1]
+    assert radius <= np.linalg.norm(points[:, None] - points[None], axis = 2).max() / 2 * 1.05
+
+    center, axes, half_extents = BoundingVolumes.fit_obb(points)
+    assert np.allclose(axes @ axes.T, np.identity(3)) and math.isclose(np.linalg.det(axes), 1)
+    assert np.all(np.abs((points - center) @ axes.T) <= half_extents + 1e-9)
+    assert np.prod(half_extents) < np.prod(np.ptp(points, axis = 0) / 2)
+
+    start, end, radius = BoundingVolumes.fit_capsule(points)
+    segment = end - start
+    along = np.clip((points - start) @ segment / (segment @ segment), 0, 1)
+    assert np.all(np.linalg.norm(points - (start + np.outer(along, segment)), axis = 1) <= radius + 1e-9)
+
+
+def test_fit_primitives():
+    fitter = EggCollisionFitter([], eggman = EggMan([]))
+    rotation = get_rotation(35, 20)
+    cube = np.array([(x, y, z) for x in (-1, 1) for y in (-1.5, 1.5) for z in (-0.5, 0.5)], dtype = float)
+
+    fits = fitter.fit_points(cube)
+    # Axis aligned boxes come out as the AABB, since it comes before the equally tight OBB
+    assert fits[0].primitive == BoundingPrimitive.AABB and math.isclose(fits[0].fill, 1)
+    assert fits[1].primitive == BoundingPrimitive.OBB and math.isclose(fits[1].fill, 1)
+    fits = fitter.fit_points(cube @ rotation.T)
+    assert fits[0].primitive == BoundingPrimitive.OBB and math.isclose(fits[0].fill, 1)
+    assert fits[0].solid == "box" and fits[-1].fill < 0.6
+
+    cylinder = make_cylinder(0.5, 6, segments = 32) @ rotation.T + (1, 2, 3)
+    fit = fitter.fit_points(cylinder)[0]
+    assert fit.primitive == BoundingPrimitive.Capsule and fit.solid == "tube"
+    assert np.allclose(fit.center, (1, 2, 3))
+    assert math.isclose(fit.half_extents[0], 3.5, rel_tol = 1e-6) and math.isclose(fit.half_extents[1], 0.5)
+
+
+def test_fit_all(tmp_path):
+    rotation = get_rotation(-60, 10)
+    corners = np.array([(x, y, z) for x in (-2, 2) for y in (-1, 1) for z in (-0.25, 0.25)]) @ rotation.T + (3, 3, 1)
+    faces = [(0, 2, 3, 1), (4, 5, 7, 6), (0, 1, 5, 4), (2, 6, 7, 3), (0, 4, 6, 2), (1, 3, 7, 5)]
+    cylinder = make_cylinder(0.4, 3) + (0, 5, 0)
+    egg_lines = ["<CoordinateSystem> { Z-Up }", "<VertexPool> vertices {"]
+    egg_lines += [
+        f"  <Vertex> {index} {{ {x} {y} {z} }}" for index, (x, y, z) in enumerate(np.vstack([corners, cylinder]))
+    ]
+    egg_lines += [
+        "}",
+        "<Group> crate {",
+        "  <Collide> crate { Sphere descend intangible }",
+        *[f"  <Polygon> {{ <VertexRef> {{ {' '.join(map(str, face))} <Ref> {{ vertices }} }} }}" for face in faces],
+        "}",
+        "<Group> pipe {",
+        "  <Group> pipe_geom {",
+        *[
+            f"    <Polygon> {{ <VertexRef> {{ {8 + index} {8 + (index + 1) % 16} {24 + (index + 1) % 16} {24 + index} "
+            f"<Ref> {{ vertices }} }} }}"
+            for index in range(16)
+        ],
+        "  }",
+        "}",
+    ]
+    with open(tmp_path / "props.egg", "w") as egg_file:
+        egg_file.write("\n".join(egg_lines))
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "props.egg"))
+    fitter = EggCollisionFitter([egg_filename], eggman = EggMan([egg_filename]))
+
+    # By default only groups with a sphere, tube or box solid get fitted
+    fits = fitter.fit_all()[egg_filename.getFullpath()]
+    assert [fit.group_name for fit in fits] == ["crate"]
+    crate = fits[0]
+    assert crate.primitive == BoundingPrimitive.OBB and math.isclose(crate.fill, 1)
+    assert crate.collide_attribute.contents == "box descend intangible"
+    assert crate.collide_attribute.name == "crate"
+
+    fits = fitter.fit_all(["pipe*"])[egg_filename.getFullpath()]
+    assert [(fit.group_name, fit.solid) for fit in fits] == [("pipe", "tube"), ("pipe_geom", "tube")]
+    assert fits[0].vertex_count == 32
+    assert fits[0].collide_attribute.contents == "tube descend"
+
+    # Panda3D turns the stand-in geometry back into the same solids
+    box_path = load_collision(crate)
+    box = box_path.node().getSolid(0)
+    assert isinstance(box, CollisionBox)
+    assert np.allclose(tuple(box.getMax()), (2, 1, 0.25), atol = 1e-4)
+    assert np.allclose(tuple(box_path.getPos()), (3, 3, 1), atol = 1e-4)
+    capsule = load_collision(fits[0]).node().getSolid(0)
+    assert isinstance(capsule, CollisionCapsule)
+    assert math.isclose(capsule.getRadius(), 0.4, rel_tol = 1e-4)
+    assert np.allclose(sorted([tuple(capsule.getPointA()), tuple(capsule.getPointB())]),
+                       [(-1.5, 5, 0), (1.5, 5, 0)], atol = 1e-4)
+
+    sphere_fit = EggCollisionFitter([], eggman = fitter.eggman, primitives = ("sphere",)).fit_points(corners)[0]
+    sphere_fit.collide_attribute = EggCollisionFitter.get_collide_attribute(EggGroup("ball"), "sphere")
+    sphere = load_collision(sphere_fit).node().getSolid(0)
+    assert isinstance(sphere, CollisionSphere)
+    assert math.isclose(sphere.getRadius(), math.sqrt(4 + 1 + 0.0625), rel_tol = 1e-3)
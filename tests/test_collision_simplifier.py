@@ -0,0 +1,104 @@
+import math
+
+import numpy as np
+from panda3d.core import CollisionPolygon, CollisionSphere, Filename, NodePath
+from panda3d.egg import EggGroup, EggPolygon, loadEggData
+
+from eggtools.EggMan import EggMan
+from eggtools.components.points import BoundingVolumes
+from eggtools.utils.EggCollisionSimplifier import EggCollisionSimplifier
+
+
+def make_ball(rings: int = 8, segments: int = 12) -> str:
+    """
+    UV sphere of radius 2 around (5, 0, 1)
+    """
+    vertices = ["  <Vertex> 0 { 5 0 3 }", "  <Vertex> 1 { 5 0 -1 }"]
+    for ring in range(1, rings):
+        theta = math.pi * ring / rings
+        for segment in range(segments):
+            phi = 2 * math.pi * segment / segments
+            x, y, z = math.sin(theta) * math.cos(phi), math.sin(theta) * math.sin(phi), math.cos(theta)
+            vertices.append(f"  <Vertex> {len(vertices)} {{ {5 + 2 * x} {2 * y} {1 + 2 * z} }}")
+
+    def ring_vertex(ring, segment):
+        return 2 + (ring - 1) * segments + segment % segments
+
+    polygons = []
+    for segment in range(segments):
+        polygons.append((0, ring_vertex(1, segment), ring_vertex(1, segment + 1)))
+        polygons.append((1, ring_vertex(rings - 1, segment + 1), ring_vertex(rings - 1, segment)))
+        for ring in range(1, rings - 1):
+            polygons.append((
+                ring_vertex(ring, segment), ring_vertex(ring + 1, segment),
+                ring_vertex(ring + 1, segment + 1), ring_vertex(ring, segment + 1),
+            ))
+    return "\n".join(
+        ["<VertexPool> ball_vertices {", *vertices, "}", "<Group> ball {", "  <Collide> ball { Polyset descend event }"] +
+        [f"  <Polygon> {{ <VertexRef> {{ {' '.join(map(str, polygon))} <Ref> {{ ball_vertices }} }} }}" for polygon in polygons] +
+        ["}"]
+    )
+
+
+def make_floor(size: int = 8) -> str:
+    vertices = [
+        f"  <Vertex> {y * (size + 1) + x} {{ {x} {y} 0 <UV> {{ 0 0 }} }}"
+        for y in range(size + 1) for x in range(size + 1)
+    ]
+    polygons = []
+    for y in range(size):
+        for x in range(size):
+            corner = y * (size + 1) + x
+            polygons.append(
+                f"  <Polygon> {{ <TRef> {{ tiles }} <VertexRef> {{ "
+                f"{corner} {corner + 1} {corner + size + 2} {corner + size + 1} <Ref> {{ floor_vertices }} }} }}"
+            )
+    return "\n".join(
+        ["<Texture> tiles { \"maps/tiles.png\" }", "<VertexPool> floor_vertices {", *vertices, "}", "<Group> floor {",
+         "  <Collide> { Polyset keep descend level }"] + polygons + ["}"]
+    )
+
+
+def test_convex_hull():
+    cube = np.array([(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)] + [(0.5, 0.5, 0.5)], dtype = float)
+    faces = BoundingVolumes.convex_hull(cube)
+    assert len(faces) == 12
+    assert 8 not in {index for face in faces for index in face}
+    assert math.isclose(BoundingVolumes.get_hull_volume(cube, faces), 1.0)
+    # Flat points don't make a hull
+    assert BoundingVolumes.convex_hull(cube[:4] * [1, 1, 0]) == []
+
+
+def test_simplify_collisions(tmp_path):
+    with open(tmp_path / "yard.egg", "w") as egg_file:
+        egg_file.write("<CoordinateSystem> { Z-Up }\n" + make_floor() + "\n" + make_ball())
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "yard.egg"))
+    simplifier = EggCollisionSimplifier([egg_filename], eggman = EggMan([egg_filename]))
+
+    dry_run = simplifier.simplify_all(dry_run = True)[egg_filename.getFullpath()]
+    results = {result.group_name: result for result in simplifier.simplify_all()[egg_filename.getFullpath()]}
+    assert [result.solid for result in dry_run] == ["polyset", "sphere"]
+    assert results["ball"].solid == "sphere" and results["ball"].fit_error < 0.2
+    assert results["floor"].solid == "polyset" and results["floor"].fit_error is None
+    # 128 triangles decimated with the default ratio of 0.25 come out at around 32
+    assert results["floor"].collision_polygons <= 40
+
+    egg_data = next(iter(simplifier.eggman.egg_datas))
+    floor = egg_data.findChild("floor")
+    # The floor stays visible, without the collision on it
+    assert floor.getCsType() == EggGroup.CST_none
+    assert len([child for child in floor.getChildren() if isinstance(child, EggPolygon)]) == 64
+    assert floor.findChild("floor_collision").getCsType() == EggGroup.CST_polyset
+    ball = egg_data.findChild("ball")
+    assert not [child for child in ball.getChildren() if isinstance(child, EggPolygon)]
+    assert ball.findChild("ball_collision").getCollisionName() == "ball"
+
+    model = NodePath(loadEggData(egg_data))
+    sphere = model.find("**/ball_collision").node().getSolid(0)
+    assert isinstance(sphere, CollisionSphere)
+    assert np.allclose(tuple(sphere.getCenter()), (5, 0, 1), atol = 1e-4)
+    assert math.isclose(sphere.getRadius(), 2, rel_tol = 1e-4)
+    floor_solids = model.find("**/floor_collision").node()
+    assert all(isinstance(floor_solids.getSolid(index), CollisionPolygon) for index in range(floor_solids.getNumSolids()))
+    assert not model.find("**/floor").find("+GeomNode").isEmpty()
+
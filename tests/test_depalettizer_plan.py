@@ -0,0 +1,83 @@
+import os
+import shutil
+
+from PIL import Image
+from panda3d.core import Filename
+
+from eggtools.utils.EggDepalettizer import DepalettizeManifest
+
+
+def test_depalettize_dry_run(test_egg, make_depalettizer):
+    """
+    A dry run should plan out every crop without writing any images or touching the egg.
+    """
+    depal = make_depalettizer()
+    egg_data = depal.eggman.get_egg_by_filename(test_egg)
+    plan = depal.depalettize_all(dry_run = True)
+
+    assert plan.egg_datas == [egg_data]
+    assert len(plan.jobs) == 9
+    assert not plan.unpalettized_jobs
+
+    palette_jobs = plan.by_palette()
+    assert len(palette_jobs) == 1
+    for job in plan.jobs:
+        assert job.palettized and not job.completed
+
+    # Nothing has been swapped out yet
+    assert depal.eggman.egg_datas.get(egg_data)
+    assert not depal.raw_data
+
+    image = depal.depalettize_image(plan.jobs[0].point_data, plan.jobs[0].output_filename, {}, write_to_disk = False)
+    assert isinstance(image, Image.Image) and image.mode == "RGBA"
+
+
+def test_incremental_depalettize(tmp_path, monkeypatch, base_dir, test_egg, make_depalettizer):
+    """
+    Rerunning the depalettizer should reuse crops whose inputs did not change.
+    """
+    # Texture paths are read relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(tmp_path / "maps")
+    shutil.copy(os.path.join(base_dir, "maps", "test_grid_1.png"), tmp_path / "maps")
+    shutil.copy(test_egg.toOsSpecific(), tmp_path)
+    tmp_egg = Filename.fromOsSpecific(str(tmp_path / "test_grid_1.egg"))
+
+    def run_depalettizer(**kwargs):
+        depal = make_depalettizer(tmp_egg, str(tmp_path / "maps"), incremental = True, **kwargs)
+        plan = depal.depalettize_all()
+        assert all(job.completed for job in plan.jobs)
+        return {
+            job.output_filename.getBasename(): os.stat(job.output_filename.toOsSpecific()).st_mtime_ns
+            for job in plan.jobs
+        }
+
+    first_run = run_depalettizer()
+    assert os.path.isfile(tmp_path / DepalettizeManifest.MANIFEST_NAME)
+    assert run_depalettizer() == first_run
+
+    # Changing the padding invalidates every crop
+    third_run = run_depalettizer(padding_u = 0.01)
+    assert all(third_run[name] != first_run[name] for name in first_run)
+
+
+def test_pipelined_depalettize(tmp_path, monkeypatch, base_dir, test_egg, make_depalettizer):
+    """
+    Every stage of the image pipeline should drain, even with more threads than palettes and tiny queues.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(tmp_path / "maps")
+    shutil.copy(os.path.join(base_dir, "maps", "test_grid_1.png"), tmp_path / "maps")
+    shutil.copy(test_egg.toOsSpecific(), tmp_path)
+    tmp_egg = Filename.fromOsSpecific(str(tmp_path / "test_grid_1.egg"))
+
+    depal = make_depalettizer(
+        tmp_egg, str(tmp_path / "maps"), pipeline_threads = 4, pipeline_queue_size = 1
+    )
+    plan = depal.depalettize_all()
+    assert len(plan.jobs) == 9
+    # Only incremental runs keep a manifest
+    assert not os.path.isfile(tmp_path / DepalettizeManifest.MANIFEST_NAME)
+    for job in plan.jobs:
+        assert job.completed
+        assert os.path.isfile(job.output_filename.toOsSpecific())
@@ -0,0 +1,67 @@
+import numpy as np
+from PIL import Image
+
+from eggtools.components.images.ImageFill import ClampFill, FillMode, InpaintFill, RepeatFill
+from eggtools.components.images.ImageMarginer import ImageMarginer
+
+
+def make_test_image(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(1, 256, (height, width, 3), dtype = np.uint8))
+
+
+def test_clamp_fill():
+    """
+    Clamped margins should match an edge pad of the source image.
+    """
+    source_image = make_test_image(37, 21)
+    expanded_image = ImageMarginer.expand_image(source_image, 10, 7)
+    filled_image = np.asarray(ClampFill().fill_image(expanded_image))
+
+    source_rgba = np.asarray(source_image.convert("RGBA"))
+    expected = np.pad(source_rgba, ((3, 4), (5, 5), (0, 0)), mode = "edge")
+    assert filled_image.shape == expected.shape
+    assert np.array_equal(filled_image, expected)
+
+
+def test_repeat_fill():
+    """
+    Repeated margins should tile the source image outwards from the center of the canvas.
+    """
+    source_image = make_test_image(5, 9)
+    expanded_image = ImageMarginer.expand_image(source_image, 12, 4)
+    filled_image = np.asarray(RepeatFill().fill_image(expanded_image))
+
+    source_rgba = np.asarray(source_image.convert("RGBA"))
+    expected = np.tile(source_rgba, (3, 5, 1))[7:20, 4:21]
+    assert np.array_equal(filled_image, expected)
+
+
+def test_inpaint_fill():
+    """
+    Every inpaint mode should leave the source image untouched and fill in the margins.
+    """
+    source_image = Image.new("RGB", (32, 24), (200, 40, 90))
+    expanded_image = ImageMarginer.expand_image(source_image, 8, 8)
+    for fill_type in (
+        InpaintFill(radius = 2, region_limited = False),
+        InpaintFill(radius = 2),
+        InpaintFill(radius = 2, scale = 0.5),
+    ):
+        filled_image = np.asarray(fill_type.fill_image(expanded_image))
+        assert filled_image.shape == (32, 40, 3)
+        assert np.array_equal(filled_image[4:28, 4:36], np.asarray(source_image))
+        assert np.abs(filled_image.astype(int) - (200, 40, 90)).max() <= 8
+
+
+def test_margined_array():
+    """
+    The array pipeline should give the same results as going through PIL images.
+    """
+    source_image = make_test_image(20, 14)
+    source_array = np.asarray(source_image.convert("RGBA"))
+    marginer = ImageMarginer()
+    for fill_mode in (FillMode.Solid, FillMode.Clamp, FillMode.Repeat, FillMode.Unknown):
+        margined_image = marginer.create_margined_image(source_image, fill_mode, 6, 4)
+        margined_array = marginer.create_margined_array(source_array, fill_mode, 6, 4)
+        assert np.array_equal(np.asarray(margined_image), margined_array)
@@ -0,0 +1,85 @@
+import json
+import os
+
+from PIL import Image
+from panda3d.core import Filename
+
+from eggtools.EggMan import EggMan
+from eggtools.utils.GeometryReport import GeometryReport
+
+crate_egg = """<CoordinateSystem> { Z-Up }
+
+<Texture> wood {
+  "maps/wood.png"
+}
+<Texture> metal {
+  "maps/metal.jpg"
+  <Scalar> alpha-file { "maps/metal_a.png" }
+}
+<VertexPool> lid {
+  <Vertex> 0 { 0 0 1 <UV> { 0 0 } }
+  <Vertex> 1 { 1 0 1 <UV> { 1 0 } }
+  <Vertex> 2 { 1 1 1 <UV> { 1 1 } }
+}
+<VertexPool> body {
+  <Vertex> 0 { 0 0 0 <UV> { 0 0 } }
+  <Vertex> 1 { 1 0 0 <UV> { 1 0 } }
+  <Vertex> 2 { 1 1 0 <UV> { 1 1 } }
+  <Vertex> 3 { 0 1 0 <UV> { 0 1 } }
+}
+<Group> crate {
+  <Group> lid {
+    <Group> hinge {
+      <Polygon> { <TRef> { metal } <VertexRef> { 0 1 2 <Ref> { lid } } }
+    }
+  }
+  <Group> body {
+    <Polygon> { <TRef> { wood } <VertexRef> { 0 1 2 <Ref> { body } } }
+    <Polygon> { <TRef> { wood } <VertexRef> { 0 2 3 <Ref> { body } } }
+  }
+}
+"""
+
+
+def test_geometry_report(tmp_path, monkeypatch, test_egg):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(tmp_path / "maps")
+    Image.new("RGBA", (32, 32)).save(tmp_path / "maps" / "wood.png")
+    Image.new("RGB", (16, 8)).save(tmp_path / "maps" / "metal.jpg")
+    Image.new("L", (16, 8)).save(tmp_path / "maps" / "metal_a.png")
+    with open(tmp_path / "crate.egg", "w") as egg_file:
+        egg_file.write(crate_egg)
+    crate_filename = Filename.fromOsSpecific(str(tmp_path / "crate.egg"))
+
+    # Registered eggs are reported on in place
+    eggman = EggMan([crate_filename])
+    ctx = next(iter(eggman.egg_datas.values()))
+    assert len(ctx.egg_vertex_pools) == 2
+    assert sorted(ctx.egg_group_depths.values()) == [1, 2, 2, 3]
+    in_process = GeometryReport([], eggman = eggman).generate()
+
+    report = GeometryReport([crate_filename, test_egg], max_workers = 2).generate(sort_by = "texture_bytes")
+    assert report["eggs"] == in_process["eggs"][:1] + report["eggs"][1:]
+    crate_info = report["eggs"][0]
+    assert crate_info["filename"].endswith("crate.egg")
+    assert (crate_info["polygons"], crate_info["vertices"], crate_info["vertex_pools"]) == (3, 7, 2)
+    assert crate_info["textures"] == 2
+    assert crate_info["texture_bytes"] == 32 * 32 * 4 + 16 * 8 * 4
+    assert crate_info["depth"] == 3
+
+    groups = {group_info["group"]: group_info for group_info in crate_info["groups"]}
+    assert groups["/crate"]["polygons"] == 3 and groups["/crate"]["vertex_pools"] == 2
+    assert groups["/crate/lid"] == dict(groups["/crate/lid/hinge"], group = "/crate/lid", depth = 2)
+    assert groups["/crate/body"]["texture_bytes"] == 32 * 32 * 4
+
+    assert report["totals"]["eggs"] == 2
+    assert report["totals"]["polygons"] == crate_info["polygons"] + report["eggs"][1]["polygons"]
+    assert report["groups"][0]["group"] == "/crate"
+
+    report_filename = str(tmp_path / "geometry_report.json")
+    GeometryReport([]).write_json(report_filename, report)
+    with open(report_filename) as report_file:
+        assert json.load(report_file) == report
+    assert GeometryReport([]).get_over_budget({"polygons": 8, "depth": 2}, report) == {
+        crate_info["filename"]: ["depth"], report["eggs"][1]["filename"]: ["polygons"],
+    }
@@ -0,0 +1,34 @@
+import numpy as np
+
+from eggtools.components.images import ImageUtils
+
+
+def make_test_array(width, height):
+    return np.arange(width * height, dtype = np.uint32).reshape(height, width)
+
+
+def test_crop_array():
+    """
+    Crops should match PIL's, including transparent padding outside of the image.
+    """
+    image_array = make_test_array(4, 3)
+    assert np.array_equal(ImageUtils.crop_array(image_array, (1, 1, 3, 3)), image_array[1:3, 1:3])
+    assert ImageUtils.crop_array(image_array, (3, 0, 1, 2)) is None
+
+    cropped = ImageUtils.crop_array(image_array, (2, -1, 6, 2))
+    assert cropped.shape == (3, 4)
+    assert np.array_equal(cropped[1:, :2], image_array[:2, 2:])
+    assert not cropped[0].any() and not cropped[:, 2:].any()
+
+
+def test_tile_array_to_box():
+    """
+    UV bounding boxes outside of [0, 1] should wrap around onto the neighbouring tiles.
+    """
+    image_array = make_test_array(4, 2)
+    assert np.array_equal(ImageUtils.tile_array_to_box(image_array, [(0, 0), (1, 1)]), image_array)
+
+    tiled = ImageUtils.tile_array_to_box(image_array, [(-0.5, -1), (1.5, 1)])
+    assert tiled.shape == (4, 8)
+    expected = np.tile(image_array, (2, 3))[:, 2:10]
+    assert np.array_equal(tiled, expected)
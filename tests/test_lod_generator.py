@@ -0,0 +1,147 @@
+import pytest
+from panda3d.core import Filename, LODNode, NodePath
+from panda3d.egg import EggGroup, EggPolygon, loadEggData
+
+from eggtools.EggMan import EggMan
+from eggtools.components.points import QuadricDecimation
+from eggtools.utils.EggLODGenerator import EggLODGenerator, LODLevel
+
+
+def make_grid_egg(size: int) -> str:
+    vertices = []
+    for y in range(size + 1):
+        for x in range(size + 1):
+            vertices.append(f"  <Vertex> {y * (size + 1) + x} {{ {x} {y} 0 <UV> {{ {x / size} {y / size} }} }}")
+    polygons = []
+    for y in range(size):
+        for x in range(size):
+            corner = y * (size + 1) + x
+            corners = f"{corner} {corner + 1} {corner + size + 2} {corner + size + 1}"
+            polygons.append(f"    <Polygon> {{ <TRef> {{ tiles }} <VertexRef> {{ {corners} <Ref> {{ grid }} }} }}")
+    return "\n".join([
+        "<CoordinateSystem> { Z-Up }",
+        "<Texture> tiles { \"maps/tiles.png\" }",
+        "<VertexPool> grid {", *vertices, "}",
+        "<Group> prop {",
+        "  <Group> walls {", *polygons, "  }",
+        "  <Group> barrier {",
+        "    <Collide> { Polyset descend }",
+        "    <Polygon> { <VertexRef> { 0 1 2 <Ref> { grid } } }",
+        "  }",
+        "}",
+    ])
+
+
+def make_unwelded_grid_egg(size: int) -> str:
+    """
+    The same grid as make_grid_egg, but with every quad using its own copies of the vertices.
+    """
+    vertices = []
+    polygons = []
+    for y in range(size):
+        for x in range(size):
+            corners = []
+            for corner_x, corner_y in ((x, y), (x + 1, y), (x + 1, y + 1), (x, y + 1)):
+                corners.append(str(len(vertices)))
+                vertices.append(
+                    f"  <Vertex> {len(vertices)} {{ {corner_x} {corner_y} 0 "
+                    f"<UV> {{ {corner_x / size} {corner_y / size} }} <Normal> {{ 0 0 1 }} }}"
+                )
+            corners = " ".join(corners)
+            polygons.append(f"  <Polygon> {{ <TRef> {{ tiles }} <VertexRef> {{ {corners} <Ref> {{ grid }} }} }}")
+    return "\n".join([
+        "<CoordinateSystem> { Z-Up }",
+        "<Texture> tiles { \"maps/tiles.png\" }",
+        "<VertexPool> grid {", *vertices, "}",
+        "<Group> prop {", *polygons, "}",
+    ])
+
+
+def test_decimate_plane():
+    positions = [(x, y, 0) for y in range(5) for x in range(5)]
+    triangles = []
+    for y in range(4):
+        for x in range(4):
+            corner = y * 5 + x
+            triangles += [(corner, corner + 1, corner + 6), (corner, corner + 6, corner + 5)]
+    boundary = QuadricDecimation.get_boundary_vertices(triangles)
+    assert len(boundary) == 16
+    decimated = QuadricDecimation.decimate(positions, triangles, 0, locked = boundary)
+    # Only the outline is left, which takes 14 triangles to fill
+    assert len(decimated) == 14
+    assert {vertex for _, triangle in decimated for vertex in triangle} == boundary
+
+
+def test_generate_lods(tmp_path):
+    with open(tmp_path / "prop.egg", "w") as egg_file:
+        egg_file.write(make_grid_egg(10))
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "prop.egg"))
+    levels = [LODLevel(1.0, 50), LODLevel(0.5, 100), LODLevel(0.2, 1000)]
+    generator = EggLODGenerator([egg_filename], eggman = EggMan([egg_filename]), levels = levels)
+    report = generator.generate_lods(["prop"])
+    assert report == {egg_filename.getFullpath(): {"prop": [200, 100, 40]}}
+
+    egg_data = next(iter(generator.eggman.egg_datas))
+    prop = egg_data.findChild("prop")
+    assert [child.getName() for child in prop.getChildren()] == ["barrier", "prop_lod"]
+    lod_groups = list(prop.findChild("prop_lod").getChildren())
+    assert [lod_group.getName() for lod_group in lod_groups] == ["prop_lod0", "prop_lod1", "prop_lod2"]
+    assert all(lod_group.hasLod() for lod_group in lod_groups)
+    assert lod_groups[0].findChild("walls")
+    lod_polygons = [child for child in lod_groups[2].getChildren() if isinstance(child, EggPolygon)]
+    assert all(egg_polygon.getTexture().getName() == "tiles" for egg_polygon in lod_polygons)
+
+    # The new groups are registered with EggMan
+    ctx = generator.eggman.egg_datas[egg_data]
+    assert ctx.egg_group_depths[lod_groups[0]] == 3
+    assert ctx.dirty
+
+    lod_node = NodePath(loadEggData(egg_data)).find("**/+LODNode")
+    assert not lod_node.isEmpty()
+    lod = lod_node.node()
+    assert isinstance(lod, LODNode) and lod.getNumSwitches() == 3
+    assert (lod.getIn(1), lod.getOut(1)) == (100, 50)
+
+
+def test_lod_render_state(tmp_path):
+    """
+    Decimated polygons should render like the polygons they came from, render state of their groups included.
+    """
+    walls_state = "\n".join([
+        "  <Group> walls {",
+        "    <Scalar> alpha { blend }",
+        "    <Scalar> bin { transparent }",
+        "    <Scalar> draw-order { 5 }",
+        "    <Scalar> depth-write { off }",
+    ])
+    with open(tmp_path / "prop.egg", "w") as egg_file:
+        egg_file.write(make_grid_egg(10).replace("  <Group> walls {", walls_state))
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "prop.egg"))
+    levels = [LODLevel(1.0, 50), LODLevel(0.5, 1000)]
+    generator = EggLODGenerator([egg_filename], eggman = EggMan([egg_filename]), levels = levels)
+    generator.generate_lods(["prop"])
+
+    egg_data = next(iter(generator.eggman.egg_datas))
+    walls = egg_data.findChild("prop").findChild("prop_lod").findChild("prop_lod1").findChild("walls")
+    assert walls and len([child for child in walls.getChildren() if isinstance(child, EggPolygon)]) == 100
+    assert walls.getAlphaMode() == EggGroup.AM_blend
+    assert (walls.getBin(), walls.getDrawOrder()) == ("transparent", 5)
+    assert walls.getDepthWriteMode() == EggGroup.DWM_off
+
+
+def test_lod_levels_start_at_full_detail():
+    with pytest.raises(ValueError):
+        EggLODGenerator([], eggman = EggMan([]), levels = [LODLevel(0.5, 50), LODLevel(0.25, 100)])
+
+
+def test_lod_unwelded(tmp_path):
+    """
+    Vertex copies that only differ by the polygon using them shouldn't keep the mesh from being decimated.
+    """
+    with open(tmp_path / "prop.egg", "w") as egg_file:
+        egg_file.write(make_unwelded_grid_egg(10))
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "prop.egg"))
+    levels = [LODLevel(1.0, 50), LODLevel(0.5, 100), LODLevel(0.2, 1000)]
+    generator = EggLODGenerator([egg_filename], eggman = EggMan([egg_filename]), levels = levels)
+    report = generator.generate_lods(["prop"])
+    assert report == {egg_filename.getFullpath(): {"prop": [200, 100, 40]}}
@@ -0,0 +1,67 @@
+from panda3d.core import Filename, NodePath
+from panda3d.egg import EggData, EggGroup, EggPolygon, EggVertexPool, loadEggData
+
+from eggtools.EggMan import EggMan
+from eggtools.EggManConfig import NodeNameConfig
+
+
+def make_piece(name: str, x: int, attributes: str = "") -> str:
+    return f"""  <Group> {name} {{
+    {attributes}
+    <VertexPool> {name}_vertices {{
+      <Vertex> 0 {{ {x} 0 0 }}
+      <Vertex> 1 {{ {x + 1} 0 0 }}
+      <Vertex> 2 {{ {x + 1} 0 1 }}
+    }}
+    <Polygon> {{ <VertexRef> {{ 0 1 2 <Ref> {{ {name}_vertices }} }} }}
+  }}
+"""
+
+
+fence_egg = "<CoordinateSystem> { Z-Up }\n<Group> fence {\n" + "".join([
+    make_piece("post1", 0),
+    make_piece("post2", 2),
+    make_piece("post3", 4, "<Group> post3_inner { }"),
+    make_piece("glass1", 6, "<Scalar> alpha { blend } <Scalar> bin { fixed }"),
+    make_piece("glass2", 8, "<Scalar> alpha { blend } <Scalar> bin { fixed }"),
+    make_piece("glass3", 10, "<Scalar> alpha { blend }"),
+    make_piece("gate", 12, "<Transform> { <Translate> { 0 1 0 } }"),
+    make_piece("post_origin", 14),
+]) + "}\n"
+
+
+def test_merge_sibling_groups(tmp_path):
+    with open(tmp_path / "fence.egg", "w") as egg_file:
+        egg_file.write(fence_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "fence.egg"))
+    eggman = EggMan([egg_filename])
+    egg_data = next(iter(eggman.egg_datas))
+    keep_config = NodeNameConfig({"fence", "*_origin"})
+
+    expected = {egg_filename.getFullpath(): [["post1", "post2", "post3"], ["glass1", "glass2"]]}
+    assert eggman.merge_sibling_groups(keep_config = keep_config, dry_run = True) == expected
+    assert len(eggman.egg_datas[egg_data].egg_groups) == 10
+
+    assert eggman.merge_sibling_groups(keep_config = keep_config) == expected
+    fence = egg_data.getFirstChild()
+    assert [child.getName() for child in fence.getChildren()] == ["post1", "glass1", "glass3", "gate", "post_origin"]
+    posts = fence.findChild("post1")
+    vertex_pools = [child for child in posts.getChildren() if isinstance(child, EggVertexPool)]
+    polygons = [child for child in posts.getChildren() if isinstance(child, EggPolygon)]
+    assert len(vertex_pools) == 1 and len(vertex_pools[0]) == 9
+    assert len(polygons) == 3
+    assert all(egg_vertex.getPool() == vertex_pools[0] for polygon in polygons for egg_vertex in polygon.getVertices())
+    assert sorted(polygon.getVertex(0).getPos3()[0] for polygon in polygons) == [0, 2, 4]
+    assert isinstance(posts.findChild("post3_inner"), EggGroup)
+    assert fence.findChild("glass1").getBin() == "fixed"
+    assert {egg_group.getName() for egg_group in eggman.egg_datas[egg_data].egg_groups} == {
+        "fence", "post1", "post3_inner", "glass1", "glass3", "gate", "post_origin"
+    }
+
+    # The merged egg still writes out and loads
+    egg_data.writeEgg(Filename.fromOsSpecific(str(tmp_path / "fence_merged.egg")))
+    merged_egg = EggData()
+    merged_egg.read(Filename.fromOsSpecific(str(tmp_path / "fence_merged.egg")))
+    assert len(merged_egg.getFirstChild().findChild("post1").findChild("post1_vertices")) == 9
+    model = NodePath(loadEggData(merged_egg))
+    assert model.find("**/post1/+GeomNode").node().getNumGeoms() == 1
@@ -0,0 +1,79 @@
+import json
+
+from panda3d.core import Filename
+
+from eggtools.EggMan import EggMan
+from eggtools.utils.EggRenderAnalyzer import EggRenderAnalyzer
+
+render_egg = """<CoordinateSystem> { Z-Up }
+
+<Texture> wall {
+  "maps/wall.png"
+}
+<Texture> sign {
+  "maps/sign.png"
+  <Scalar> alpha { blend }
+}
+<VertexPool> vpool {
+  <Vertex> 0 { 0 0 0 <UV> { 0 0 } }
+  <Vertex> 1 { 1 0 0 <UV> { 1 0 } }
+  <Vertex> 2 { 1 0 1 <UV> { 1 1 } }
+  <Vertex> 3 { 0 0 1 <UV> { 0 1 } }
+}
+<Group> building {
+  <Group> front {
+    <Polygon> { <TRef> { wall } <VertexRef> { 0 1 2 <Ref> { vpool } } }
+    <Polygon> { <TRef> { wall } <VertexRef> { 0 2 3 <Ref> { vpool } } }
+  }
+  <Group> back {
+    <Polygon> { <TRef> { wall } <VertexRef> { 2 1 0 <Ref> { vpool } } }
+  }
+  <Group> signs {
+    <Billboard> { axis }
+    <Polygon> { <TRef> { sign } <VertexRef> { 0 1 2 <Ref> { vpool } } }
+    <Polygon> { <TRef> { wall } <BFace> { 1 } <VertexRef> { 0 2 3 <Ref> { vpool } } }
+  }
+  <Group> barrier {
+    <Collide> { Polyset descend }
+    <Polygon> { <VertexRef> { 0 1 2 <Ref> { vpool } } }
+  }
+}
+"""
+
+
+def test_analyze_grid(test_egg):
+    analyzer = EggRenderAnalyzer([test_egg], eggman = EggMan([test_egg]))
+    egg_info = analyzer.analyze_egg(next(iter(analyzer.eggman.egg_datas)))
+    assert egg_info["polygons"] == 9
+    assert egg_info["render_states"] == 1
+    # One Geom per group when loaded, all flattened into a single draw call
+    assert egg_info["geoms"] == 9
+    assert egg_info["draw_calls"] == 1
+    assert egg_info["nodes_per_level"] == {"0": 1, "1": 9}
+
+
+def test_analyze_states(tmp_path):
+    with open(tmp_path / "building.egg", "w") as egg_file:
+        egg_file.write(render_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "building.egg"))
+    analyzer = EggRenderAnalyzer([egg_filename], eggman = EggMan([egg_filename]))
+    report = analyzer.analyze_all()
+
+    egg_info = report["eggs"][0]
+    # Collision geometry isn't drawn
+    assert egg_info["polygons"] == 5
+    # Opaque wall, blended sign and two-sided wall
+    assert egg_info["render_states"] == 3
+    assert egg_info["geoms"] == 4
+    # The billboard keeps its wall polygon from being flattened together with the others
+    assert egg_info["draw_calls"] == 3
+    assert egg_info["groups"][0] == {"group": "/building/signs", "geoms": 2, "polygons": 2}
+    alpha_modes = {state_info["state"]["alpha_mode"] for state_info in egg_info["states"]}
+    assert alpha_modes == {"Unspecified", "Blend"}
+
+    assert analyzer.get_over_budget(2, report) == [egg_info["filename"]]
+    assert analyzer.get_over_budget(3, report) == []
+
+    analyzer.write_json(str(tmp_path / "render_report.json"), report)
+    with open(tmp_path / "render_report.json") as report_file:
+        assert json.load(report_file) == report
@@ -0,0 +1,192 @@
+import numpy as np
+from PIL import Image
+from panda3d.core import Filename
+from panda3d.egg import EggPolygon, EggTexture
+
+from eggtools.EggMan import EggMan
+from eggtools.components.images.AtlasPacker import pack_rects
+from eggtools.utils.EggRepalettizer import Repalettizer
+
+two_texture_egg = """<CoordinateSystem> { Y-Up }
+
+<Texture> red { "red.png" }
+<Texture> blue { "blue.png" }
+<Texture> tiled { "tiled.png" }
+<Group> props {
+  <VertexPool> props.verts {
+    <Vertex> 0 { 0 0 0 <UV> { 0 0 } }
+    <Vertex> 1 { 1 0 0 <UV> { 1 0 } }
+    <Vertex> 2 { 1 0 1 <UV> { 1 1 } }
+    <Vertex> 3 { 2 0 0 <UV> { 0.25 0.25 } }
+    <Vertex> 4 { 3 0 0 <UV> { 0.75 0.25 } }
+    <Vertex> 5 { 3 0 1 <UV> { 0.75 0.75 } }
+    <Vertex> 6 { 4 0 0 <UV> { 0 0 } }
+    <Vertex> 7 { 5 0 0 <UV> { 4 0 } }
+    <Vertex> 8 { 5 0 1 <UV> { 4 4 } }
+  }
+  <Polygon> { <TRef> { red } <VertexRef> { 0 1 2 <Ref> { props.verts } } }
+  <Polygon> { <TRef> { blue } <VertexRef> { 3 4 5 <Ref> { props.verts } } }
+  <Polygon> { <TRef> { tiled } <VertexRef> { 6 7 8 <Ref> { props.verts } } }
+}
+"""
+
+
+def test_pack_rects():
+    """
+    Packed rects should stay inside of their power-of-two atlas without overlapping.
+    """
+    rng = np.random.default_rng(0)
+    sizes = {index: tuple(int(side) for side in rng.integers(4, 100, 2)) for index in range(40)}
+    layouts = pack_rects(sizes, max_size = 256)
+    assert sum(len(layout.placements) for layout in layouts) == len(sizes)
+    for layout in layouts:
+        assert layout.width & (layout.width - 1) == 0 and layout.height & (layout.height - 1) == 0
+        rects = list(layout.placements.values())
+        for index, (x, y, width, height) in enumerate(rects):
+            assert x + width <= layout.width and y + height <= layout.height
+            for other_x, other_y, other_width, other_height in rects[index + 1:]:
+                assert x + width <= other_x or other_x + other_width <= x or \
+                       y + height <= other_y or other_y + other_height <= y
+
+
+def test_repalettize(tmp_path, monkeypatch):
+    """
+    Textures with UVs inside of [0, 1] share an atlas, and their UVs still land on the same colors.
+    """
+    monkeypatch.chdir(tmp_path)
+    Image.new("RGB", (16, 16), (255, 0, 0)).save(tmp_path / "red.png")
+    Image.new("RGB", (8, 8), (0, 0, 255)).save(tmp_path / "blue.png")
+    Image.new("RGB", (8, 8), (0, 255, 0)).save(tmp_path / "tiled.png")
+    with open(tmp_path / "props.egg", "w") as egg_file:
+        # Textures nothing used before the run are left in the egg
+        egg_file.write(two_texture_egg.replace("<Group> props {", "<Texture> spare { \"spare.png\" }\n<Group> props {"))
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "props.egg"))
+
+    repal = Repalettizer([egg_filename], padding = 2, eggman = EggMan([egg_filename]))
+    report = repal.repalettize_all()
+    assert report.textures_before == 3 and report.textures_after == 2
+    assert report.draw_calls_before == 3 and report.draw_calls_after == 2
+    assert "tiled.png" in next(iter(report.skipped))
+
+    atlas = np.asarray(Image.open(tmp_path / "atlas_0.png").convert("RGB"))
+    atlas_height, atlas_width = atlas.shape[:2]
+    assert atlas_width & (atlas_width - 1) == 0 and atlas_height & (atlas_height - 1) == 0
+
+    egg_data = next(iter(repal.eggman.egg_datas))
+    polygon_colors = dict()
+    for child in egg_data.findChild("props").getChildren():
+        if not isinstance(child, EggPolygon):
+            continue
+        texture_name = child.getTexture().getFilename().getBasename()
+        u, v = np.mean([vertex.getUv() for vertex in child.getVertices()], axis = 0)
+        if texture_name == "atlas_0.png":
+            pixel = atlas[int((1 - v) * atlas_height), int(u * atlas_width)]
+            polygon_colors[tuple(int(channel) for channel in pixel)] = texture_name
+        else:
+            polygon_colors[texture_name] = texture_name
+    assert polygon_colors == {(255, 0, 0): "atlas_0.png", (0, 0, 255): "atlas_0.png", "tiled.png": "tiled.png"}
+    texture_names = {child.getName() for child in egg_data.getChildren() if isinstance(child, EggTexture)}
+    assert texture_names == {"atlas_0", "tiled", "spare"}
+
+
+def test_atlas_keeps_transparency(tmp_path, monkeypatch):
+    """
+    Partly transparent images should land in the atlas pixel for pixel, padded with their own edges.
+    """
+    monkeypatch.chdir(tmp_path)
+    red_array = np.zeros((4, 8, 4), dtype = np.uint8)
+    red_array[:, :4] = (255, 0, 0, 255)
+    Image.fromarray(red_array).save(tmp_path / "red.png")
+    Image.new("RGB", (8, 8), (0, 0, 255)).save(tmp_path / "blue.png")
+    Image.new("RGB", (8, 8), (0, 255, 0)).save(tmp_path / "tiled.png")
+    with open(tmp_path / "props.egg", "w") as egg_file:
+        egg_file.write(two_texture_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "props.egg"))
+
+    repal = Repalettizer([egg_filename], padding = 2, eggman = EggMan([egg_filename]))
+    plan = repal.plan_all()
+    atlas = repal.build_atlas(plan, 0)
+    entry = next(entry for entry in plan.entries.values() if entry.source_filename.getBasename() == "red.png")
+    x, y = entry.position
+    assert np.array_equal(atlas[y:y + 4, x:x + 8], red_array)
+    # Each side of the padding repeats the edge it is next to
+    assert np.array_equal(atlas[y:y + 4, x - 2:x], red_array[:, :1].repeat(2, axis = 1))
+    assert np.array_equal(atlas[y:y + 4, x + 8:x + 10], red_array[:, -1:].repeat(2, axis = 1))
+    assert np.array_equal(atlas[y - 2:y, x:x + 8], red_array[:1].repeat(2, axis = 0))
+
+
+def test_shared_vertices_across_texture_attributes(tmp_path, monkeypatch):
+    """
+    The same image with different texture attributes ends up in different atlases,
+    so polygons using each of them can't share vertices either.
+    """
+    monkeypatch.chdir(tmp_path)
+    Image.new("RGB", (8, 8), (255, 0, 0)).save(tmp_path / "red.png")
+    Image.new("RGB", (8, 8), (0, 0, 255)).save(tmp_path / "blue.png")
+    with open(tmp_path / "shared.egg", "w") as egg_file:
+        egg_file.write("""<CoordinateSystem> { Y-Up }
+
+<Texture> red { "red.png" }
+<Texture> red_nearest { "red.png" <Scalar> minfilter { nearest } <Scalar> magfilter { nearest } }
+<Texture> blue { "blue.png" }
+<Group> props {
+  <VertexPool> props.verts {
+    <Vertex> 0 { 0 0 0 <UV> { 0 0 } }
+    <Vertex> 1 { 1 0 0 <UV> { 1 0 } }
+    <Vertex> 2 { 1 0 1 <UV> { 1 1 } }
+    <Vertex> 3 { 2 0 0 <UV> { 0 1 } }
+    <Vertex> 4 { 3 0 0 <UV> { 0 0 } }
+    <Vertex> 5 { 3 0 1 <UV> { 1 0 } }
+    <Vertex> 6 { 4 0 0 <UV> { 1 1 } }
+  }
+  <Polygon> { <TRef> { red } <VertexRef> { 0 1 2 <Ref> { props.verts } } }
+  <Polygon> { <TRef> { red_nearest } <VertexRef> { 2 1 3 <Ref> { props.verts } } }
+  <Polygon> { <TRef> { blue } <VertexRef> { 4 5 6 <Ref> { props.verts } } }
+}
+""")
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "shared.egg"))
+
+    repal = Repalettizer([egg_filename], padding = 2, eggman = EggMan([egg_filename]))
+    plan = repal.plan_all()
+    assert any(fullpath.endswith("red.png") for fullpath in plan.skipped)
+    assert not any(entry.source_filename.getBasename() == "red.png" for entry in plan.entries.values())
+
+
+def test_atlas_groups_by_alpha_mode(tmp_path, monkeypatch):
+    """
+    The atlas texture takes on the attributes of the textures packed into it,
+    so textures with a different alpha mode can't share one.
+    """
+    monkeypatch.chdir(tmp_path)
+    for name, color in (("red", (255, 0, 0)), ("blue", (0, 0, 255)), ("green", (0, 255, 0))):
+        Image.new("RGBA", (8, 8), color).save(tmp_path / f"{name}.png")
+    with open(tmp_path / "alpha.egg", "w") as egg_file:
+        egg_file.write("""<CoordinateSystem> { Y-Up }
+
+<Texture> red { "red.png" <Scalar> alpha { dual } }
+<Texture> blue { "blue.png" <Scalar> alpha { off } }
+<Texture> green { "green.png" <Scalar> alpha { off } }
+<Group> props {
+  <VertexPool> props.verts {
+    <Vertex> 0 { 0 0 0 <UV> { 0 0 } }
+    <Vertex> 1 { 1 0 0 <UV> { 1 0 } }
+    <Vertex> 2 { 1 0 1 <UV> { 1 1 } }
+    <Vertex> 3 { 2 0 0 <UV> { 0 0 } }
+    <Vertex> 4 { 3 0 0 <UV> { 1 0 } }
+    <Vertex> 5 { 3 0 1 <UV> { 1 1 } }
+    <Vertex> 6 { 4 0 0 <UV> { 0 0 } }
+    <Vertex> 7 { 5 0 0 <UV> { 1 0 } }
+    <Vertex> 8 { 5 0 1 <UV> { 1 1 } }
+  }
+  <Polygon> { <TRef> { red } <VertexRef> { 0 1 2 <Ref> { props.verts } } }
+  <Polygon> { <TRef> { blue } <VertexRef> { 3 4 5 <Ref> { props.verts } } }
+  <Polygon> { <TRef> { green } <VertexRef> { 6 7 8 <Ref> { props.verts } } }
+}
+""")
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "alpha.egg"))
+
+    repal = Repalettizer([egg_filename], padding = 2, eggman = EggMan([egg_filename]))
+    plan = repal.plan_all()
+    assert len(plan.layouts) == 1
+    assert sorted(entry.source_filename.getBasename() for entry in plan.entries_in_atlas(0)) == \
+           ["blue.png", "green.png"]
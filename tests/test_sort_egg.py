@@ -0,0 +1,81 @@
+from panda3d.core import Filename
+from panda3d.egg import EggData, EggGroup, EggPolygon, EggTexture, EggVertexPool
+
+from eggtools.EggMan import EggMan, TRefSortType
+
+unsorted_egg = """<CoordinateSystem> { Z-Up }
+
+<Texture> stone {
+  "maps/b_stone.png"
+}
+<Texture> grass {
+  "maps/c_grass.png"
+  <Scalar> alpha { binary }
+}
+<Texture> water {
+  "maps/a_water.png"
+  <Scalar> alpha { blend }
+}
+<VertexPool> vpool {
+  <Vertex> 0 { 0 0 0 }
+  <Vertex> 1 { 1 0 0 }
+  <Vertex> 2 { 1 0 1 }
+}
+<Group> ground {
+  <Polygon> stone_1 { <TRef> { stone } <VertexRef> { 0 1 2 <Ref> { vpool } } }
+  <Polygon> grass_1 { <TRef> { grass } <VertexRef> { 0 1 2 <Ref> { vpool } } }
+  <Group> pond {
+    <Polygon> water_1 { <TRef> { water } <VertexRef> { 0 1 2 <Ref> { vpool } } }
+  }
+  <Polygon> stone_2 { <TRef> { stone } <VertexRef> { 0 1 2 <Ref> { vpool } } }
+  <Polygon> grass_2 { <TRef> { grass } <VertexRef> { 0 1 2 <Ref> { vpool } } }
+  <Polygon> stone_3 { <TRef> { stone } <BFace> { 1 } <VertexRef> { 0 1 2 <Ref> { vpool } } }
+}
+"""
+
+
+def load_egg(tmp_path):
+    with open(tmp_path / "ground.egg", "w") as egg_file:
+        egg_file.write(unsorted_egg)
+    eggman = EggMan([Filename.fromOsSpecific(str(tmp_path / "ground.egg"))])
+    return eggman, next(iter(eggman.egg_datas))
+
+
+def get_texture_names(egg_data):
+    return [child.getName() for child in egg_data.getChildren() if isinstance(child, EggTexture)]
+
+
+def test_sort_trefs(tmp_path):
+    eggman, egg_data = load_egg(tmp_path)
+    ctx = eggman.egg_datas[egg_data]
+    eggman.sort_trefs(egg_data)
+    assert get_texture_names(egg_data) == ["grass", "stone", "water"]
+    assert [egg_texture.getName() for egg_texture in ctx.egg_textures] == ["grass", "stone", "water"]
+    assert ctx.dirty
+
+    eggman.sort_trefs(sortby = TRefSortType.Filename)
+    assert get_texture_names(egg_data) == ["water", "stone", "grass"]
+    eggman.sort_trefs(sortby = "render_state")
+    assert get_texture_names(egg_data) == ["stone", "water", "grass"]
+    # The vertex pool and groups stay after the textures
+    assert [type(child) for child in egg_data.getChildren()][-2:] == [EggVertexPool, EggGroup]
+
+
+def test_sort_polygons(tmp_path):
+    eggman, egg_data = load_egg(tmp_path)
+    eggman.sort_trefs(egg_data)
+    eggman.sort_polygons()
+    # Polygons are grouped by texture filename, then by the rest of their state
+    ground = egg_data.findChild("ground")
+    assert [child.getName() for child in ground.getChildren()] == [
+        "stone_1", "stone_2", "pond", "stone_3", "grass_1", "grass_2"
+    ]
+
+    # Everything still references the same textures and vertices once written out
+    eggman.write_egg(egg_data, Filename.fromOsSpecific(str(tmp_path / "ground_sorted.egg")))
+    sorted_egg = EggData()
+    sorted_egg.read(Filename.fromOsSpecific(str(tmp_path / "ground_sorted.egg")))
+    sorted_ground = sorted_egg.findChild("ground")
+    polygons = [child for child in sorted_ground.getChildren() if isinstance(child, EggPolygon)]
+    assert [polygon.getTexture().getName() for polygon in polygons] == ["stone", "stone", "stone", "grass", "grass"]
+    assert all(polygon.getNumVertices() == 3 for polygon in polygons)
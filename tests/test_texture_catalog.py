@@ -0,0 +1,53 @@
+import os
+
+from PIL import Image
+from panda3d.core import Filename
+
+from eggtools.EggMan import EggMan
+from eggtools.utils.TextureCatalog import TextureCatalog
+
+catalog_egg = """<CoordinateSystem> { Y-Up }
+
+<Texture> wall { "wall.png" }
+<Texture> decal { "decal.png" }
+<Texture> missing { "missing.png" }
+"""
+
+
+def test_texture_catalog(tmp_path, monkeypatch):
+    """
+    The catalog should describe every texture without decoding it, and only reread files that changed.
+    """
+    monkeypatch.chdir(tmp_path)
+    Image.new("RGB", (64, 32)).save(tmp_path / "wall.png")
+    Image.new("RGBA", (16, 16)).save(tmp_path / "decal.png")
+    with open(tmp_path / "props.egg", "w") as egg_file:
+        egg_file.write(catalog_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "props.egg"))
+    eggman = EggMan([egg_filename])
+
+    # Only cached on disk when given a place for it
+    TextureCatalog([egg_filename], eggman = eggman).update()
+    assert not os.path.isfile(tmp_path / TextureCatalog.CACHE_NAME)
+    cache_filename = str(tmp_path / TextureCatalog.CACHE_NAME)
+    catalog = TextureCatalog([egg_filename], eggman = eggman, cache_filename = cache_filename)
+    catalog.update()
+    assert os.path.isfile(cache_filename)
+
+    egg_data = next(iter(eggman.egg_datas))
+    texture_infos = {
+        egg_texture.getName(): texture_info for egg_texture, texture_info in catalog.get_egg_textures(egg_data).items()
+    }
+    wall, decal = texture_infos["wall"], texture_infos["decal"]
+    assert (wall.width, wall.height, wall.mode, wall.channels, wall.format) == (64, 32, "RGB", 3, "PNG")
+    assert not wall.has_alpha and wall.is_power_of_two
+    assert decal.has_alpha and decal.channels == 4
+    assert texture_infos["missing"] is None
+
+    # Cached entries come back from disk, until the image changes
+    cached_catalog = TextureCatalog([egg_filename], eggman = eggman, cache_filename = cache_filename)
+    assert cached_catalog.get("wall.png") == wall
+    assert cached_catalog.is_up_to_date("wall.png")
+    Image.new("RGB", (100, 30)).save(tmp_path / "wall.png")
+    cached_catalog.update()
+    assert cached_catalog.get("wall.png").width == 100
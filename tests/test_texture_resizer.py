@@ -0,0 +1,62 @@
+import os
+
+from PIL import Image
+from panda3d.core import Filename
+
+from eggtools.EggMan import EggMan
+from eggtools.utils.TextureResizer import TextureResizer
+
+resize_egg = """<CoordinateSystem> { Y-Up }
+
+<Texture> floor { "maps/floor.png" }
+<Texture> sign { "maps/sign.png" }
+<Group> room {
+  <VertexPool> room.verts {
+    <Vertex> 0 { 0 0 0 <UV> { 0 0 } }
+    <Vertex> 1 { 2 0 0 <UV> { 1 0 } }
+    <Vertex> 2 { 2 0 2 <UV> { 1 1 } }
+    <Vertex> 3 { 0 0 2 <UV> { 0 1 } }
+    <Vertex> 4 { 0 1 0 <UV> { 0 0 } }
+    <Vertex> 5 { 1 1 0 <UV> { 1 0 } }
+    <Vertex> 6 { 1 1 1 <UV> { 1 1 } }
+    <Vertex> 7 { 0 1 1 <UV> { 0 1 } }
+  }
+  <Polygon> { <TRef> { floor } <VertexRef> { 0 1 2 3 <Ref> { room.verts } } }
+  <Polygon> { <TRef> { sign } <VertexRef> { 4 5 6 7 <Ref> { room.verts } } }
+}
+"""
+
+
+def test_resize_textures(tmp_path, monkeypatch):
+    """
+    Textures above the target density are shrunk to it, rounded down to a power of two, and repathed.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(tmp_path / "maps")
+    # 512 texels over 2 units
+    Image.new("RGB", (512, 512), (10, 20, 30)).save(tmp_path / "maps" / "floor.png")
+    # 100 texels over 1 unit, but not a power of two
+    Image.new("RGB", (100, 60), (40, 50, 60)).save(tmp_path / "maps" / "sign.png")
+    with open(tmp_path / "room.egg", "w") as egg_file:
+        egg_file.write(resize_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "room.egg"))
+
+    resizer = TextureResizer([egg_filename], eggman = EggMan([egg_filename]), target_density = 128)
+    densities = resizer.get_texel_densities()
+    assert round(densities[os.path.join("maps", "floor.png")]) == 256
+
+    jobs = {os.path.basename(job.source_path): job for job in resizer.resize_all()}
+    assert jobs["floor.png"].target_size == (256, 256)
+    assert jobs["sign.png"].target_size == (64, 32)
+
+    egg_data = next(iter(resizer.eggman.egg_datas))
+    texture_paths = {egg_texture.getName(): egg_texture.getFilename() for egg_texture in egg_data.getChildren()
+                     if egg_texture.getName() in ("floor", "sign")}
+    assert texture_paths["floor"] == Filename("maps/floor_256x256.png")
+    assert texture_paths["sign"] == Filename("maps/sign_64x32.png")
+    with Image.open(tmp_path / "maps" / "floor_256x256.png") as resized_image:
+        assert resized_image.size == (256, 256)
+    assert resizer.eggman.egg_datas[egg_data].dirty
+
+    # The resized textures are already at the target
+    assert not TextureResizer([egg_filename], eggman = resizer.eggman, target_density = 128).plan()
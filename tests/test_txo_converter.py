@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+from PIL import Image
+from panda3d.core import Filename, Texture
+from panda3d.egg import EggTexture
+
+from eggtools.EggMan import EggMan
+from eggtools.utils.TxoConverter import TxoConverter, TxoManifest
+
+txo_egg = """<CoordinateSystem> { Y-Up }
+
+<Texture> bricks {
+  "maps/bricks.png"
+  <Scalar> minfilter { linear_mipmap_linear }
+  <Scalar> wrapu { clamp }
+}
+<Texture> fence {
+  "maps/fence.jpg"
+  <Scalar> alpha-file { "maps/fence_a.png" }
+}
+"""
+
+
+def test_convert_to_txo(tmp_path, monkeypatch):
+    """
+    Textures are written out as .txo files with their settings, and the eggs are repathed to them.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(tmp_path / "maps")
+    Image.new("RGB", (64, 64), (200, 100, 50)).save(tmp_path / "maps" / "bricks.png")
+    Image.new("RGB", (32, 16), (10, 20, 30)).save(tmp_path / "maps" / "fence.jpg")
+    Image.fromarray(np.tile(np.array([0, 255], np.uint8), (16, 16))).save(tmp_path / "maps" / "fence_a.png")
+    with open(tmp_path / "props.egg", "w") as egg_file:
+        egg_file.write(txo_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "props.egg"))
+
+    converter = TxoConverter([egg_filename], eggman = EggMan([egg_filename]), max_workers = 2)
+    jobs = {os.path.basename(job.output_path): job for job in converter.convert_all()}
+    assert set(jobs) == {"bricks.png.txo", "fence.jpg.txo"}
+    assert jobs["bricks.png.txo"].mipmaps and not jobs["fence.jpg.txo"].mipmaps
+
+    bricks = Texture()
+    assert bricks.read(Filename.fromOsSpecific(str(tmp_path / "maps" / "bricks.png.txo")))
+    assert bricks.getNumRamMipmapImages() == 7
+    assert bricks.getWrapU() == bricks.WM_clamp
+    fence = Texture()
+    assert fence.read(Filename.fromOsSpecific(str(tmp_path / "maps" / "fence.jpg.txo")))
+    assert fence.getNumRamMipmapImages() == 1
+    assert fence.getNumComponents() == 4
+
+    egg_data = next(iter(converter.eggman.egg_datas))
+    egg_textures = {child.getName(): child for child in egg_data.getChildren() if isinstance(child, EggTexture)}
+    assert egg_textures["bricks"].getFilename() == Filename("maps/bricks.png.txo")
+    assert egg_textures["fence"].getFilename() == Filename("maps/fence.jpg.txo")
+    assert not egg_textures["fence"].hasAlphaFilename()
+
+    # Running again from the original egg only repaths
+    txo_mtime = os.path.getmtime(tmp_path / "maps" / "bricks.png.txo")
+    rerun_converter = TxoConverter([egg_filename], eggman = EggMan([egg_filename]), use_processes = False)
+    manifest = TxoManifest(str(tmp_path / "maps"))
+    assert all(job.is_up_to_date(manifest) for job in rerun_converter.convert_all())
+    assert os.path.getmtime(tmp_path / "maps" / "bricks.png.txo") == txo_mtime
+
+    # Changing the settings converts it again, even though the .txo is newer than the image
+    rerun_converter = TxoConverter([egg_filename], eggman = EggMan([egg_filename]), mipmaps = False,
+                                   use_processes = False)
+    rerun_converter.convert_all()
+    bricks = Texture()
+    assert bricks.read(Filename.fromOsSpecific(str(tmp_path / "maps" / "bricks.png.txo")))
+    assert bricks.getNumRamMipmapImages() == 1
+
+
+def test_txo_names_keep_extension(tmp_path, monkeypatch):
+    """
+    Images differing only by extension convert into separate .txo files.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(tmp_path / "maps")
+    Image.new("RGB", (8, 8), (255, 0, 0)).save(tmp_path / "maps" / "wall.png")
+    Image.new("RGB", (8, 8), (0, 0, 255)).save(tmp_path / "maps" / "wall.jpg")
+    with open(tmp_path / "walls.egg", "w") as egg_file:
+        egg_file.write("""<CoordinateSystem> { Y-Up }
+
+<Texture> wall_png { "maps/wall.png" }
+<Texture> wall_jpg { "maps/wall.jpg" }
+""")
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "walls.egg"))
+
+    converter = TxoConverter([egg_filename], eggman = EggMan([egg_filename]), use_processes = False)
+    assert len(converter.convert_all()) == 2
+    egg_data = next(iter(converter.eggman.egg_datas))
+    egg_textures = {child.getName(): child for child in egg_data.getChildren() if isinstance(child, EggTexture)}
+    assert egg_textures["wall_png"].getFilename() == Filename("maps/wall.png.txo")
+    assert egg_textures["wall_jpg"].getFilename() == Filename("maps/wall.jpg.txo")
+
+    wall = Texture()
+    assert wall.read(Filename.fromOsSpecific(str(tmp_path / "maps" / "wall.png.txo")))
+    assert bytes(wall.getRamImageAs("RGB"))[:3] == bytes((255, 0, 0))
@@ -0,0 +1,87 @@
+import os
+import shutil
+
+from panda3d.core import Filename, LPoint3d
+from panda3d.egg import EggPolygon, EggTexture, EggVertex
+
+from eggtools.components.points.PointData import PointData, PointHelper
+
+# Two quads in one group, on opposite corners of the palette
+two_island_egg = """<CoordinateSystem> { Y-Up }
+
+<Texture> grid {
+  "maps/test_grid_1.png"
+}
+<Group> scattered {
+  <VertexPool> scattered.verts {
+    <Vertex> 0 { 0 0 0 <UV> { 0.0 0.0 } }
+    <Vertex> 1 { 1 0 0 <UV> { 0.2 0.0 } }
+    <Vertex> 2 { 1 0 1 <UV> { 0.2 0.2 } }
+    <Vertex> 3 { 0 0 1 <UV> { 0.0 0.2 } }
+    <Vertex> 4 { 2 0 0 <UV> { 0.8 0.8 } }
+    <Vertex> 5 { 3 0 0 <UV> { 1.0 0.8 } }
+    <Vertex> 6 { 3 0 1 <UV> { 1.0 1.0 } }
+    <Vertex> 7 { 2 0 1 <UV> { 0.8 1.0 } }
+  }
+  <Polygon> {
+    <TRef> { grid }
+    <VertexRef> { 0 1 2 3 <Ref> { scattered.verts } }
+  }
+  <Polygon> {
+    <TRef> { grid }
+    <VertexRef> { 4 5 6 7 <Ref> { scattered.verts } }
+  }
+}
+"""
+
+
+def make_point_data(uvs, egg_texture):
+    vertex_uvs = dict()
+    for u, v in uvs:
+        egg_vertex = EggVertex()
+        egg_vertex.setPos(LPoint3d(u, v, 0))
+        vertex_uvs[egg_vertex] = [u, v]
+    return PointData(Filename("test.egg"), vertex_uvs, egg_texture)
+
+
+def test_find_uv_islands():
+    """
+    Polygons touching through a shared UV coordinate belong to the same island.
+    """
+    egg_texture = EggTexture("grid", "grid.png")
+    left = make_point_data([(0, 0), (0.1, 0), (0.1, 0.1)], egg_texture)
+    right = make_point_data([(0.9, 0.9), (1, 0.9), (1, 1)], egg_texture)
+    touching_left = make_point_data([(0.1, 0.1), (0.2, 0.1), (0.2, 0.2)], egg_texture)
+
+    islands = PointHelper.find_uv_islands([left, right, touching_left])
+    assert islands == [[left, touching_left], [right]]
+
+
+def test_depalettize_islands(tmp_path, monkeypatch, base_dir, make_depalettizer):
+    """
+    Each island should get its own crop, and only its polygons should be remapped to it.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(tmp_path / "maps")
+    shutil.copy(os.path.join(base_dir, "maps", "test_grid_1.png"), tmp_path / "maps")
+    with open(tmp_path / "scattered.egg", "w") as egg_file:
+        egg_file.write(two_island_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "scattered.egg"))
+
+    whole_plan = make_depalettizer(egg_filename, str(tmp_path / "maps")).depalettize_all(dry_run = True)
+    assert len(whole_plan.jobs) == 1
+
+    depal = make_depalettizer(egg_filename, str(tmp_path / "maps"), split_uv_islands = True)
+    plan = depal.depalettize_all()
+    assert len(plan.jobs) == 2
+    for job in plan.jobs:
+        assert job.uv_island and job.completed
+        (min_x, min_y), (max_x, max_y) = job.bbox
+        assert max_x - min_x <= 0.21 and max_y - min_y <= 0.21
+
+    output_names = {job.output_filename.getBasename() for job in plan.jobs}
+    polygon_textures = {
+        child.getTexture().getFilename().getBasename()
+        for child in plan.jobs[0].egg_node.getChildren() if isinstance(child, EggPolygon)
+    }
+    assert polygon_textures == output_names
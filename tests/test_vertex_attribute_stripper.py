@@ -0,0 +1,88 @@
+from panda3d.core import Filename
+from panda3d.egg import EggData
+
+from eggtools.EggMan import EggMan
+from eggtools.utils.EggVertexAttributeStripper import EggVertexAttributeStripper, VertexAttribute
+
+attribute_egg = """<CoordinateSystem> { Z-Up }
+<Texture> tiles { "maps/tiles.png" }
+<Material> shiny { <Scalar> diffr { 1 } }
+<VertexPool> floor_vertices {
+  <Vertex> 0 { 0 0 0 <Normal> { 0 0 1 } <RGBA> { 1 1 1 1 } <UV> { 0 0 } }
+  <Vertex> 1 { 1 0 0 <Normal> { 0 0 1 } <RGBA> { 1 1 1 1 } <UV> { 1 0 } }
+  <Vertex> 2 { 1 1 0 <Normal> { 0 0 1 } <RGBA> { 1 1 1 1 } <UV> { 1 1 } }
+  <Vertex> 3 { 0 1 0 <Normal> { 0 0 1 } <RGBA> { 1 0.5 0.5 1 } <UV> { 0 1 } }
+}
+<VertexPool> lamp_vertices {
+  <Vertex> 0 { 0 0 2 <Normal> { 0 0 1 } <RGBA> { 1 1 1 1 } <UV> { 0 0 } }
+  <Vertex> 1 { 1 0 2 <Normal> { 0 0 1 } <RGBA> { 1 1 1 1 } <UV> { 1 0 } }
+  <Vertex> 2 { 1 1 2 <Normal> { 0 0 1 } <RGBA> { 1 1 1 1 } <UV> { 1 1 } }
+}
+<VertexPool> barrier_vertices {
+  <Vertex> 0 { 0 0 5 <Normal> { 0 0 1 } <UV> { 0 0 } }
+  <Vertex> 1 { 1 0 5 <Normal> { 0 0 1 } <UV> { 1 0 } }
+  <Vertex> 2 { 1 1 5 <Normal> { 0 0 1 } <UV> { 1 1 } }
+}
+<Group> floor {
+  <Polygon> { <TRef> { tiles } <VertexRef> { 0 1 2 <Ref> { floor_vertices } } }
+  <Polygon> { <VertexRef> { 0 2 3 <Ref> { floor_vertices } } }
+}
+<Group> lamp {
+  <Polygon> { <MRef> { shiny } <RGBA> { 1 1 0 1 } <VertexRef> { 0 1 2 <Ref> { lamp_vertices } } }
+}
+<Group> barrier {
+  <Collide> { Polyset descend }
+  <Polygon> { <TRef> { tiles } <VertexRef> { 0 1 2 <Ref> { barrier_vertices } } }
+}
+"""
+
+
+def test_strip_vertex_attributes(tmp_path):
+    with open(tmp_path / "room.egg", "w") as egg_file:
+        egg_file.write(attribute_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "room.egg"))
+    stripper = EggVertexAttributeStripper([egg_filename], eggman = EggMan([egg_filename]), assume_lit = False)
+    egg_data = next(iter(stripper.eggman.egg_datas))
+
+    reports = {report.vertex_pool: report for report in stripper.analyze(egg_data)}
+    # Nothing on the floor is lit, and vertex 3 is pink and only shows up on the untextured polygon
+    assert reports["floor_vertices"].strippable == {
+        VertexAttribute.Normal: 4, VertexAttribute.Color: 3, VertexAttribute.UV: 1,
+    }
+    assert reports["floor_vertices"].constant == [VertexAttribute.Normal]
+    # The white vertex colors of the lamp hide its yellow polygon color, so they stay
+    assert reports["lamp_vertices"].strippable == {
+        VertexAttribute.Normal: 0, VertexAttribute.Color: 0, VertexAttribute.UV: 3,
+    }
+    assert set(reports["barrier_vertices"].constant) == {VertexAttribute.Normal, VertexAttribute.UV}
+
+    report = stripper.strip(attributes = ["normal", "uv"])[egg_filename.getFullpath()]
+    assert {key: value for key, value in report.items() if not key.startswith("bytes")} == {"normal": 7, "uv": 7}
+    assert report["bytes_after"] < report["bytes_before"]
+    report = stripper.strip()[egg_filename.getFullpath()]
+    # The lamp's white vertex colors go onto its polygon instead
+    assert (report["color"], report["color_hoisted"]) == (3, 3)
+
+    egg_data.writeEgg(Filename.fromOsSpecific(str(tmp_path / "room_stripped.egg")))
+    stripped_egg = EggData()
+    stripped_egg.read(Filename.fromOsSpecific(str(tmp_path / "room_stripped.egg")))
+    floor_vertices = stripped_egg.findChild("floor_vertices")
+    assert not floor_vertices.hasNormals()
+    assert [floor_vertices.getVertex(index).hasUv() for index in range(4)] == [True, True, True, False]
+    assert [floor_vertices.getVertex(index).hasColor() for index in range(4)] == [False, False, False, True]
+    lamp_vertices = stripped_egg.findChild("lamp_vertices")
+    assert lamp_vertices.hasNormals() and not lamp_vertices.hasColors() and not lamp_vertices.hasUvs()
+    lamp_polygon = next(child for child in stripped_egg.findChild("lamp").getChildren())
+    assert tuple(lamp_polygon.getColor()) == (1, 1, 1, 1)
+
+
+def test_keep_normals_by_default(tmp_path):
+    """
+    Panda3D lights polygons without a <Material> too, so their normals only go when asked to.
+    """
+    with open(tmp_path / "room.egg", "w") as egg_file:
+        egg_file.write(attribute_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "room.egg"))
+    stripper = EggVertexAttributeStripper([egg_filename], eggman = EggMan([egg_filename]))
+    reports = {report.vertex_pool: report for report in stripper.analyze(next(iter(stripper.eggman.egg_datas)))}
+    assert reports["floor_vertices"].strippable[VertexAttribute.Normal] == 0
@@ -0,0 +1,76 @@
+import random
+
+from panda3d.core import Filename
+from panda3d.egg import EggData, EggPolygon, EggVertex, EggVertexPool
+
+from eggtools.EggMan import EggMan
+from eggtools.components.points import VertexCache
+
+
+def make_grid_egg(size: int) -> EggData:
+    """
+    A grid of triangles, written out in a shuffled order.
+    """
+    egg_data = EggData()
+    egg_data.setEggFilename(Filename("grid.egg"))
+    vertex_pool = EggVertexPool("grid")
+    egg_data.addChild(vertex_pool)
+    for y in range(size + 1):
+        for x in range(size + 1):
+            egg_vertex = EggVertex()
+            egg_vertex.setPos((x, y, 0))
+            vertex_pool.addVertex(egg_vertex, y * (size + 1) + x)
+
+    triangles = []
+    for y in range(size):
+        for x in range(size):
+            corner = y * (size + 1) + x
+            triangles.append((corner, corner + 1, corner + size + 2))
+            triangles.append((corner, corner + size + 2, corner + size + 1))
+    random.Random(4).shuffle(triangles)
+    for triangle in triangles:
+        egg_polygon = EggPolygon()
+        for index in triangle:
+            egg_polygon.addVertex(vertex_pool.getVertex(index))
+        egg_data.addChild(egg_polygon)
+    return egg_data
+
+
+def test_acmr():
+    assert VertexCache.get_acmr([(0, 1, 2), (3, 4, 5)]) == 3.0
+    assert VertexCache.get_acmr([(0, 1, 2), (0, 2, 3)]) == 2.0
+    # Quads count as two triangles
+    assert VertexCache.get_acmr([(0, 1, 2, 3)]) == 2.0
+    assert VertexCache.get_acmr([]) == 0.0
+
+
+def test_optimize_vertex_cache():
+    egg_data = make_grid_egg(16)
+    eggman = EggMan([])
+    eggman.register_egg_data([egg_data])
+    ctx = eggman.egg_datas[egg_data]
+    positions_before = sorted(
+        tuple(tuple(egg_vertex.getPos3()) for egg_vertex in child.getVertices())
+        for child in egg_data.getChildren() if isinstance(child, EggPolygon)
+    )
+
+    acmr_before, acmr_after = eggman.optimize_vertex_cache(egg_data, cache_size = 16)["grid.egg"]
+    assert acmr_before > 2.0
+    assert acmr_after < 1.0
+    assert ctx.dirty
+
+    polygons = [child for child in egg_data.getChildren() if isinstance(child, EggPolygon)]
+    positions_after = sorted(
+        tuple(tuple(egg_vertex.getPos3()) for egg_vertex in egg_polygon.getVertices()) for egg_polygon in polygons
+    )
+    assert positions_after == positions_before
+    # The vertex pool is renumbered in order of first use
+    first_uses = []
+    for egg_polygon in polygons:
+        for egg_vertex in egg_polygon.getVertices():
+            if egg_vertex.getIndex() not in first_uses:
+                first_uses.append(egg_vertex.getIndex())
+    assert first_uses == list(range(17 * 17))
+    assert all(egg_vertex.getExternalIndex() == -1 for egg_polygon in polygons for egg_vertex in egg_polygon.getVertices())
+
+    assert eggman.optimize_vertex_cache(cache_size = 16)["grid.egg"][0] == acmr_after
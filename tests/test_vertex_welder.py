@@ -0,0 +1,82 @@
+from panda3d.core import Filename, NodePath
+from panda3d.egg import EggData, EggVertexPool, loadEggData
+
+from eggtools.EggMan import EggMan
+from eggtools.utils.EggVertexWelder import EggVertexWelder, WeldTolerances
+
+# Two quads exported as separate meshes, sharing an edge along x = 1
+exported_egg = """<CoordinateSystem> { Z-Up }
+<Texture> tiles { "maps/tiles.png" }
+<Group> wall {
+  <Group> left {
+    <VertexPool> left_vertices {
+      <Vertex> 0 { 0 0 0 <UV> { 0 0 } }
+      <Vertex> 1 { 1 0 0 <UV> { 1 0 } }
+      <Vertex> 2 { 1 0 1 <UV> { 1 1 } }
+      <Vertex> 3 { 0 0 1 <UV> { 0 1 } }
+      <Vertex> 4 { 0 0 0 <UV> { 0 0 } }
+      <Vertex> 5 { 9 9 9 }
+    }
+    <Polygon> { <TRef> { tiles } <VertexRef> { 0 1 2 <Ref> { left_vertices } } }
+    <Polygon> { <TRef> { tiles } <VertexRef> { 4 2 3 <Ref> { left_vertices } } }
+  }
+  <Group> right {
+    <VertexPool> right_vertices {
+      <Vertex> 0 { 1.00001 0 0 <UV> { 1 0 } }
+      <Vertex> 1 { 2 0 0 <UV> { 2 0 } }
+      <Vertex> 2 { 2 0 1 <UV> { 2 1 } }
+      <Vertex> 3 { 1 0 1 <UV> { 0.5 1 } }
+    }
+    <Polygon> { <TRef> { tiles } <VertexRef> { 0 1 2 3 <Ref> { right_vertices } } }
+  }
+}
+"""
+
+
+def test_consolidate(tmp_path):
+    with open(tmp_path / "wall.egg", "w") as egg_file:
+        egg_file.write(exported_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "wall.egg"))
+    eggman = EggMan([egg_filename])
+    egg_data = next(iter(eggman.egg_datas))
+
+    result = EggVertexWelder([egg_filename], eggman = eggman).consolidate()[egg_filename.getFullpath()]
+    assert (result.vertex_pools_before, result.vertex_pools_after) == (2, 1)
+    # The repeated corner and the nearly shared one get welded, the seam with different UVs doesn't
+    assert (result.vertices_before, result.vertices_after) == (10, 7)
+    assert (result.welded, result.unused, result.invalid_primitives) == (2, 1, 0)
+    assert result.bytes_after < result.bytes_before
+
+    vertex_pools = EggVertexWelder.get_vertex_pools(egg_data)
+    assert [vertex_pool.getName() for vertex_pool in vertex_pools] == ["left_vertices"]
+    vertex_pool = vertex_pools[0]
+    assert [vertex_pool.hasVertex(index) for index in range(8)] == [True] * 7 + [False]
+    polygons = EggVertexWelder.get_vertex_uses(egg_data)
+    assert len(polygons) == 7
+    right = egg_data.findChild("wall").findChild("right")
+    corners = [egg_vertex.getIndex() for egg_vertex in right.getFirstChild().getVertices()]
+    assert corners[0] == 1 and len(set(corners)) == 4
+    assert eggman.egg_datas[egg_data].egg_vertex_pools == {vertex_pool}
+
+    egg_data.writeEgg(Filename.fromOsSpecific(str(tmp_path / "wall_welded.egg")))
+    welded_egg = EggData()
+    welded_egg.read(Filename.fromOsSpecific(str(tmp_path / "wall_welded.egg")))
+    assert len(EggVertexWelder.get_vertex_pools(welded_egg)[0]) == 7
+    assert NodePath(loadEggData(welded_egg)).find("**/right").node().getGeom(0).getVertexData().getNumRows() == 4
+
+
+def test_tolerances(tmp_path):
+    with open(tmp_path / "wall.egg", "w") as egg_file:
+        egg_file.write(exported_egg)
+    egg_filename = Filename.fromOsSpecific(str(tmp_path / "wall.egg"))
+    welder = EggVertexWelder([egg_filename], tolerances = WeldTolerances(position = 0))
+
+    result = next(iter(welder.consolidate(node_names = ["left"]).values()))
+    # Only the pool under left gets touched, where the exact duplicate still welds with no position tolerance
+    assert (result.vertex_pools_before, result.vertex_pools_after) == (2, 2)
+    assert (result.welded, result.unused) == (1, 1)
+    egg_data = next(iter(welder.eggman.egg_datas))
+    right_vertices = egg_data.findChild("wall").findChild("right").findChild("right_vertices")
+    assert isinstance(right_vertices, EggVertexPool) and len(right_vertices) == 4
+    left_vertices = egg_data.findChild("wall").findChild("left").findChild("left_vertices")
+    assert len(left_vertices) == 4